@@ -0,0 +1,272 @@
+"""
+Run prompt sets against several models from the command line.
+
+Example (from src/):
+    python -m app.batch_runner ../data/prompts.jsonl \
+        --model openai:gpt-4o-mini --model anthropic:claude-3-5-haiku-latest \
+        --temperature 0.2 0.7 --output results.jsonl
+
+Every prompt is sent to every provider/model/parameter combination. Results
+are appended to the output JSONL as they complete; re-running the same
+command skips combinations that already succeeded, so an interrupted run can
+simply be restarted.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.modelList.async_runner import submit
+from app.modelList.base_client import GenerationParams, GenerationResult
+from app.modelList.client_registry import PROVIDER_CLIENTS, get_provider_client
+from configurations.settings import settings
+
+ID_FIELDS = ("id", "request_id", "prompt_id")
+PROMPT_FIELDS = ("prompt", "body", "text", "system_prompt")
+
+
+def load_prompts(path: str, prompt_field: Optional[str] = None) -> List[Dict]:
+    """
+    Read prompts from a JSONL file, or a JSON file holding one object or a list.
+
+    Each record needs either 'messages' (a chat history) or a prompt text in
+    prompt_field (default: the first of prompt, body, text, system_prompt).
+    The record id comes from id, request_id or prompt_id, else its position.
+
+    Returns:
+        List of {'id', 'messages'} dictionaries
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+            records = data if isinstance(data, list) else [data]
+
+    prompts = []
+    for position, record in enumerate(records, start=1):
+        record_id = next((str(record[k]) for k in ID_FIELDS if record.get(k) is not None), f"line-{position}")
+        if isinstance(record.get("messages"), list):
+            messages = record["messages"]
+        else:
+            fields = (prompt_field,) if prompt_field else PROMPT_FIELDS
+            text = next((record[k] for k in fields if record.get(k)), None)
+            if text is None:
+                print(f"Warning: Skipping record {record_id}: no prompt text found")
+                continue
+            messages = [{"role": "user", "content": str(text)}]
+        prompts.append({"id": record_id, "messages": messages})
+    return prompts
+
+
+def expand_params(defaults: Dict, args) -> List[GenerationParams]:
+    """Cartesian product of the parameter values given on the command line."""
+    grid = {
+        "temperature": args.temperature or [defaults.get("temperature", 0.7)],
+        "max_tokens": args.max_tokens or [defaults.get("max_tokens", 1000)],
+        "top_p": args.top_p or [defaults.get("top_p")],
+    }
+    return [
+        GenerationParams(temperature=t, max_tokens=m, top_p=p, timeout=args.timeout)
+        for t, m, p in itertools.product(grid["temperature"], grid["max_tokens"], grid["top_p"])
+    ]
+
+
+def parse_targets(values: List[str]) -> List[Tuple[str, str]]:
+    targets = []
+    for value in values:
+        provider, sep, model = value.partition(":")
+        provider = provider.strip().lower()
+        if not sep or not model or provider not in PROVIDER_CLIENTS:
+            raise SystemExit(f"Invalid --model '{value}'. Use provider:model with provider in {sorted(PROVIDER_CLIENTS)}")
+        targets.append((provider, model.strip()))
+    return targets
+
+
+def job_key(prompt_id: str, provider: str, model: str, params: GenerationParams) -> str:
+    payload = json.dumps([prompt_id, provider, model, asdict(params)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_completed_keys(output_path: str) -> Set[str]:
+    """Keys of successful rows already in the output file; a torn last line is ignored."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if row.get("status") == "ok":
+                completed.add(row["key"])
+    return completed
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BatchStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies: Dict[Tuple[str, str], List[float]] = {}
+        self.completion_tokens = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def record(self, result: GenerationResult):
+        if result.ok:
+            self.succeeded += 1
+            self.latencies.setdefault((result.provider, result.model), []).append(result.latency or 0.0)
+            self.completion_tokens += result.completion_tokens or 0
+        else:
+            self.failed += 1
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        done = self.succeeded + self.failed
+        lines = [
+            f"Completed {done} requests in {elapsed:.1f}s ({self.succeeded} ok, {self.failed} failed)",
+            f"Throughput: {done / elapsed if elapsed else 0:.2f} requests/s, "
+            f"{self.completion_tokens / elapsed if elapsed else 0:.1f} completion tokens/s",
+        ]
+        for (provider, model), values in sorted(self.latencies.items()):
+            values.sort()
+            p50, p90, p99 = (percentile(values, p) for p in (50, 90, 99))
+            lines.append(f"  {provider}:{model}  n={len(values)}  p50={p50:.2f}s  p90={p90:.2f}s  p99={p99:.2f}s")
+        return "\n".join(lines)
+
+
+def _result_row(key: str, prompt: Dict, params: GenerationParams, result: GenerationResult) -> Dict:
+    return {
+        "key": key,
+        "prompt_id": prompt["id"],
+        "provider": result.provider,
+        "model": result.model,
+        "parameters": asdict(params),
+        "status": "ok" if result.ok else "error",
+        "response": result.text,
+        "error": result.error,
+        "error_type": result.error_type,
+        "latency": result.latency,
+        "prompt_tokens": result.prompt_tokens,
+        "completion_tokens": result.completion_tokens,
+        "finish_reason": result.finish_reason,
+        "cached": bool(result.metadata.get("cache")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def run_batch(jobs: Dict[str, List[Tuple[str, Dict, str, GenerationParams]]], clients: Dict,
+                    output, stats: BatchStats, concurrency: int, use_cache: bool,
+                    progress_every: int = 25):
+    """
+    Run all jobs on the shared event loop with 'concurrency' workers per provider.
+
+    Args:
+        jobs: provider -> list of (key, prompt, model, params)
+        clients: provider -> client instance, built before the loop is entered
+        output: Text file opened for appending; one JSON line is written per result
+        stats: Collects latencies and counts
+        concurrency: Maximum in-flight requests per provider
+        use_cache: Serve and store answers through the response cache
+    """
+    async def worker(provider: str, client, queue: asyncio.Queue):
+        while True:
+            try:
+                key, prompt, model, params = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await client.agenerate(model, prompt["messages"], params, use_cache=use_cache)
+            except Exception as e:
+                result = GenerationResult(provider=provider, model=model, error=str(e), error_type=type(e).__name__)
+            stats.record(result)
+            output.write(json.dumps(_result_row(key, prompt, params, result), default=str) + "\n")
+            output.flush()
+            done = stats.succeeded + stats.failed
+            if done % progress_every == 0:
+                print(f"... {done} done ({stats.failed} failed)")
+
+    workers = []
+    for provider, provider_jobs in jobs.items():
+        client = clients[provider]
+        queue = asyncio.Queue()
+        for job in provider_jobs:
+            queue.put_nowait(job)
+        workers.extend(worker(provider, client, queue) for _ in range(min(concurrency, len(provider_jobs))))
+    await asyncio.gather(*workers)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run a prompt set against several LLMs and write JSONL results.")
+    parser.add_argument("prompts", help="JSONL file (or JSON object/list) with one prompt per record")
+    parser.add_argument("--model", action="append", required=True, metavar="PROVIDER:MODEL",
+                        help="Target model, e.g. openai:gpt-4o-mini; repeat for several")
+    parser.add_argument("--temperature", type=float, nargs="+", help="One or more temperatures to try")
+    parser.add_argument("--max-tokens", type=int, nargs="+", help="One or more max_tokens values to try")
+    parser.add_argument("--top-p", type=float, nargs="+", help="One or more top_p values to try")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum in-flight requests per provider")
+    parser.add_argument("--prompt-field", help="Record field holding the prompt text")
+    parser.add_argument("--output", default="batch_results.jsonl", help="Results file; existing results are resumed")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the provider, bypassing the response cache")
+    args = parser.parse_args(argv)
+
+    targets = parse_targets(args.model)
+    prompts = load_prompts(args.prompts, args.prompt_field)
+    param_sets = expand_params(settings.defaults, args)
+    completed = load_completed_keys(args.output)
+
+    jobs: Dict[str, List] = {}
+    total = skipped = 0
+    for prompt in prompts:
+        for (provider, model), params in itertools.product(targets, param_sets):
+            total += 1
+            key = job_key(prompt["id"], provider, model, params)
+            if key in completed:
+                skipped += 1
+                continue
+            jobs.setdefault(provider, []).append((key, prompt, model, params))
+
+    print(f"{len(prompts)} prompts x {len(targets)} models x {len(param_sets)} parameter sets = {total} runs; "
+          f"{skipped} already done")
+    if total == skipped:
+        return
+
+    # Client construction is blocking, so build every client before handing work to the event loop
+    clients = {provider: get_provider_client(provider) for provider in jobs}
+
+    stats = BatchStats()
+    with open(args.output, "a+", encoding="utf-8") as output:
+        # Start on a fresh line if the previous run died mid-write
+        if output.tell() > 0:
+            output.seek(output.tell() - 1)
+            if output.read(1) != "\n":
+                output.write("\n")
+        future = submit(run_batch(jobs, clients, output, stats, max(1, args.concurrency), not args.no_cache))
+        try:
+            future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            print("Interrupted; re-run the same command to resume")
+    print(stats.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, errors
+
+from app.database.db_connection import DEFAULT_DB_NAME, get_connection_registry
+from app.database.storage_backend import storage_backend
+from app.modelList.base_client import GenerationParams, GenerationResult
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def normalize_chat_history(chat_history: List[Dict]) -> List[Dict]:
+    """
+    Reduce messages to role and content with line endings and surrounding
+    whitespace normalized, so cosmetic differences do not split cache keys.
+    """
+    normalized = []
+    for msg in chat_history:
+        content = str(msg.get("content", "")).replace("\r\n", "\n").strip()
+        normalized.append({"role": str(msg.get("role", "")).strip().lower(), "content": content})
+    return normalized
+
+
+def make_cache_key(provider: str, selected_model: str, params: GenerationParams, chat_history: List[Dict]) -> str:
+    """
+    Stable SHA-256 key over provider, model, sampling parameters and the
+    normalized chat history. The request timeout is not part of the key.
+    """
+    payload = {
+        "provider": provider,
+        "model": selected_model,
+        "temperature": params.temperature,
+        "max_tokens": params.max_tokens,
+        "top_p": params.top_p,
+        "presence_penalty": params.presence_penalty,
+        "frequency_penalty": params.frequency_penalty,
+        "stop": params.stop,
+        "messages": normalize_chat_history(chat_history),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LRUCacheTier:
+    """Thread-safe in-memory LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict, ttl_seconds: Optional[int] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MongoCacheTier:
+    """
+    Persistent tier stored in the application database. A TTL index on
+    'expires_at' lets MongoDB expire entries, and the collection is trimmed
+    to max_documents by evicting the oldest entries.
+    """
+
+    def __init__(self, max_documents: int, db_name: str = DEFAULT_DB_NAME, collection_name: str = "response_cache"):
+        self.max_documents = max_documents
+        self.collection = get_connection_registry().get_collection(db_name, collection_name)
+        self._indexes_ready = False
+        self._writes_since_trim = 0
+        # After a failure the tier is skipped for a while instead of paying a server timeout per request
+        self._disabled_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    def _mark_failed(self, e: Exception):
+        print(f"Response cache persistence unavailable: {e}")
+        self._disabled_until = time.monotonic() + 30
+
+    def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self.collection.create_index([("created_at", ASCENDING)])
+        self._indexes_ready = True
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.available:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"value": 1})
+        except errors.PyMongoError as e:
+            self._mark_failed(e)
+            return None
+        return doc["value"] if doc else None
+
+    def set(self, key: str, value: Dict, ttl_seconds: int):
+        if not self.available:
+            return
+        now = datetime.utcnow()
+        try:
+            self._ensure_indexes()
+            self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "created_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)},
+                upsert=True
+            )
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 100:
+                self._writes_since_trim = 0
+                self._trim()
+        except errors.PyMongoError as e:
+            self._mark_failed(e)
+
+    def _trim(self):
+        excess = self.collection.estimated_document_count() - self.max_documents
+        if excess <= 0:
+            return
+        oldest = self.collection.find({}, {"_id": 1}).sort("created_at", ASCENDING).limit(excess)
+        self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+
+
+class ResponseCache:
+    """
+    Exact-match cache for generation results, consulted before any upstream
+    call. Lookups try the in-memory LRU first and then the MongoDB tier; a
+    persistent hit is promoted into memory.
+
+    Configuration (environment):
+        RESPONSE_CACHE_ENABLED (default on), RESPONSE_CACHE_PERSISTENT (default on with MongoDB storage),
+        RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_MAX_ENTRIES,
+        RESPONSE_CACHE_MAX_DOCUMENTS, RESPONSE_CACHE_MAX_RESPONSE_CHARS
+    """
+
+    CACHED_FIELDS = ("text", "prompt_tokens", "completion_tokens", "finish_reason")
+
+    def __init__(self):
+        self.enabled = _env_flag("RESPONSE_CACHE_ENABLED", True)
+        self.ttl_seconds = _env_int("RESPONSE_CACHE_TTL_S", 24 * 3600)
+        self.max_response_chars = _env_int("RESPONSE_CACHE_MAX_RESPONSE_CHARS", 100_000)
+        self.memory = LRUCacheTier(_env_int("RESPONSE_CACHE_MAX_ENTRIES", 1000), self.ttl_seconds)
+        self.persistent = None
+        # The persistent tier is a MongoDB collection, so it is off by default without MongoDB
+        if _env_flag("RESPONSE_CACHE_PERSISTENT", storage_backend() == "mongodb"):
+            self.persistent = MongoCacheTier(_env_int("RESPONSE_CACHE_MAX_DOCUMENTS", 100_000))
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "skipped": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str, provider: str, selected_model: str) -> Optional[GenerationResult]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return self._to_result(value, provider, selected_model, "memory")
+
+        if self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self._count("persistent_hits")
+                self.memory.set(key, value)
+                return self._to_result(value, provider, selected_model, "persistent")
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, result: GenerationResult):
+        if not result.ok or len(result.text) > self.max_response_chars:
+            self._count("skipped")
+            return
+        value = {name: getattr(result, name) for name in self.CACHED_FIELDS}
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            self.persistent.set(key, value, self.ttl_seconds)
+        self._count("stores")
+
+    # pymongo is blocking, so the async paths run lookups and stores in a worker thread
+
+    async def aget(self, key: str, provider: str, selected_model: str) -> Optional[GenerationResult]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return self._to_result(value, provider, selected_model, "memory")
+        if self.persistent is None:
+            self._count("misses")
+            return None
+        return await asyncio.to_thread(self.get, key, provider, selected_model)
+
+    async def aset(self, key: str, result: GenerationResult):
+        await asyncio.to_thread(self.set, key, result)
+
+    @staticmethod
+    def _to_result(value: Dict, provider: str, selected_model: str, tier: str) -> GenerationResult:
+        result = GenerationResult(provider=provider, model=selected_model, **value)
+        result.latency = 0.0
+        result.time_to_first_token = 0.0
+        result.metadata["cache"] = tier
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        stats["enabled"] = self.enabled
+        return stats
+
+    def clear(self):
+        self.memory.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide ResponseCache, creating it once."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase and collapse whitespace and punctuation into single spaces."""
+    return " ".join(_TOKEN_RE.findall(prompt.lower()))
+
+
+def make_scope(selected_model: str, parameters: Optional[Dict]) -> str:
+    """Prompts only match within the same model and sampling settings."""
+    parameters = parameters or {}
+    settings = {
+        name: parameters.get(name)
+        for name in ("temperature", "max_tokens", "top_p", "presence_penalty", "frequency_penalty")
+    }
+    return json.dumps({"model": selected_model, **settings}, sort_keys=True)
+
+
+class SimilarMatch:
+    __slots__ = ("entry_id", "similarity")
+
+    def __init__(self, entry_id, similarity: float):
+        self.entry_id = entry_id
+        self.similarity = similarity
+
+
+class SimilarityCache:
+    """
+    Near-duplicate prompt index using MinHash signatures and LSH banding.
+
+    Each prompt is reduced to word unigrams and bigrams, hashed with
+    num_perm universal hash functions, and its signature is split into
+    bands. Prompts sharing any band bucket within the same scope (model and
+    sampling settings) are candidates; the fraction of equal signature
+    slots estimates their Jaccard similarity, which must reach 'threshold'.
+
+    Lookup cost depends on the prompt length and the bucket sizes, not on
+    the number of indexed prompts. Only signatures and history ids are held
+    in memory; the stored answer is read from history on a hit.
+
+    Configuration (environment):
+        SIMILARITY_CACHE_ENABLED (default on), SIMILARITY_CACHE_THRESHOLD (default 0.8)
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 max_candidates: int = 200, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_candidates = max_candidates
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        # Signatures are kept as raw bytes, bucket and exact-match keys are hashed to ints, and
+        # single-entry buckets hold the id directly, so memory stays flat per indexed prompt
+        self._signatures: Dict[object, bytes] = {}
+        self._buckets: Dict[int, object] = {}
+        self._exact: Dict[int, object] = {}
+        self.loaded = False
+        self.counters = {"lookups": 0, "hits": 0, "exact_hits": 0}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _shingles(self, normalized: str) -> Iterable[str]:
+        words = normalized.split(" ")
+        shingles = set(words)
+        shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return shingles
+
+    def signature(self, prompt: str) -> Optional[np.ndarray]:
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in self._shingles(normalized)), dtype=np.uint64)
+        # (a * h + b) mod p for every (hash function, shingle) pair, then the minimum per hash function
+        permuted = ((np.outer(self._a, hashes) % _MERSENNE_PRIME) + self._b[:, None]) % _MERSENNE_PRIME
+        return (permuted.min(axis=1) & _MAX_HASH).astype(np.uint32)
+
+    def _band_keys(self, scope: str, signature: np.ndarray):
+        for band in range(self.bands):
+            yield hash((scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()))
+
+    def _bucket_members(self, key: int):
+        members = self._buckets.get(key)
+        if members is None:
+            return ()
+        return members if isinstance(members, list) else (members,)
+
+    @staticmethod
+    def _exact_key(scope: str, prompt: str) -> int:
+        return hash((scope, normalize_prompt(prompt)))
+
+    def add(self, entry_id, selected_model: str, parameters: Optional[Dict], prompt: str):
+        """Index one saved prompt under its history id."""
+        signature = self.signature(prompt)
+        if signature is None:
+            return
+        scope = make_scope(selected_model, parameters)
+        with self._lock:
+            if entry_id in self._signatures:
+                return
+            self._signatures[entry_id] = signature.tobytes()
+            self._exact[self._exact_key(scope, prompt)] = entry_id
+            for key in self._band_keys(scope, signature):
+                members = self._buckets.get(key)
+                if members is None:
+                    self._buckets[key] = entry_id
+                elif isinstance(members, list):
+                    members.append(entry_id)
+                else:
+                    self._buckets[key] = [members, entry_id]
+
+    def lookup(self, selected_model: str, parameters: Optional[Dict], prompt: str) -> Optional[SimilarMatch]:
+        """
+        Find the most similar indexed prompt for the same model and settings.
+
+        Returns:
+            SimilarMatch at or above the threshold, or None
+        """
+        scope = make_scope(selected_model, parameters)
+        with self._lock:
+            self.counters["lookups"] += 1
+            entry_id = self._exact.get(self._exact_key(scope, prompt))
+            if entry_id is not None:
+                self.counters["hits"] += 1
+                self.counters["exact_hits"] += 1
+                return SimilarMatch(entry_id, 1.0)
+
+        signature = self.signature(prompt)
+        if signature is None:
+            return None
+
+        best_id, best_score = None, 0.0
+        with self._lock:
+            seen = set()
+            for key in self._band_keys(scope, signature):
+                for candidate in self._bucket_members(key):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    stored = np.frombuffer(self._signatures[candidate], dtype=np.uint32)
+                    score = float(np.count_nonzero(stored == signature)) / self.num_perm
+                    if score > best_score:
+                        best_id, best_score = candidate, score
+                    if len(seen) >= self.max_candidates:
+                        break
+                if len(seen) >= self.max_candidates:
+                    break
+            if best_id is None or best_score < self.threshold:
+                return None
+            self.counters["hits"] += 1
+            return SimilarMatch(best_id, best_score)
+
+    def load_from_history(self, history_manager, batch_size: int = 1000):
+        """Index every single-turn prompt saved with its sampling settings."""
+        start = time.perf_counter()
+        count = 0
+        for doc in history_manager.iter_indexable_prompts(batch_size=batch_size):
+            self.add(doc["_id"], doc["model"], doc.get("parameters"), doc["prompt"])
+            count += 1
+        self.loaded = True
+        print(f"Similarity cache indexed {count} prompts in {time.perf_counter() - start:.2f} seconds")
+
+    def load_in_background(self, history_manager):
+        thread = threading.Thread(target=self.load_from_history, args=(history_manager,),
+                                  name="similarity-cache-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+        stats.update(indexed_prompts=len(self), buckets=len(self._buckets),
+                     threshold=self.threshold, loaded=self.loaded)
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_similarity_cache() -> SimilarityCache:
+    """Return the process-wide SimilarityCache, creating it once."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SimilarityCache(threshold=_env_float("SIMILARITY_CACHE_THRESHOLD", 0.8))
+    return _cache
+
+
+def similarity_cache_enabled() -> bool:
+    return os.getenv("SIMILARITY_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,171 @@
+"""
+Chat transcript kept in Streamlit's session_state, rebuilt from saved history.
+
+A session is resumed from its most recent SESSION_RESUME_TURNS saved turns
+in one indexed query, so resuming a long session costs the same as a short
+one. Older turns are loaded a page at a time (SESSION_PAGE_TURNS) when the
+user asks for them, into a display-only list above the live chat.
+
+Memory per browser session is capped: once chat_history grows past
+SESSION_MAX_MESSAGES, the oldest messages are dropped from session_state.
+They are already saved, so "Load earlier messages" brings them back on
+demand. The earlier-messages view has the same cap and drops its newest
+messages first, which the user has already scrolled past.
+
+Each message in chat_history has a parallel entry in chat_keys: the keyset
+cursor (timestamp, _id) of the history entry it was saved as, or None.
+Messages therefore stay plain {'role', 'content'} dictionaries that can be
+sent to any provider.
+"""
+import os
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+RESUME_TURNS = _env_int("SESSION_RESUME_TURNS", 20)
+PAGE_TURNS = _env_int("SESSION_PAGE_TURNS", 20)
+MAX_MESSAGES = max(2, _env_int("SESSION_MAX_MESSAGES", 200))
+
+
+def _entries_to_messages(entries):
+    """Newest-first history entries -> chronological messages and their keys."""
+    messages, keys = [], []
+    for entry in reversed(entries):
+        key = (entry["timestamp"], entry["_id"])
+        messages += [{"role": "user", "content": entry["prompt"]},
+                     {"role": "assistant", "content": entry["response"]}]
+        keys += [key, key]
+    return messages, keys
+
+
+def _clear_earlier(state):
+    state.earlier_messages = []
+    state.earlier_keys = []
+    state.earlier_hidden = 0
+
+
+def init_state(state):
+    for name, default in (("chat_history", []), ("chat_keys", []), ("older_available", False)):
+        if name not in state:
+            state[name] = default
+    if "earlier_messages" not in state:
+        _clear_earlier(state)
+
+
+def start_session(state, session_id):
+    """Switch to a new, empty session."""
+    state.session_id = session_id
+    state.chat_history = []
+    state.chat_keys = []
+    state.older_available = False
+    _clear_earlier(state)
+
+
+def resume_session(state, history_manager, session_id, turns=None):
+    """
+    Load the most recent turns of a saved session into the chat.
+
+    Returns:
+        Number of turns loaded
+    """
+    turns = turns or RESUME_TURNS
+    entries = history_manager.get_session_turns(session_id, limit=turns)
+    start_session(state, session_id)
+    state.chat_history, state.chat_keys = _entries_to_messages(entries)
+    state.older_available = len(entries) == turns
+    return len(entries)
+
+
+def add_user_message(state, content):
+    state.chat_history.append({"role": "user", "content": content})
+    state.chat_keys.append(None)
+
+
+def add_assistant_message(state, content, entry_id=None):
+    """
+    Append an answer; entry_id is the saved history entry for this prompt/answer pair.
+
+    The entry's timestamp is looked up only when it is needed as a cursor, so
+    saving stays a single queued write.
+    """
+    key = (None, entry_id) if entry_id is not None else None
+    state.chat_history.append({"role": "assistant", "content": content})
+    state.chat_keys.append(key)
+    if key is not None and len(state.chat_keys) > 1 and state.chat_history[-2]["role"] == "user":
+        state.chat_keys[-2] = key
+    _enforce_cap(state)
+
+
+def drop_last(state, count):
+    del state.chat_history[-count:]
+    del state.chat_keys[-count:]
+
+
+def _enforce_cap(state):
+    excess = len(state.chat_history) - MAX_MESSAGES
+    if excess <= 0:
+        return
+    # Keep the chat starting with a user message, as some providers require
+    while excess < len(state.chat_history) and state.chat_history[excess]["role"] != "user":
+        excess += 1
+    dropped_saved = any(key is not None for key in state.chat_keys[:excess])
+    del state.chat_history[:excess]
+    del state.chat_keys[:excess]
+    # Dropped turns now sit between the earlier view and the chat, so restart the earlier view
+    _clear_earlier(state)
+    state.older_available = state.older_available or dropped_saved
+
+
+def _resolve_key(history_manager, key):
+    """Fill in the timestamp of a key recorded at save time."""
+    if key[0] is not None:
+        return key
+    entry = history_manager.get_history_entry(key[1])
+    return (entry["timestamp"], key[1]) if entry else None
+
+
+def _oldest_cursor(state, history_manager):
+    keys = state.earlier_keys if state.earlier_messages else state.chat_keys
+    for key in keys:
+        if key is not None:
+            return _resolve_key(history_manager, key)
+    return None
+
+
+def load_earlier(state, history_manager, turns=None):
+    """
+    Prepend the page of turns just before the oldest one shown.
+
+    Returns:
+        Number of turns loaded
+    """
+    turns = turns or PAGE_TURNS
+    cursor = _oldest_cursor(state, history_manager)
+    if cursor is None:
+        state.older_available = False
+        return 0
+    entries = history_manager.get_session_turns(state.session_id, limit=turns, before=cursor)
+    messages, keys = _entries_to_messages(entries)
+    state.earlier_messages = messages + state.earlier_messages
+    state.earlier_keys = keys + state.earlier_keys
+    excess = len(state.earlier_messages) - MAX_MESSAGES
+    if excess > 0:
+        # Pairs are whole, so an even excess keeps user/assistant alignment
+        excess += excess % 2
+        del state.earlier_messages[-excess:]
+        del state.earlier_keys[-excess:]
+        state.earlier_hidden += excess
+    state.older_available = len(entries) == turns
+    return len(entries)
+
+
+def back_to_latest(state):
+    """Drop the earlier-messages view, freeing its memory."""
+    if state.earlier_messages:
+        state.older_available = any(key is not None for key in state.chat_keys)
+    _clear_earlier(state)
@@ -0,0 +1,255 @@
+"""
+Content-addressed storage for prompt and response bodies.
+
+With HISTORY_BLOBS=1, a prompt or response of at least HISTORY_BLOB_MIN_BYTES
+(default 256) is stored once in the 'history_blobs' collection under the
+SHA-256 of its text. The history document keeps only a reference
+('prompt_blob' / 'response_blob'), so a long system prompt or a repeated
+question costs one copy no matter how often it is saved. It also keeps the
+body's words for the search index (see history_search.py). Bodies of at least
+HISTORY_BLOB_COMPRESS_MIN_BYTES (default 1024) are compressed with zstd
+(HISTORY_BLOB_ZSTD_LEVEL, default 3) when the zstandard package is
+installed, else with zlib. The codec is recorded per blob.
+
+Reads resolve the references of a whole page with one $in query, through an
+LRU of decoded bodies (HISTORY_BLOB_CACHE_SIZE, default 1000). Documents
+without references are returned as they are, so both kinds can be mixed in
+one collection and the option can be switched off again at any time.
+Blobs are never deleted, since other history entries may share them.
+"""
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import os
+import threading
+import zlib
+
+from bson import Binary
+from pymongo import errors
+
+from app.database.history_search import search_copy, search_copy_field
+from app.database.history_writer import DUPLICATE_KEY
+
+BLOB_FIELDS = ("prompt", "response")
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def blobs_enabled():
+    return os.getenv("HISTORY_BLOBS", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def blob_ref_field(field):
+    return f"{field}_blob"
+
+
+# Projection that adds the references to one that selects the bodies
+BLOB_REF_PROJECTION = {blob_ref_field(field): 1 for field in BLOB_FIELDS}
+
+_zstd = None
+_zstd_loaded = False
+
+
+def _load_zstd():
+    """zstandard module, or None if it is not installed (imported once, on first use)."""
+    global _zstd, _zstd_loaded
+    if not _zstd_loaded:
+        try:
+            import zstandard
+            _zstd = zstandard
+        except ImportError:
+            print("Warning: zstandard is not installed; compressing history blobs with zlib")
+        _zstd_loaded = True
+    return _zstd
+
+
+class BlobStore:
+    """Deduplicated, optionally compressed text bodies keyed by SHA-256."""
+
+    def __init__(self, collection, min_bytes=None, compress_min_bytes=None, zstd_level=None, cache_size=None):
+        self.collection = collection
+        self.min_bytes = min_bytes if min_bytes is not None else _env_int("HISTORY_BLOB_MIN_BYTES", 256)
+        self.compress_min_bytes = (compress_min_bytes if compress_min_bytes is not None
+                                   else _env_int("HISTORY_BLOB_COMPRESS_MIN_BYTES", 1024))
+        self.zstd_level = zstd_level or _env_int("HISTORY_BLOB_ZSTD_LEVEL", 3)
+        self.cache_size = cache_size or _env_int("HISTORY_BLOB_CACHE_SIZE", 1000)
+        # Decoded bodies by id; also the ids this process knows are stored
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"blobs_written": 0, "raw_bytes_written": 0, "stored_bytes_written": 0,
+                         "deduplicated": 0, "cache_hits": 0, "cache_misses": 0, "missing": 0}
+
+    # --- encoding ---
+
+    def _compress(self, raw):
+        if len(raw) < self.compress_min_bytes:
+            return "raw", raw
+        zstd = _load_zstd()
+        if zstd is not None:
+            codec, data = "zstd", zstd.ZstdCompressor(level=self.zstd_level).compress(raw)
+        else:
+            codec, data = "zlib", zlib.compress(raw, 6)
+        # Keep incompressible bodies as they are
+        return (codec, data) if len(data) < len(raw) else ("raw", raw)
+
+    @staticmethod
+    def _decode(blob):
+        data, codec = bytes(blob["data"]), blob.get("codec", "raw")
+        if codec == "zstd":
+            zstd = _load_zstd()
+            if zstd is None:
+                raise ValueError("blob is zstd-compressed but zstandard is not installed")
+            data = zstd.ZstdDecompressor().decompress(data, max_output_size=blob.get("size", 0))
+        elif codec == "zlib":
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+    # --- cache ---
+
+    def _cache_get(self, blob_id):
+        with self._lock:
+            text = self._texts.get(blob_id)
+            if text is not None:
+                self._texts.move_to_end(blob_id)
+            return text
+
+    def _cache_set(self, blob_id, text):
+        with self._lock:
+            self._texts[blob_id] = text
+            self._texts.move_to_end(blob_id)
+            while len(self._texts) > self.cache_size:
+                self._texts.popitem(last=False)
+
+    # --- writes ---
+
+    def externalize(self, docs, fields=BLOB_FIELDS):
+        """
+        Copies of 'docs' with large bodies replaced by blob references and search copies.
+
+        New blobs are written first (one insert_many for the batch), so a
+        document is never stored before the bodies it refers to.
+
+        Raises:
+            PyMongoError: If the blobs could not be written
+        """
+        new_blobs, result = {}, []
+        for doc in docs:
+            doc = dict(doc)
+            for field in fields:
+                text = doc.get(field)
+                if not isinstance(text, str):
+                    continue
+                raw = text.encode("utf-8")
+                if len(raw) < self.min_bytes:
+                    continue
+                blob_id = hashlib.sha256(raw).hexdigest()
+                if blob_id in new_blobs or self._cache_get(blob_id) is not None:
+                    self.counters["deduplicated"] += 1
+                else:
+                    codec, data = self._compress(raw)
+                    new_blobs[blob_id] = ({"_id": blob_id, "codec": codec, "size": len(raw), "data": Binary(data),
+                                           "created_at": datetime.utcnow()}, text)
+                del doc[field]
+                doc[blob_ref_field(field)] = blob_id
+                doc[search_copy_field(field)] = search_copy(text)
+            result.append(doc)
+        if new_blobs:
+            self._insert([blob for blob, _ in new_blobs.values()])
+            for blob_id, (blob, text) in new_blobs.items():
+                self._cache_set(blob_id, text)
+        return result
+
+    def _insert(self, blobs):
+        try:
+            self.collection.insert_many(blobs, ordered=False)
+            written = blobs
+        except errors.BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY for err in write_errors):
+                raise
+            # Same id means same content, already stored by an earlier save or another process
+            duplicates = {err["index"] for err in write_errors}
+            written = [blob for i, blob in enumerate(blobs) if i not in duplicates]
+            self.counters["deduplicated"] += len(duplicates)
+        self.counters["blobs_written"] += len(written)
+        self.counters["raw_bytes_written"] += sum(blob["size"] for blob in written)
+        self.counters["stored_bytes_written"] += sum(len(blob["data"]) for blob in written)
+
+    # --- reads ---
+
+    def get_many(self, blob_ids):
+        """
+        Decoded bodies for blob_ids, fetching the uncached ones in one query.
+
+        Returns:
+            Dictionary of id -> text; unknown or unreadable ids are left out
+        """
+        texts, missing = {}, []
+        for blob_id in set(blob_ids):
+            text = self._cache_get(blob_id)
+            if text is None:
+                missing.append(blob_id)
+            else:
+                texts[blob_id] = text
+        self.counters["cache_hits"] += len(texts)
+        self.counters["cache_misses"] += len(missing)
+        if not missing:
+            return texts
+        try:
+            blobs = list(self.collection.find({"_id": {"$in": missing}}))
+        except errors.PyMongoError as e:
+            print(f"Failed to read history blobs: {e}")
+            return texts
+        for blob in blobs:
+            try:
+                texts[blob["_id"]] = self._decode(blob)
+            except (ValueError, zlib.error) as e:
+                print(f"Warning: Could not decode history blob {blob['_id']}: {e}")
+                continue
+            self._cache_set(blob["_id"], texts[blob["_id"]])
+        self.counters["missing"] += len(missing) - len(blobs)
+        return texts
+
+    def resolve(self, docs, fields=BLOB_FIELDS):
+        """Replace blob references in 'docs' (in place) with their bodies. Returns docs."""
+        refs = [doc[blob_ref_field(field)] for doc in docs for field in fields if blob_ref_field(field) in doc]
+        if not refs:
+            return docs
+        texts = self.get_many(refs)
+        for doc in docs:
+            for field in fields:
+                blob_id = doc.pop(blob_ref_field(field), None)
+                doc.pop(search_copy_field(field), None)
+                if blob_id is not None:
+                    doc[field] = texts.get(blob_id, "")
+        return docs
+
+    def stats(self):
+        with self._lock:
+            cached = len(self._texts)
+        return {**self.counters, "cached": cached, "codec": "zstd" if _load_zstd() is not None else "zlib"}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(collection):
+    """Return the process-wide blob store for a collection, creating it once."""
+    key = (id(collection.database.client), collection.database.name, collection.name)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = BlobStore(collection)
+    return store
+
+
+def blob_store_stats():
+    return {f"{db}.{coll}": store.stats() for (_, db, coll), store in _stores.items()}
@@ -1,10 +1,13 @@
-from pymongo import MongoClient, errors
+from pymongo import errors
 from datetime import datetime
 import os
 
+from app.database.db_connection import DEFAULT_DB_NAME, get_connection_registry
+from app.database.user_configuration_manager import PREFERENCE_PROJECTION
+
 class User_Config_Manager:
-    def __init__(self, uri=None, db_name="llmExperimenter", collection_name="user_configuration"):
-        self.mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    def __init__(self, uri=None, db_name=DEFAULT_DB_NAME, collection_name="user_configuration"):
+        self.mongo_uri = uri or os.getenv("MONGO_URI", "mongodb://localhost:27017/")
         self.db_name = db_name
         self.collection_name = collection_name
         self.client = None
@@ -13,7 +16,7 @@ class User_Config_Manager:
 
     def _connect_to_db(self):
         try:
-            self.client = MongoClient(self.mongo_uri)
+            self.client = get_connection_registry().get_client(self.mongo_uri)
             db = self.client[self.db_name]
             self.collection = db[self.collection_name]
         except errors.ConnectionFailure as e:
@@ -22,12 +25,13 @@ class User_Config_Manager:
 
     def get_user_configs(self, user_email):
         try:
-            cursor = self.collection.find({"email": user_email})
+            cursor = self.collection.find({"email": user_email}, PREFERENCE_PROJECTION)
             return list(cursor)
         except errors.PyMongoError as e:
             print(f"Failed to retrieve user configurations: {e}")
             return []
 
     def close_connection(self):
-        if self.client:
-            self.client.close()
\ No newline at end of file
+        # The client is shared through the connection registry, so only drop this manager's handle
+        self.client = None
+        self.collection = None
\ No newline at end of file
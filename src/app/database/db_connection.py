@@ -0,0 +1,229 @@
+from pymongo import MongoClient, errors, monitoring
+from dotenv import load_dotenv
+import os
+import threading
+import time
+
+from app.metrics import MongoCommandMetrics
+
+load_dotenv()
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Warning: Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+# Database used by the application collections unless a manager is given another name
+DEFAULT_DB_NAME = os.getenv("MONGO_DB_NAME", "llmExperimenter")
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that keeps running counters for every pool
+    owned by the registry. All callbacks run on pymongo's own threads, so
+    updates are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools_created = 0
+        self.pools_cleared = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_failures = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkout_wait_total = 0.0
+        self._checkout_started = {}
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools_created += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._checkout_started.pop(threading.get_ident(), None)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            started = self._checkout_started.pop(threading.get_ident(), None)
+            if started is not None:
+                self.checkout_wait_total += time.perf_counter() - started
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(0, self.in_use - 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pools_created": self.pools_created,
+                "pools_cleared": self.pools_cleared,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "connections_open": self.connections_created - self.connections_closed,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checkout_failures": self.checkout_failures,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "avg_checkout_wait_ms": (self.checkout_wait_total / self.checkouts * 1000) if self.checkouts else 0.0,
+            }
+
+
+class MongoConnectionRegistry:
+    """
+    Process-wide registry of pooled MongoClient instances, one per URI.
+
+    MongoClient is thread-safe and owns its own connection pool, so every
+    database manager in the process should share the same instance instead
+    of opening a new client per manager or per Streamlit rerun.
+
+    Pool size, timeouts and heartbeat interval are read from the environment:
+        MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+        MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS,
+        MONGO_SOCKET_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        MONGO_HEARTBEAT_FREQUENCY_MS, MONGO_HEALTH_CHECK_INTERVAL_S
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.pool_metrics = PoolMetrics()
+        self.command_metrics = MongoCommandMetrics()
+        self._last_health = None
+        self._last_health_at = 0.0
+
+    def _client_options(self):
+        return {
+            "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 50),
+            "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+            "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS", 60000),
+            "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000),
+            "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+            "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS", 30000),
+            "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+            "heartbeatFrequencyMS": _env_int("MONGO_HEARTBEAT_FREQUENCY_MS", 10000),
+        }
+
+    def get_client(self, uri=None):
+        """
+        Return the shared MongoClient for the given URI, creating it on first use.
+
+        Args:
+            uri: MongoDB connection string; defaults to MONGO_URI
+
+        Returns:
+            Shared MongoClient instance
+        """
+        if uri is None:
+            uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+        client = self._clients.get(uri)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(uri)
+            if client is None:
+                try:
+                    # MongoClient connects lazily, so this does not block on the network
+                    client = MongoClient(uri, event_listeners=[self.pool_metrics, self.command_metrics], **self._client_options())
+                except errors.ConfigurationError as e:
+                    print(f"MongoDB client configuration failed: {e}")
+                    raise
+                self._clients[uri] = client
+        return client
+
+    def get_collection(self, db_name, collection_name, uri=None):
+        return self.get_client(uri)[db_name][collection_name]
+
+    def health_check(self, uri=None, force=False):
+        """
+        Ping the server and report round-trip time.
+
+        Results are cached for MONGO_HEALTH_CHECK_INTERVAL_S seconds so callers
+        on the request path can check health without adding a round trip.
+
+        Returns:
+            Dictionary with 'ok', 'latency_ms' and 'error' keys
+        """
+        interval = _env_int("MONGO_HEALTH_CHECK_INTERVAL_S", 15)
+        now = time.monotonic()
+        if not force and self._last_health is not None and now - self._last_health_at < interval:
+            return self._last_health
+
+        start = time.perf_counter()
+        try:
+            self.get_client(uri).admin.command("ping")
+            result = {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000, "error": None}
+        except errors.PyMongoError as e:
+            result = {"ok": False, "latency_ms": (time.perf_counter() - start) * 1000, "error": str(e)}
+        self._last_health = result
+        self._last_health_at = now
+        return result
+
+    def pool_stats(self):
+        stats = self.pool_metrics.snapshot()
+        stats["clients"] = len(self._clients)
+        stats["max_pool_size"] = self._client_options()["maxPoolSize"]
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_connection_registry():
+    """
+    Return the process-wide MongoConnectionRegistry, creating it once.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MongoConnectionRegistry()
+    return _registry
@@ -0,0 +1,289 @@
+"""
+History stored as per-session bucket documents.
+
+Each bucket holds up to HISTORY_BUCKET_MAX_TURNS prompt/response pairs of one
+session (and at most HISTORY_BUCKET_MAX_BYTES of them), plus running metadata:
+
+    {"session_id", "user", "count", "bytes", "first_timestamp",
+     "last_timestamp", "models": [...], "turns": [{"_id", "model", "prompt",
+     "response", "timestamp", "parameters"?, "context_turns"?}, ...]}
+
+A save is a single upsert that $pushes the turn onto the session's bucket
+that still has room, or creates a new one. Reading a session therefore
+fetches one or two documents instead of one per turn, and the indexes grow
+with the number of buckets rather than the number of turns.
+
+Turns keep the _id they are given at save time, so entry ids, keyset
+cursors and the background writer work as in the one-document-per-turn
+layout. Select the layout with HISTORY_LAYOUT=buckets; existing collections
+are converted with app/database/migrate_history.py.
+"""
+from pymongo import ASCENDING, DESCENDING, UpdateOne, errors
+import bson
+import os
+
+from app.database.db_connection import DEFAULT_DB_NAME
+from app.database.blob_store import BLOB_REF_PROJECTION
+from app.database.db_history_manager import TURN_PROJECTION, HistoryManager, ensure_text_index
+from app.database.history_search import date_filter, match_score, mongo_search, parse_search_query, search_result
+from app.database.history_writer import HistoryWriter
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+BUCKET_MAX_TURNS = max(1, _env_int("HISTORY_BUCKET_MAX_TURNS", 100))
+# Far below MongoDB's 16 MB document limit, so a session page is a small read
+BUCKET_MAX_BYTES = _env_int("HISTORY_BUCKET_MAX_BYTES", 2 * 1024 * 1024)
+
+# Stored once per bucket rather than in each turn
+BUCKET_FIELDS = ("user", "session_id")
+HEADER_PROJECTION = {"turns": 0}
+
+
+def split_history_doc(history_doc):
+    """One-document-per-turn history doc -> (session_id, user, turn)."""
+    turn = {field: value for field, value in history_doc.items() if field not in BUCKET_FIELDS}
+    return history_doc["session_id"], history_doc.get("user"), turn
+
+
+def bucket_update(history_doc, max_turns=None, max_bytes=None):
+    """
+    Upsert that appends one history doc to its session's open bucket.
+
+    Returns:
+        (filter, update) for update_one(..., upsert=True)
+    """
+    max_turns = max_turns or BUCKET_MAX_TURNS
+    max_bytes = max_bytes or BUCKET_MAX_BYTES
+    session_id, user, turn = split_history_doc(history_doc)
+    size = len(bson.encode(turn))
+    # A turn larger than max_bytes matches no bucket and gets one of its own
+    bucket_filter = {"session_id": session_id, "count": {"$lt": max_turns}, "bytes": {"$lte": max_bytes - size}}
+    update = {
+        "$push": {"turns": turn},
+        "$inc": {"count": 1, "bytes": size},
+        "$min": {"first_timestamp": turn["timestamp"]},
+        "$max": {"last_timestamp": turn["timestamp"]},
+        "$addToSet": {"models": turn["model"]},
+        "$setOnInsert": {"user": user},
+    }
+    return bucket_filter, update
+
+
+def stored_turn_ids(collection, turn_ids):
+    """The subset of turn_ids already stored in a bucket collection."""
+    if not turn_ids:
+        return set()
+    stored = collection.distinct("turns._id", {"turns._id": {"$in": list(turn_ids)}})
+    return set(stored) & set(turn_ids)
+
+
+def flatten_turn(bucket, turn):
+    """Bucket turn -> history entry shaped like a one-document-per-turn doc."""
+    entry = dict(turn)
+    for field in BUCKET_FIELDS:
+        if field in bucket:
+            entry[field] = bucket[field]
+    return entry
+
+
+class BucketWriter(HistoryWriter):
+    """
+    HistoryWriter that appends queued turns to session buckets.
+
+    A batch is one ordered bulk_write of bucket upserts, so turns of the same
+    session fill buckets in the order they were saved. $push is not idempotent,
+    so turns already stored (a retried or replayed batch) are skipped with one
+    indexed lookup per batch, as duplicate-key errors are for insert_many.
+    """
+
+    def _insert(self, docs):
+        try:
+            stored = stored_turn_ids(self.collection, [doc["_id"] for doc in docs])
+            todo = [doc for doc in docs if doc["_id"] not in stored]
+            if todo:
+                updates = [UpdateOne(*bucket_update(doc), upsert=True) for doc in self._prepare(todo)]
+                self.collection.bulk_write(updates, ordered=True)
+            return []
+        except errors.BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                print(f"Warning: History batch written with write concern errors: {e.details['writeConcernErrors']}")
+            write_errors = e.details.get("writeErrors", [])
+            # An ordered bulk write stops at the first error; everything from there on was not written
+            return todo[write_errors[0]["index"]:] if write_errors else []
+        except errors.PyMongoError as e:
+            print(f"Failed to write history batch of {len(docs)}: {e}")
+            return docs
+
+
+class BucketedHistoryManager(HistoryManager):
+    """History stored as per-session bucket documents (HISTORY_LAYOUT=buckets)."""
+
+    writer_class = BucketWriter
+
+    def __init__(self, uri=None, db_name=DEFAULT_DB_NAME, collection_name="history_buckets", async_writes=None,
+                 store_blobs=None):
+        super().__init__(uri=uri, db_name=db_name, collection_name=collection_name, async_writes=async_writes,
+                         store_blobs=store_blobs)
+
+    def _write_now(self, history_doc):
+        try:
+            self.collection.update_one(*bucket_update(history_doc), upsert=True)
+            return history_doc["_id"]
+        except errors.PyMongoError as e:
+            print(f"Failed to insert history document: {e}")
+            raise
+
+    def ensure_indexes(self):
+        """Indexes for finding a session's or user's newest buckets, a turn by its _id, and for search."""
+        try:
+            self.collection.create_index(
+                [("session_id", ASCENDING), ("last_timestamp", DESCENDING)], name="session_last_timestamp")
+            self.collection.create_index(
+                [("user", ASCENDING), ("last_timestamp", DESCENDING)], name="user_last_timestamp")
+            self.collection.create_index([("turns._id", ASCENDING)], name="turn_id")
+            ensure_text_index(self.collection, prefix="turns.")
+        except errors.PyMongoError as e:
+            print(f"Failed to create history indexes: {e}")
+
+    def _bucket_entries(self, match, limit, before, projection=None):
+        """
+        Newest-first turns from the buckets matching 'match', as flat history entries.
+
+        Buckets are read newest first until no remaining bucket can hold a turn
+        newer than the oldest of the 'limit' collected; for a session that is
+        usually the newest bucket alone.
+        """
+        query = dict(match)
+        if before is not None:
+            query["first_timestamp"] = {"$lte": before[0]}
+        # Small batches: a bucket can be large and the first one or two are usually enough
+        cursor = self.collection.find(query, projection).sort("last_timestamp", DESCENDING).batch_size(2)
+        entries = []
+        for bucket in cursor:
+            if len(entries) >= limit and bucket["last_timestamp"] < entries[limit - 1]["timestamp"]:
+                break
+            for turn in bucket.get("turns", []):
+                if before is None or (turn["timestamp"], turn["_id"]) < tuple(before):
+                    entries.append(flatten_turn(bucket, turn))
+            entries.sort(key=lambda entry: (entry["timestamp"], entry["_id"]), reverse=True)
+        return entries[:limit]
+
+    def _query_history(self, match, limit, before, preview_chars):
+        try:
+            entries = self._resolve(self._bucket_entries(match, limit, before))
+        except errors.PyMongoError as e:
+            print(f"Failed to retrieve history: {e}")
+            return []
+        if preview_chars:
+            for entry in entries:
+                for field in ("prompt", "response"):
+                    entry[f"{field}_truncated"] = len(entry[field]) > preview_chars
+                    entry[field] = entry[field][:preview_chars]
+        return entries
+
+    def get_session_turns(self, session_id, limit=20, before=None):
+        fields = ("_id", *TURN_PROJECTION, *BLOB_REF_PROJECTION)
+        projection = {"last_timestamp": 1, **{f"turns.{field}": 1 for field in fields}}
+        try:
+            entries = self._resolve(self._bucket_entries({"session_id": session_id}, limit, before, projection))
+        except errors.PyMongoError as e:
+            print(f"Failed to retrieve session turns: {e}")
+            return []
+        return self._merge_pending_turns(entries, session_id, limit, before)
+
+    def get_session_summary(self, session_id):
+        """
+        Running metadata of a session, read from its bucket headers only.
+
+        Returns:
+            {'turns', 'buckets', 'first_timestamp', 'last_timestamp', 'models'}, or None if unknown
+        """
+        try:
+            buckets = list(self.collection.find({"session_id": session_id}, HEADER_PROJECTION))
+        except errors.PyMongoError as e:
+            print(f"Failed to retrieve session summary: {e}")
+            return None
+        if not buckets:
+            return None
+        return {
+            "turns": sum(bucket["count"] for bucket in buckets),
+            "buckets": len(buckets),
+            "first_timestamp": min(bucket["first_timestamp"] for bucket in buckets),
+            "last_timestamp": max(bucket["last_timestamp"] for bucket in buckets),
+            "models": sorted({model for bucket in buckets for model in bucket.get("models", [])}),
+        }
+
+    def search_history(self, user, query, model=None, since=None, until=None, limit=20, offset=0):
+        """
+        Same as HistoryManager.search_history, over session buckets.
+
+        The text index finds the buckets holding all the clauses, most relevant
+        first; within each bucket the turns that contain them are ranked by
+        match_score. Buckets are read until offset + limit + 1 turns are found.
+        """
+        clauses = parse_search_query(query)
+        if not clauses:
+            return [], False
+        match = {"user": user, "$text": {"$search": mongo_search(clauses)},
+                 **date_filter("last_timestamp", since, None), **date_filter("first_timestamp", None, until)}
+        if model:
+            match["models"] = model
+        wanted = offset + limit + 1
+        results = []
+        try:
+            cursor = (self.collection.find(match, {"score": {"$meta": "textScore"}, "session_id": 1, "turns": 1})
+                      .sort([("score", {"$meta": "textScore"}), ("last_timestamp", DESCENDING)]).batch_size(2))
+            for bucket in cursor:
+                turns = [flatten_turn(bucket, turn) for turn in bucket.get("turns", [])
+                         if (not model or turn["model"] == model)
+                         and (since is None or turn["timestamp"] >= since)
+                         and (until is None or turn["timestamp"] < until)]
+                scored = [(match_score(turn, clauses), turn) for turn in self._resolve(turns)]
+                scored = sorted((item for item in scored if item[0]), key=lambda item: item[0], reverse=True)
+                results.extend(search_result(turn, clauses, score) for score, turn in scored)
+                if len(results) >= wanted:
+                    break
+        except errors.PyMongoError as e:
+            print(f"Failed to search history: {e}")
+            return [], False
+        return results[offset:offset + limit], len(results) > offset + limit
+
+    def get_history_entry(self, entry_id):
+        if self.writer is not None:
+            pending = self.writer.get_pending(entry_id)
+            if pending is not None:
+                return pending
+        try:
+            bucket = self.collection.find_one({"turns._id": entry_id},
+                                              {"user": 1, "session_id": 1, "turns": {"$elemMatch": {"_id": entry_id}}})
+        except errors.PyMongoError as e:
+            print(f"Failed to retrieve history entry: {e}")
+            return None
+        if not bucket or not bucket.get("turns"):
+            return None
+        return self._resolve([flatten_turn(bucket, bucket["turns"][0])])[0]
+
+    def iter_indexable_prompts(self, batch_size=1000):
+        try:
+            cursor = self.collection.find(
+                {"turns": {"$elemMatch": {"context_turns": 0, "parameters": {"$exists": True}}}},
+                {f"turns.{field}": 1 for field in ("_id", "prompt", "prompt_blob", "model", "parameters", "context_turns")}
+            ).batch_size(max(1, batch_size // BUCKET_MAX_TURNS))
+            batch = []
+            for bucket in cursor:
+                for turn in bucket["turns"]:
+                    if turn.get("context_turns") == 0 and "parameters" in turn:
+                        turn.pop("context_turns")
+                        batch.append(turn)
+                if len(batch) >= batch_size:
+                    yield from self._resolve(batch)
+                    batch = []
+            yield from self._resolve(batch)
+        except errors.PyMongoError as e:
+            print(f"Failed to read prompts for indexing: {e}")
@@ -1,26 +1,92 @@
-from pymongo import MongoClient, errors
+from pymongo import ASCENDING, DESCENDING, TEXT, errors
+from bson import ObjectId
 from datetime import datetime
 import os
 
+from app.database.blob_store import (BLOB_FIELDS, BLOB_REF_PROJECTION, blob_ref_field, blobs_enabled,
+                                     get_blob_store)
+from app.database.db_connection import DEFAULT_DB_NAME, get_connection_registry
+from app.database.history_search import (date_filter, mongo_search, parse_search_query, search_result,
+                                         text_index_weights)
+from app.database.history_writer import HistoryWriter, get_history_writer
+from app.database.storage_backend import storage_backend
+
+# Fields needed to rebuild chat turns (plus _id, which find returns by default)
+TURN_PROJECTION = {"timestamp": 1, "prompt": 1, "response": 1}
+
+# Shared by both layouts, so migrating between them keeps the references valid
+BLOB_COLLECTION = "history_blobs"
+
+
+def ensure_text_index(collection, prefix=""):
+    """
+    Create the history_text search index over the bodies and their search copies.
+
+    Prefixed by user, so every search is scoped to one user's entries. A
+    collection has at most one text index, so one created with other fields
+    by an earlier version is replaced.
+    """
+    weights = text_index_weights(prefix)
+    keys = [("user", ASCENDING), *((field, TEXT) for field in weights)]
+    try:
+        collection.create_index(keys, name="history_text", weights=weights)
+    except errors.OperationFailure:
+        print("Rebuilding the history_text index to cover the search copies of stored bodies")
+        collection.drop_index("history_text")
+        collection.create_index(keys, name="history_text", weights=weights)
+
+
 class HistoryManager:
-    def __init__(self, uri=None, db_name="llmExperimenter", collection_name="history"):
-        self.mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    """History stored as one document per prompt/response pair."""
+
+    writer_class = HistoryWriter
+    # Resolves prompt/response blob references on read; with store_blobs, saves create them
+    blobs = None
+    store_blobs = False
+
+    def __init__(self, uri=None, db_name=DEFAULT_DB_NAME, collection_name="history", async_writes=None,
+                 store_blobs=None):
+        self.mongo_uri = uri or os.getenv("MONGO_URI", "mongodb://localhost:27017/")
         self.db_name = db_name
         self.collection_name = collection_name
         self.client = None
         self.collection = None
         self._connect_to_db()
+        self.blobs = get_blob_store(self.collection.database[BLOB_COLLECTION])
+        self.store_blobs = blobs_enabled() if store_blobs is None else store_blobs
+        if async_writes is None:
+            async_writes = os.getenv("HISTORY_ASYNC_WRITES", "1").strip().lower() in ("1", "true", "yes", "on")
+        # Saves go through a shared background writer instead of a round trip per answer
+        self.writer = (get_history_writer(self.collection, self.writer_class, self.blobs if self.store_blobs else None)
+                       if async_writes else None)
 
     def _connect_to_db(self):
         try:
-            self.client = MongoClient(self.mongo_uri)
+            self.client = get_connection_registry().get_client(self.mongo_uri)
             db = self.client[self.db_name]
             self.collection = db[self.collection_name]
         except errors.ConnectionFailure as e:
             print(f"MongoDB connection failed: {e}")
             raise
 
-    def save_history(self, user, session_id, model, prompt, response):
+    def save_history(self, user, session_id, model, prompt, response, parameters=None, context_turns=None):
+        """
+        Save one prompt/response pair.
+
+        Args:
+            parameters: Optional sampling settings used for the answer
+            context_turns: Optional number of chat messages sent before the prompt
+
+        Returns:
+            The new document's _id (assigned before the write, which may still be queued)
+        """
+        history_doc = self._build_history_doc(user, session_id, model, prompt, response, parameters, context_turns)
+        if self.writer is not None:
+            return self.writer.submit(history_doc)
+        return self._write_now(self._externalize(history_doc))
+
+    @staticmethod
+    def _build_history_doc(user, session_id, model, prompt, response, parameters, context_turns):
         if not all([user, session_id, model, prompt, response]):
             raise ValueError("All fields are required to save history.")
         history_doc = {
@@ -31,22 +97,258 @@ class HistoryManager:
             "response": response,
             "timestamp": datetime.utcnow()
         }
+        if parameters is not None:
+            history_doc["parameters"] = parameters
+        if context_turns is not None:
+            history_doc["context_turns"] = context_turns
+        history_doc["_id"] = ObjectId()
+        return history_doc
+
+    def _externalize(self, history_doc):
+        """history_doc with large bodies moved to the blob store, if enabled."""
+        if not self.store_blobs:
+            return history_doc
+        try:
+            return self.blobs.externalize([history_doc])[0]
+        except errors.PyMongoError as e:
+            print(f"Failed to store history bodies: {e}")
+            raise
+
+    def _resolve(self, entries, preview_chars=None):
+        """
+        Replace blob references in 'entries' with their bodies, in one batch.
+
+        Args:
+            preview_chars: Truncate resolved bodies like the server-side previews
+
+        Returns:
+            entries
+        """
+        refs = [(entry, field) for entry in entries for field in BLOB_FIELDS if blob_ref_field(field) in entry]
+        if not refs or self.blobs is None:
+            return entries
+        self.blobs.resolve(entries)
+        if preview_chars:
+            for entry, field in refs:
+                entry[f"{field}_truncated"] = len(entry[field]) > preview_chars
+                entry[field] = entry[field][:preview_chars]
+        return entries
+
+    def _write_now(self, history_doc):
         try:
-            self.collection.insert_one(history_doc)
+            return self.collection.insert_one(history_doc).inserted_id
         except errors.PyMongoError as e:
             print(f"Failed to insert history document: {e}")
             raise
 
-    def get_history(self, user, limit=10):
+    def ensure_indexes(self):
+        """Create the compound indexes behind the session and user history queries, and the search index."""
         try:
-            cursor = self.collection.find({"user": user})\
-                                    .sort("timestamp", -1)\
-                                    .limit(limit)
-            return list(cursor)
+            self.collection.create_index(
+                [("session_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                name="session_timestamp")
+            self.collection.create_index(
+                [("user", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                name="user_timestamp")
+            ensure_text_index(self.collection)
+        except errors.PyMongoError as e:
+            print(f"Failed to create history indexes: {e}")
+
+    @staticmethod
+    def next_page_cursor(entries, limit):
+        """Keyset cursor for the page after 'entries', or None if this was the last page."""
+        if len(entries) < limit:
+            return None
+        return entries[-1]["timestamp"], entries[-1]["_id"]
+
+    @staticmethod
+    def _keyset_filter(match, before):
+        """'match' restricted to entries older than the keyset cursor (timestamp, _id)."""
+        query = dict(match)
+        if before is not None:
+            timestamp, entry_id = before
+            query["$or"] = [{"timestamp": {"$lt": timestamp}},
+                            {"timestamp": timestamp, "_id": {"$lt": entry_id}}]
+        return query
+
+    def _query_history(self, match, limit, before, preview_chars):
+        """
+        Newest-first history entries matching 'match'.
+
+        Args:
+            match: Equality filter on an indexed field (session_id or user)
+            limit: Maximum entries to return
+            before: Keyset cursor (timestamp, _id) from next_page_cursor; None for the first page
+            preview_chars: Truncate prompt and response to this many characters on the server
+
+        Returns:
+            List of history documents; previews carry prompt_truncated / response_truncated flags
+        """
+        pipeline = [
+            {"$match": self._keyset_filter(match, before)},
+            {"$sort": {"timestamp": -1, "_id": -1}},
+            {"$limit": limit},
+        ]
+        if preview_chars:
+            # Bodies kept in the blob store are truncated after they are resolved
+            pipeline.append({"$project": {
+                "timestamp": 1, "model": 1, "session_id": 1, "user": 1, **BLOB_REF_PROJECTION,
+                "prompt": {"$substrCP": [{"$ifNull": ["$prompt", ""]}, 0, preview_chars]},
+                "response": {"$substrCP": [{"$ifNull": ["$response", ""]}, 0, preview_chars]},
+                "prompt_truncated": {"$gt": [{"$strLenCP": {"$ifNull": ["$prompt", ""]}}, preview_chars]},
+                "response_truncated": {"$gt": [{"$strLenCP": {"$ifNull": ["$response", ""]}}, preview_chars]},
+            }})
+        try:
+            return self._resolve(list(self.collection.aggregate(pipeline)), preview_chars)
         except errors.PyMongoError as e:
             print(f"Failed to retrieve history: {e}")
             return []
 
+    def get_session_history(self, session_id, limit=10, before=None, preview_chars=None):
+        """Entries of one chat session, newest first. See _query_history for the arguments."""
+        return self._query_history({"session_id": session_id}, limit, before, preview_chars)
+
+    def get_session_turns(self, session_id, limit=20, before=None):
+        """
+        Newest prompt/response pairs of a session, for rebuilding the chat.
+
+        One query on the session_timestamp index, projected to the fields the
+        chat needs, so the cost depends on 'limit' and not on the session length.
+        Saves still queued in the background writer are included.
+
+        Args:
+            session_id: Chat session to read
+            limit: Maximum entries to return
+            before: Keyset cursor (timestamp, _id); None for the newest entries
+
+        Returns:
+            List of {'_id', 'timestamp', 'prompt', 'response'} dictionaries, newest first
+        """
+        try:
+            entries = list(self.collection.find(self._keyset_filter({"session_id": session_id}, before),
+                                                {**TURN_PROJECTION, **BLOB_REF_PROJECTION})
+                           .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+                           .limit(limit))
+            self._resolve(entries)
+        except errors.PyMongoError as e:
+            print(f"Failed to retrieve session turns: {e}")
+            return []
+        return self._merge_pending_turns(entries, session_id, limit, before)
+
+    def _merge_pending_turns(self, entries, session_id, limit, before):
+        """Add a session's turns still queued in the background writer to newest-first 'entries'."""
+        pending = self.writer.get_pending_matching("session_id", session_id) if self.writer is not None else []
+        if pending:
+            seen = {entry["_id"] for entry in entries}
+            for doc in pending:
+                if doc["_id"] not in seen and (before is None or (doc["timestamp"], doc["_id"]) < tuple(before)):
+                    entries.append({field: doc[field] for field in ("_id", *TURN_PROJECTION)})
+            entries.sort(key=lambda entry: (entry["timestamp"], entry["_id"]), reverse=True)
+            entries = entries[:limit]
+        return entries
+
+    def get_user_history(self, user, limit=10, before=None, preview_chars=None):
+        """Entries of one user across sessions, newest first. See _query_history for the arguments."""
+        return self._query_history({"user": user}, limit, before, preview_chars)
+
+    def get_history(self, user, limit=10):
+        return self.get_user_history(user, limit=limit)
+
+    def search_history(self, user, query, model=None, since=None, until=None, limit=20, offset=0):
+        """
+        Full-text search over one user's prompts and responses, most relevant first.
+
+        Served by the history_text index, which MongoDB updates with every
+        insert; answers still queued in the background writer are not found yet.
+
+        Args:
+            user: Whose history to search
+            query: Words and "quoted phrases", all of which must match (see history_search.py)
+            model: Only entries answered by this model
+            since, until: Only entries saved at or after 'since' and before 'until'
+            limit: Results per page
+            offset: Results to skip, for later pages
+
+        Returns:
+            (results, has_more): results have _id, session_id, model, timestamp, score and
+            highlighted prompt/response snippets
+        """
+        clauses = parse_search_query(query)
+        if not clauses:
+            return [], False
+        match = {"user": user, "$text": {"$search": mongo_search(clauses)}, **date_filter("timestamp", since, until)}
+        if model:
+            match["model"] = model
+        projection = {"score": {"$meta": "textScore"}, "session_id": 1, "model": 1, "timestamp": 1,
+                      "prompt": 1, "response": 1, **BLOB_REF_PROJECTION}
+        try:
+            docs = list(self.collection.find(match, projection)
+                        .sort([("score", {"$meta": "textScore"}), ("timestamp", DESCENDING)])
+                        .skip(offset).limit(limit + 1))
+            self._resolve(docs)
+        except errors.PyMongoError as e:
+            print(f"Failed to search history: {e}")
+            return [], False
+        return [search_result(doc, clauses, doc["score"]) for doc in docs[:limit]], len(docs) > limit
+
+    def get_history_entry(self, entry_id):
+        if self.writer is not None:
+            pending = self.writer.get_pending(entry_id)
+            if pending is not None:
+                return pending
+        try:
+            entry = self.collection.find_one({"_id": entry_id})
+        except errors.PyMongoError as e:
+            print(f"Failed to retrieve history entry: {e}")
+            return None
+        return self._resolve([entry])[0] if entry else None
+
+    def iter_indexable_prompts(self, batch_size=1000):
+        """
+        Yield single-turn prompts saved with their sampling settings, for the similarity cache.
+        """
+        try:
+            cursor = self.collection.find(
+                {"context_turns": 0, "parameters": {"$exists": True}},
+                {"prompt": 1, "prompt_blob": 1, "model": 1, "parameters": 1}
+            ).batch_size(batch_size)
+            batch = []
+            for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    yield from self._resolve(batch)
+                    batch = []
+            yield from self._resolve(batch)
+        except errors.PyMongoError as e:
+            print(f"Failed to read prompts for indexing: {e}")
+
     def close_connection(self):
-        if self.client:
-            self.client.close()
\ No newline at end of file
+        # The client is shared through the connection registry, so only drop this manager's handle
+        self.client = None
+        self.collection = None
+
+
+HISTORY_LAYOUTS = ("documents", "buckets")
+
+
+def create_history_manager(layout=None, **kwargs):
+    """
+    HistoryManager for the configured storage backend and layout.
+
+    Args:
+        layout: 'documents' (one document per turn) or 'buckets' (per-session
+            bucket documents); defaults to HISTORY_LAYOUT, else 'documents'
+        **kwargs: Passed to the manager (uri, db_name, collection_name, async_writes)
+    """
+    layout = (layout or os.getenv("HISTORY_LAYOUT") or "documents").strip().lower()
+    if storage_backend() == "sqlite":
+        from app.database.db_sqlite import SQLiteHistoryManager
+        if layout != "documents":
+            print(f"Warning: HISTORY_LAYOUT {layout!r} applies to MongoDB only; SQLite stores one row per turn")
+        return SQLiteHistoryManager(async_writes=kwargs.get("async_writes"))
+    if layout == "buckets":
+        from app.database.db_history_buckets import BucketedHistoryManager
+        return BucketedHistoryManager(**kwargs)
+    if layout != "documents":
+        print(f"Warning: Unknown HISTORY_LAYOUT {layout!r}; using 'documents'")
+    return HistoryManager(**kwargs)
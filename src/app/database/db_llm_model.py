@@ -1,33 +1,111 @@
-from pymongo import MongoClient, errors
+from pymongo import ReturnDocument, errors
 from datetime import datetime
 import os
 
+from app.database.db_connection import DEFAULT_DB_NAME, get_connection_registry
+from app.database.storage_backend import storage_backend
+
+# Catalog documents without a status field predate the field and count as active
+ACTIVE_STATUS = "Active"
+CATALOG_PROJECTION = {"_id": 0, "company": 1, "model": 1, "model_detail": 1, "status": 1}
+
+
 class LLM_MODEL_Manager:
-    def __init__(self, uri=None, db_name="llmExperimenter", collection_name="model_list"):
-        self.mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    backend = "mongodb"
+    # Edits by other processes can be followed with a change stream (replica sets only)
+    change_streams = True
+
+    def __init__(self, uri=None, db_name=DEFAULT_DB_NAME, collection_name="model_list"):
+        self.mongo_uri = uri or os.getenv("MONGO_URI", "mongodb://localhost:27017/")
         self.db_name = db_name
         self.collection_name = collection_name
         self.client = None
         self.collection = None
+        self.meta_collection = None
         self._connect_to_db()
 
     def _connect_to_db(self):
         try:
-            self.client = MongoClient(self.mongo_uri)
+            self.client = get_connection_registry().get_client(self.mongo_uri)
             db = self.client[self.db_name]
             self.collection = db[self.collection_name]
+            self.meta_collection = db["catalog_meta"]
         except errors.ConnectionFailure as e:
             print(f"MongoDB connection failed: {e}")
             raise
 
-    def get_models(self, status="Active"):
+    @staticmethod
+    def _status_filter(status):
+        if status is None:
+            return {}
+        if status == ACTIVE_STATUS:
+            return {"$or": [{"status": ACTIVE_STATUS}, {"status": {"$exists": False}}]}
+        return {"status": status}
+
+    def find_models(self, status=ACTIVE_STATUS):
+        """
+        Catalog entries with the given status, filtered and projected on the server.
+
+        Args:
+            status: Status to match; None returns every entry
+
+        Returns:
+            List of {'company', 'model', 'model_detail', 'status'} dictionaries
+
+        Raises:
+            PyMongoError: If the database cannot be queried
+        """
+        cursor = self.collection.find(self._status_filter(status), CATALOG_PROJECTION).sort([("company", 1), ("model", 1)])
+        return list(cursor)
+
+    def get_models(self, status=ACTIVE_STATUS):
         try:
-            cursor = self.collection.find()            
-            return list(cursor)
+            return self.find_models(status)
         except errors.PyMongoError as e:
             print(f"Failed to retrieve models: {e}")
             return []
 
+    def get_catalog_version(self):
+        doc = self.meta_collection.find_one({"_id": self.collection_name}, {"version": 1})
+        return doc["version"] if doc else 0
+
+    def bump_catalog_version(self):
+        """Record that the catalog changed so every process reloads it."""
+        doc = self.meta_collection.find_one_and_update(
+            {"_id": self.collection_name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        return doc["version"]
+
+    def upsert_model(self, company, model, model_detail=None, status=ACTIVE_STATUS):
+        update = {"status": status, "timestamp": datetime.utcnow()}
+        if model_detail is not None:
+            update["model_detail"] = model_detail
+        try:
+            self.collection.update_one({"company": company, "model": model}, {"$set": update}, upsert=True)
+            self.bump_catalog_version()
+        except errors.PyMongoError as e:
+            print(f"Failed to save model {company}/{model}: {e}")
+            raise
+
+    def set_status(self, company, model, status):
+        try:
+            self.collection.update_one({"company": company, "model": model}, {"$set": {"status": status}})
+            self.bump_catalog_version()
+        except errors.PyMongoError as e:
+            print(f"Failed to update status of {company}/{model}: {e}")
+            raise
+
     def close_connection(self):
-        if self.client:
-            self.client.close()
\ No newline at end of file
+        # The client is shared through the connection registry, so only drop this manager's handle
+        self.client = None
+        self.collection = None
+
+
+def create_model_manager():
+    """Catalog manager for the configured STORAGE_BACKEND."""
+    if storage_backend() == "sqlite":
+        from app.database.db_sqlite import SQLiteModelManager
+        return SQLiteModelManager()
+    return LLM_MODEL_Manager()
@@ -0,0 +1,564 @@
+"""
+Embedded SQLite storage for history, the model catalog and user preferences.
+
+Selected with STORAGE_BACKEND=sqlite. Everything lives in one database file,
+SQLITE_PATH (default data/llm_experimenter.db), opened in WAL mode so the
+Streamlit threads read while the history writer thread writes. Each thread
+gets its own connection, with synchronous=NORMAL and a busy timeout of
+SQLITE_BUSY_TIMEOUT_MS (default 5000). Statements are parameterized
+constants, so sqlite3 reuses prepared statements from each connection's
+statement cache.
+
+Layouts mirror the MongoDB collections:
+    history             one row per turn; the _id is the ObjectId's hex, and the
+                        (session_id, timestamp, id) and (user, timestamp, id)
+                        indexes serve the same keyset queries
+    history_fts         FTS5 index of history's prompt, response and user, updated
+                        by triggers in the transaction that inserts the rows
+    model_list          primary key (company, model), with catalog_meta versions
+    user_configuration  primary key email, indexed on updated_at
+
+Saves go through the same background writer as on MongoDB. A batch is one
+executemany inside one transaction, and INSERT OR IGNORE keeps replays
+idempotent. An empty catalog is seeded from configurations/models.yml when
+the file is created. The blob store and bucketed layout are MongoDB-only.
+"""
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+from bson import ObjectId
+
+from app.database.db_history_manager import HistoryManager
+from app.database.db_llm_model import ACTIVE_STATUS, LLM_MODEL_Manager
+from app.database.history_search import (HIGHLIGHT_END, HIGHLIGHT_START, SEARCH_WEIGHTS, fts5_match,
+                                         parse_search_query)
+from app.database.history_writer import HistoryWriter, get_history_writer
+from app.database.user_configuration_manager import DEFAULT_FIELDS, UserPreferenceStore
+
+DEFAULT_SQLITE_PATH = Path(__file__).resolve().parents[3] / "data" / "llm_experimenter.db"
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    parameters TEXT,
+    context_turns INTEGER
+);
+CREATE INDEX IF NOT EXISTS history_session_timestamp ON history (session_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS history_user_timestamp ON history (user, timestamp DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS model_list (
+    company TEXT NOT NULL,
+    model TEXT NOT NULL,
+    model_detail TEXT,
+    status TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (company, model)
+);
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS user_configuration (
+    email TEXT PRIMARY KEY,
+    temperature REAL,
+    max_tokens INTEGER,
+    top_p REAL,
+    presence_penalty REAL,
+    frequency_penalty REAL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS user_configuration_updated_at ON user_configuration (updated_at);
+"""
+
+# Version 2. External content: the index refers to history rows by rowid instead of copying the
+# text. The user column lets a search intersect with one user's entries inside the index.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    prompt, response, user, content='history', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, prompt, response, user) VALUES (new.rowid, new.prompt, new.response, new.user);
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, prompt, response, user)
+    VALUES ('delete', old.rowid, old.prompt, old.response, old.user);
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, prompt, response, user)
+    VALUES ('delete', old.rowid, old.prompt, old.response, old.user);
+    INSERT INTO history_fts (rowid, prompt, response, user) VALUES (new.rowid, new.prompt, new.response, new.user);
+END;
+"""
+REBUILD_SEARCH_INDEX = "INSERT INTO history_fts (history_fts) VALUES ('rebuild')"
+
+HISTORY_COLUMNS = ("id", "user", "session_id", "model", "prompt", "response", "timestamp", "parameters",
+                   "context_turns")
+INSERT_HISTORY = (f"INSERT OR IGNORE INTO history ({', '.join(HISTORY_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})")
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def search_match(user, clauses):
+    """
+    FTS5 MATCH expression for a user's search.
+
+    Matching the user's tokens in the user column skips other users' entries
+    inside the index, before any row is ranked or read. Different users can
+    share tokens, so the query still compares history.user exactly.
+    """
+    match = f"{{{' '.join(SEARCH_WEIGHTS)}}} : ({fts5_match(clauses)})"
+    if any(ch.isalnum() for ch in user):
+        user_phrase = user.replace('"', '""')
+        match = f'user : "{user_phrase}" AND {match}'
+    return match
+
+
+def to_db_time(timestamp):
+    """datetime -> fixed-width text that sorts chronologically."""
+    return timestamp.isoformat(sep=" ", timespec="microseconds")
+
+
+def from_db_time(text):
+    return datetime.fromisoformat(text) if text else None
+
+
+def history_row(doc):
+    parameters = doc.get("parameters")
+    return (str(doc["_id"]), doc["user"], doc["session_id"], doc["model"], doc["prompt"], doc["response"],
+            to_db_time(doc["timestamp"]), json.dumps(parameters) if parameters is not None else None,
+            doc.get("context_turns"))
+
+
+def history_entry(row):
+    """history row -> dictionary shaped like the MongoDB document (selected columns only)."""
+    entry = dict(row)
+    entry["_id"] = ObjectId(entry.pop("id"))
+    if "timestamp" in entry:
+        entry["timestamp"] = from_db_time(entry["timestamp"])
+    if entry.get("parameters") is not None:
+        entry["parameters"] = json.loads(entry["parameters"])
+    for field in ("prompt_truncated", "response_truncated"):
+        if field in entry:
+            entry[field] = bool(entry[field])
+    # Missing optional fields are absent from MongoDB documents too
+    return {field: value for field, value in entry.items() if value is not None}
+
+
+class SQLiteDatabase:
+    """
+    One SQLite database file shared by the managers of a process.
+
+    sqlite3 connections must stay on the thread that opened them, so each
+    thread opens its own on first use and keeps it.
+
+    ':memory:' would give every thread a separate, empty database, so it is
+    opened as a named shared-cache in-memory database instead. One connection
+    stays open for the life of the object, since SQLite drops the data when
+    the last connection closes.
+    """
+
+    _memory_databases = itertools.count()
+
+    def __init__(self, path=None):
+        self.path = str(path or os.getenv("SQLITE_PATH") or DEFAULT_SQLITE_PATH)
+        self.busy_timeout_ms = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+        self.cache_kib = _env_int("SQLITE_CACHE_KIB", 16384)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {"connections": 0, "write_batches": 0, "rows_written": 0}
+        # Shared-cache table locks fail at once instead of waiting out busy_timeout, so writers take turns
+        self._write_lock = threading.Lock() if self.path == ":memory:" else nullcontext()
+        self.in_memory = self.path == ":memory:"
+        if self.in_memory:
+            self._uri = f"file:llm_experimenter_{next(self._memory_databases)}?mode=memory&cache=shared"
+        else:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._create_schema()
+        self._anchor = self.connection() if self.in_memory else None
+
+    def connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            if self.in_memory:
+                conn = sqlite3.connect(self._uri, uri=True, timeout=self.busy_timeout_ms / 1000,
+                                       cached_statements=256)
+                # Shared-cache readers would otherwise fail with 'table is locked' while a write is open
+                conn.execute("PRAGMA read_uncommitted=1")
+            else:
+                conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            conn.execute(f"PRAGMA cache_size=-{self.cache_kib}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.connection = conn
+            with self._lock:
+                self.counters["connections"] += 1
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """This thread's connection inside one transaction, committed on success and rolled back on error."""
+        conn = self.connection()
+        with self._write_lock, conn:
+            yield conn
+
+    def _create_schema(self):
+        conn = self.connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.execute("PRAGMA user_version=1")
+        self._seed_catalog()
+        try:
+            with conn:
+                conn.executescript(SEARCH_SCHEMA)
+                if version:
+                    # History saved before the index existed
+                    conn.execute(REBUILD_SEARCH_INDEX)
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        except sqlite3.OperationalError as e:
+            # Stays at version 1, so the index is created once an FTS5-enabled SQLite opens the file
+            print(f"Warning: History search is unavailable, SQLite was built without FTS5: {e}")
+
+    def rebuild_search_index(self):
+        """
+        Re-index all of history from the history table.
+
+        The index refers to rows by rowid, which VACUUM may renumber, so run
+        this after vacuuming the file.
+        """
+        with self.transaction() as conn:
+            conn.execute(REBUILD_SEARCH_INDEX)
+
+    def _seed_catalog(self):
+        """Fill a new, empty catalog from configurations/models.yml."""
+        from app.database.model_catalog import load_yaml_catalog
+        conn = self.connection()
+        if conn.execute("SELECT 1 FROM model_list LIMIT 1").fetchone():
+            return
+        now = to_db_time(datetime.utcnow())
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO model_list (company, model, status, timestamp) VALUES (?, ?, ?, ?)",
+                             [(entry["company"], entry["model"], entry["status"], now) for entry in load_yaml_catalog()])
+
+    def insert_history(self, docs):
+        """
+        Insert history documents in one transaction; ids already stored are skipped.
+
+        Returns:
+            Number of rows inserted
+        """
+        with self.transaction() as conn:
+            inserted = conn.executemany(INSERT_HISTORY, [history_row(doc) for doc in docs]).rowcount
+        with self._lock:
+            self.counters["write_batches"] += 1
+            self.counters["rows_written"] += inserted
+        return inserted
+
+    def stats(self):
+        def size(path):
+            return os.path.getsize(path) if os.path.exists(path) else 0
+        return {**self.counters, "path": self.path, "size_bytes": size(self.path),
+                "wal_bytes": size(self.path + "-wal"), "sqlite_version": sqlite3.sqlite_version}
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_sqlite_database(path=None):
+    """Return the process-wide SQLiteDatabase for a file, creating it once."""
+    path = str(path or os.getenv("SQLITE_PATH") or DEFAULT_SQLITE_PATH)
+    database = _databases.get(path)
+    if database is None:
+        with _databases_lock:
+            database = _databases.get(path)
+            if database is None:
+                database = _databases[path] = SQLiteDatabase(path)
+    return database
+
+
+def sqlite_stats():
+    return {path: database.stats() for path, database in _databases.items()}
+
+
+# --- history ---
+
+class SQLiteHistoryWriter(HistoryWriter):
+    """HistoryWriter whose batches are one executemany transaction on a SQLiteDatabase."""
+
+    def _insert(self, docs):
+        try:
+            self.collection.insert_history(docs)
+            return []
+        except sqlite3.Error as e:
+            print(f"Failed to write history batch of {len(docs)}: {e}")
+            return docs
+
+
+class SQLiteHistoryManager(HistoryManager):
+    """History in the 'history' table of the SQLite database (STORAGE_BACKEND=sqlite)."""
+
+    writer_class = SQLiteHistoryWriter
+
+    def __init__(self, path=None, async_writes=None):
+        self.database = get_sqlite_database(path)
+        self.db_name = self.database.path
+        self.collection_name = "history"
+        self.client = None
+        self.collection = None
+        if async_writes is None:
+            async_writes = os.getenv("HISTORY_ASYNC_WRITES", "1").strip().lower() in ("1", "true", "yes", "on")
+        self.writer = (get_history_writer(self.database, self.writer_class, key=("sqlite", self.database.path, "history"))
+                       if async_writes else None)
+
+    def _write_now(self, history_doc):
+        try:
+            self.database.insert_history([history_doc])
+            return history_doc["_id"]
+        except sqlite3.Error as e:
+            print(f"Failed to insert history document: {e}")
+            raise
+
+    def ensure_indexes(self):
+        """The indexes are part of the schema, created with the database file."""
+
+    def _select(self, columns, match, limit, before, params=()):
+        (field, value), = match.items()
+        if field not in ("session_id", "user"):
+            raise ValueError(f"Unsupported history filter: {field}")
+        sql = f"SELECT {columns} FROM history WHERE {field} = ?"
+        args = [*params, value]
+        if before is not None:
+            # Row-value comparison, served by the (field, timestamp DESC, id DESC) index
+            sql += " AND (timestamp, id) < (?, ?)"
+            args += [to_db_time(before[0]), str(before[1])]
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        return [history_entry(row) for row in self.database.connection().execute(sql, [*args, limit])]
+
+    def _query_history(self, match, limit, before, preview_chars):
+        if preview_chars:
+            columns = ("id, timestamp, model, session_id, user, substr(prompt, 1, ?) AS prompt, "
+                       "substr(response, 1, ?) AS response, length(prompt) > ? AS prompt_truncated, "
+                       "length(response) > ? AS response_truncated")
+            params = (preview_chars,) * 4
+        else:
+            columns, params = ", ".join(HISTORY_COLUMNS), ()
+        try:
+            return self._select(columns, match, limit, before, params)
+        except sqlite3.Error as e:
+            print(f"Failed to retrieve history: {e}")
+            return []
+
+    def get_session_turns(self, session_id, limit=20, before=None):
+        try:
+            entries = self._select("id, timestamp, prompt, response", {"session_id": session_id}, limit, before)
+        except sqlite3.Error as e:
+            print(f"Failed to retrieve session turns: {e}")
+            return []
+        return self._merge_pending_turns(entries, session_id, limit, before)
+
+    def search_history(self, user, query, model=None, since=None, until=None, limit=20, offset=0):
+        """
+        Same as HistoryManager.search_history, on the history_fts index.
+
+        Ranked by bm25, with snippet() cutting the highlighted excerpts. The
+        triggers index rows in the transaction that inserts them, so every saved
+        answer is searchable once the history writer has committed it.
+        """
+        clauses = parse_search_query(query)
+        if not clauses:
+            return [], False
+        # The user column only filters, so it does not count towards the rank
+        weights = ", ".join(str(float(weight)) for weight in (*SEARCH_WEIGHTS.values(), 0))
+        sql = ("SELECT h.id, h.session_id, h.model, h.timestamp, -bm25(history_fts, " + weights + ") AS score, "
+               "snippet(history_fts, 0, ?, ?, '…', 32) AS prompt, snippet(history_fts, 1, ?, ?, '…', 48) AS response "
+               "FROM history_fts JOIN history h ON h.rowid = history_fts.rowid "
+               "WHERE history_fts MATCH ? AND h.user = ?")
+        args = [HIGHLIGHT_START, HIGHLIGHT_END] * 2 + [search_match(user, clauses), user]
+        if model:
+            sql += " AND h.model = ?"
+            args.append(model)
+        if since is not None:
+            sql += " AND h.timestamp >= ?"
+            args.append(to_db_time(since))
+        if until is not None:
+            sql += " AND h.timestamp < ?"
+            args.append(to_db_time(until))
+        sql += " ORDER BY score DESC, h.timestamp DESC LIMIT ? OFFSET ?"
+        try:
+            rows = self.database.connection().execute(sql, [*args, limit + 1, offset]).fetchall()
+        except sqlite3.Error as e:
+            print(f"Failed to search history: {e}")
+            return [], False
+        results = []
+        for row in rows[:limit]:
+            result = history_entry(row)
+            for field in SEARCH_WEIGHTS:
+                result[field] = " ".join(result.get(field, "").split())
+            results.append(result)
+        return results, len(rows) > limit
+
+    def get_history_entry(self, entry_id):
+        if self.writer is not None:
+            pending = self.writer.get_pending(entry_id)
+            if pending is not None:
+                return pending
+        try:
+            row = self.database.connection().execute(
+                f"SELECT {', '.join(HISTORY_COLUMNS)} FROM history WHERE id = ?", (str(entry_id),)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Failed to retrieve history entry: {e}")
+            return None
+        return history_entry(row) if row else None
+
+    def iter_indexable_prompts(self, batch_size=1000):
+        try:
+            cursor = self.database.connection().execute(
+                "SELECT id, prompt, model, parameters FROM history WHERE context_turns = 0 AND parameters IS NOT NULL")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield history_entry(row)
+        except sqlite3.Error as e:
+            print(f"Failed to read prompts for indexing: {e}")
+
+
+# --- model catalog ---
+
+class SQLiteModelManager(LLM_MODEL_Manager):
+    """Model catalog in the 'model_list' and 'catalog_meta' tables."""
+
+    backend = "sqlite"
+    change_streams = False
+
+    def __init__(self, path=None, collection_name="model_list"):
+        self.database = get_sqlite_database(path)
+        self.db_name = self.database.path
+        self.collection_name = collection_name
+        self.client = None
+        self.collection = None
+        self.meta_collection = None
+
+    def find_models(self, status=ACTIVE_STATUS):
+        """Same as LLM_MODEL_Manager.find_models; raises sqlite3.Error if the database cannot be read."""
+        sql = "SELECT company, model, model_detail, status FROM model_list"
+        args = ()
+        if status == ACTIVE_STATUS:
+            sql += " WHERE status = ? OR status IS NULL"
+            args = (status,)
+        elif status is not None:
+            sql += " WHERE status = ?"
+            args = (status,)
+        rows = self.database.connection().execute(sql + " ORDER BY company, model", args)
+        return [{key: row[key] for key in row.keys() if row[key] is not None} for row in rows]
+
+    def get_models(self, status=ACTIVE_STATUS):
+        try:
+            return self.find_models(status)
+        except sqlite3.Error as e:
+            print(f"Failed to retrieve models: {e}")
+            return []
+
+    def get_catalog_version(self):
+        row = self.database.connection().execute(
+            "SELECT version FROM catalog_meta WHERE name = ?", (self.collection_name,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, conn):
+        conn.execute("INSERT INTO catalog_meta (name, version, updated_at) VALUES (?, 1, ?) "
+                     "ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                     (self.collection_name, to_db_time(datetime.utcnow())))
+        return conn.execute("SELECT version FROM catalog_meta WHERE name = ?", (self.collection_name,)).fetchone()[0]
+
+    def bump_catalog_version(self):
+        with self.database.transaction() as conn:
+            return self._bump(conn)
+
+    def upsert_model(self, company, model, model_detail=None, status=ACTIVE_STATUS):
+        try:
+            # The edit and the version bump commit together
+            with self.database.transaction() as conn:
+                conn.execute("INSERT INTO model_list (company, model, model_detail, status, timestamp) "
+                             "VALUES (?, ?, ?, ?, ?) ON CONFLICT (company, model) DO UPDATE SET "
+                             "status = excluded.status, timestamp = excluded.timestamp, "
+                             "model_detail = COALESCE(excluded.model_detail, model_list.model_detail)",
+                             (company, model, model_detail, status, to_db_time(datetime.utcnow())))
+                self._bump(conn)
+        except sqlite3.Error as e:
+            print(f"Failed to save model {company}/{model}: {e}")
+            raise
+
+    def set_status(self, company, model, status):
+        try:
+            with self.database.transaction() as conn:
+                conn.execute("UPDATE model_list SET status = ? WHERE company = ? AND model = ?", (status, company, model))
+                self._bump(conn)
+        except sqlite3.Error as e:
+            print(f"Failed to update status of {company}/{model}: {e}")
+            raise
+
+
+# --- user preferences ---
+
+class SQLitePreferenceStore(UserPreferenceStore):
+    """UserPreferenceStore over the 'user_configuration' table; other processes' saves are polled."""
+
+    def __init__(self, database=None, **kwargs):
+        super().__init__(collection=database or get_sqlite_database(), **kwargs)
+
+    def ensure_indexes(self):
+        """The updated_at index is part of the schema."""
+
+    def _fetch(self, email):
+        row = self.collection.connection().execute(
+            f"SELECT {', '.join(DEFAULT_FIELDS)} FROM user_configuration WHERE email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def _write(self, email, prefs):
+        with self.collection.transaction() as conn:
+            conn.execute(
+                f"INSERT INTO user_configuration (email, {', '.join(DEFAULT_FIELDS)}, updated_at) "
+                f"VALUES (?, {', '.join('?' * len(DEFAULT_FIELDS))}, ?) ON CONFLICT (email) DO UPDATE SET "
+                + ", ".join(f"{field} = excluded.{field}" for field in (*DEFAULT_FIELDS, "updated_at")),
+                (email, *(prefs.get(field) for field in DEFAULT_FIELDS), to_db_time(datetime.utcnow())))
+        self.counters["writes"] += 1
+
+    def _watch(self):
+        self._poll_changes()
+
+    def _newest_update(self):
+        row = self.collection.connection().execute("SELECT MAX(updated_at) FROM user_configuration").fetchone()
+        return from_db_time(row[0])
+
+    def _changed_since(self, timestamp):
+        rows = self.collection.connection().execute(
+            "SELECT email, updated_at FROM user_configuration WHERE updated_at > ?", (to_db_time(timestamp),))
+        return [(row["email"], from_db_time(row["updated_at"])) for row in rows]
@@ -0,0 +1,147 @@
+"""
+Full-text search over saved prompts and responses.
+
+The history managers' search_history() runs on an index that is maintained
+as answers are saved, so nothing has to be rebuilt when history grows:
+
+    MongoDB, one document per turn  text index on (user, prompt, response, and their
+                                    search copies)
+    MongoDB, buckets                the same over turns.*; the matching turns are
+                                    picked out of each bucket
+    SQLite                          FTS5 table over the history table, kept in sync
+                                    by triggers (see db_sqlite.py)
+
+The indexes are prefixed by user, so a search only touches that user's
+entries. A query is a list of words and "quoted phrases", all of which must
+match; on SQLite a trailing * makes a word a prefix. Results are ranked by
+relevance, a match in the prompt weighing twice as much as one in the
+response. A body moved to the MongoDB blob store (HISTORY_BLOBS) leaves a
+search copy in the history doc, its words without punctuation or extra
+whitespace ('prompt_words' / 'response_words'), which the text index covers
+with the weight of the body.
+"""
+import re
+
+# Wrap the matched words in snippets; the page turns them into bold text
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+SNIPPET_CHARS = 240
+# Text index weights, prompt over response
+SEARCH_WEIGHTS = {"prompt": 2, "response": 1}
+
+_CLAUSE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+")
+
+
+def search_copy_field(field):
+    return f"{field}_words"
+
+
+def search_copy(text):
+    """Words of a body moved to the blob store, kept in the history doc for the text index."""
+    return " ".join(_WORD.findall(text))
+
+
+def text_index_weights(prefix=""):
+    """Text index weights for the bodies and their search copies, with field names prefixed."""
+    weights = {}
+    for field, weight in SEARCH_WEIGHTS.items():
+        weights[prefix + field] = weight
+        weights[prefix + search_copy_field(field)] = weight
+    return weights
+
+
+def parse_search_query(query):
+    """
+    Split a search box query into clauses.
+
+    Returns:
+        List of (words, prefix) tuples: one word, or several for a quoted phrase;
+        prefix is True for a word written with a trailing *
+    """
+    clauses = []
+    for phrase, word in _CLAUSE.findall(query or ""):
+        words = tuple(w.lower() for w in _WORD.findall(phrase or word))
+        if words:
+            clauses.append((words, bool(word) and word.endswith("*") and len(words) == 1))
+    return clauses
+
+
+def fts5_match(clauses):
+    """FTS5 MATCH expression; every clause is quoted, so no input is read as query syntax."""
+    return " ".join(f'"{" ".join(words)}"' + ("*" if prefix else "") for words, prefix in clauses)
+
+
+def mongo_search(clauses):
+    """$text $search string; quoting every clause makes MongoDB require all of them."""
+    return " ".join(f'"{" ".join(words)}"' for words, _ in clauses)
+
+
+def _clause_pattern(words):
+    # Words may be followed by more word characters, approximating the stemming of the indexes
+    return r"\b" + r"\W+".join(re.escape(word) for word in words) + r"\w*"
+
+
+def _pattern(clauses):
+    return re.compile("|".join(_clause_pattern(words) for words, _ in clauses), re.IGNORECASE)
+
+
+def match_score(entry, clauses):
+    """
+    Relevance of one entry, for turns picked out of a bucket.
+
+    Returns:
+        0 unless every clause occurs in the prompt or the response; otherwise the
+        number of occurrences, weighted by SEARCH_WEIGHTS
+    """
+    texts = {field: entry.get(field) or "" for field in SEARCH_WEIGHTS}
+    score = 0
+    for words, _ in clauses:
+        pattern = re.compile(_clause_pattern(words), re.IGNORECASE)
+        hits = {field: len(pattern.findall(text)) for field, text in texts.items()}
+        if not any(hits.values()):
+            return 0
+        score += sum(SEARCH_WEIGHTS[field] * count for field, count in hits.items())
+    return score
+
+
+def highlight(text, clauses, width=SNIPPET_CHARS):
+    """
+    Snippet of 'text' around its first match, with matches between HIGHLIGHT_START and HIGHLIGHT_END.
+
+    Newlines are folded into spaces, and '…' marks text cut off at either end.
+    """
+    text = " ".join((text or "").split())
+    pattern = _pattern(clauses)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 4) if first else 0
+    end = min(len(text), start + width)
+    # Keep whole words at the edges
+    if start:
+        space = text.find(" ", start, first.start())
+        start = space + 1 if space >= 0 else start
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    snippet = pattern.sub(lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_END}", text[start:end])
+    return ("…" if start else "") + snippet + ("…" if end < len(text) else "")
+
+
+def search_result(entry, clauses, score):
+    """History entry -> search result with highlighted prompt and response snippets."""
+    result = {field: entry[field] for field in ("_id", "session_id", "model", "timestamp") if field in entry}
+    result["score"] = score
+    for field in SEARCH_WEIGHTS:
+        result[field] = highlight(entry.get(field), clauses)
+    return result
+
+
+def date_filter(field, since, until):
+    """Mongo filter for since <= field < until; empty if neither is given."""
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = since
+    if until is not None:
+        bounds["$lt"] = until
+    return {field: bounds} if bounds else {}
@@ -0,0 +1,324 @@
+from pymongo import errors
+from bson import ObjectId, json_util
+from pathlib import Path
+import atexit
+import os
+import queue
+import threading
+import time
+
+DEFAULT_SPILL_PATH = Path(__file__).resolve().parents[3] / "data" / "history_spill.jsonl"
+
+DUPLICATE_KEY = 11000
+
+
+def _env_number(name, default, cast=int):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        print(f"Warning: Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+class HistoryWriter:
+    """
+    Buffered background writer for history documents.
+
+    submit() only enqueues, so saving an answer costs no database round trip
+    on the request path. A single daemon thread drains the queue with
+    insert_many(ordered=False) whenever batch_size documents are waiting or
+    flush_interval seconds have passed since the oldest one arrived.
+
+    Documents get their _id before they are queued, so callers can use it at
+    once and replays are idempotent: duplicate-key errors on retry count as
+    written. Batches that fail for any other reason are appended to a JSONL
+    spill file and replayed once the database is reachable again. When the
+    queue is full, submit() blocks for up to put_timeout seconds
+    (backpressure) and then spills the document instead of dropping it.
+    Pending documents are flushed at interpreter exit.
+
+    Configuration (environment):
+        HISTORY_WRITER_BATCH_SIZE (default 100), HISTORY_WRITER_FLUSH_INTERVAL_S (default 1.0),
+        HISTORY_WRITER_MAX_QUEUE (default 10000), HISTORY_WRITER_PUT_TIMEOUT_S (default 5),
+        HISTORY_SPILL_PATH (default data/history_spill.jsonl)
+    """
+
+    replay_interval = 30.0
+
+    def __init__(self, collection, batch_size=None, flush_interval=None, max_queue=None,
+                 put_timeout=None, spill_path=None, blob_store=None):
+        self.collection = collection
+        # Queued and spilled documents keep their bodies; they move to the blob store when written
+        self.blob_store = blob_store
+        self.batch_size = batch_size or _env_number("HISTORY_WRITER_BATCH_SIZE", 100)
+        self.flush_interval = flush_interval or _env_number("HISTORY_WRITER_FLUSH_INTERVAL_S", 1.0, float)
+        self.put_timeout = put_timeout if put_timeout is not None else _env_number("HISTORY_WRITER_PUT_TIMEOUT_S", 5.0, float)
+        self.spill_path = Path(spill_path or os.getenv("HISTORY_SPILL_PATH") or DEFAULT_SPILL_PATH)
+        self._queue = queue.Queue(maxsize=max_queue or _env_number("HISTORY_WRITER_MAX_QUEUE", 10000))
+        # Documents accepted but not yet written, so reads by _id can see them
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopping = threading.Event()
+        # None until the first replay, which runs as soon as the thread starts
+        self._last_replay = None
+        self.counters = {"submitted": 0, "written": 0, "batches": 0, "spilled": 0,
+                         "replayed": 0, "blocked_submits": 0, "last_batch_ms": 0.0}
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- producer side ---
+
+    def submit(self, doc):
+        """
+        Queue one document for writing and return its _id.
+
+        Blocks for up to put_timeout seconds while the queue is full; if it is
+        still full the document goes straight to the spill file.
+        """
+        doc.setdefault("_id", ObjectId())
+        if self._stopping.is_set():
+            # Shutting down: write directly rather than into a queue nobody drains
+            failed = self._insert_safely([doc])
+            if failed:
+                self._spill(failed)
+            return doc["_id"]
+        with self._pending_lock:
+            self._pending[doc["_id"]] = doc
+        self.counters["submitted"] += 1
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            self.counters["blocked_submits"] += 1
+            try:
+                self._queue.put(doc, timeout=self.put_timeout)
+            except queue.Full:
+                print("Warning: History write queue is full; spilling document to disk")
+                self._spill([doc])
+                self._forget([doc])
+        return doc["_id"]
+
+    def get_pending(self, entry_id):
+        with self._pending_lock:
+            return self._pending.get(entry_id)
+
+    def get_pending_matching(self, field, value):
+        """Queued documents whose 'field' equals 'value' (e.g. one session's unsaved turns)."""
+        with self._pending_lock:
+            return [doc for doc in self._pending.values() if doc.get(field) == value]
+
+    def flush(self, timeout=10.0):
+        """Ask the writer to flush now and wait until the queue has been drained."""
+        self._flush_requested.set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._pending_lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=10.0):
+        """Stop accepting work, write everything still queued and stop the thread."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._flush_requested.set()
+        self._thread.join(timeout)
+        leftover = self._drain(self._queue.qsize())
+        if leftover:
+            # The thread did not finish in time; keep the documents for the next start
+            self._spill(leftover)
+            self._forget(leftover)
+
+    # --- writer thread ---
+
+    def _drain(self, limit):
+        docs = []
+        while len(docs) < limit:
+            try:
+                docs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return docs
+
+    def _next_batch(self):
+        """Wait for the first document, then up to flush_interval for the batch to fill."""
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            # Waits in short slices, so close() does not have to sit out a long flush_interval
+            try:
+                first = self._queue.get(timeout=max(0.0, min(deadline - time.monotonic(), 0.25)))
+                break
+            except queue.Empty:
+                if self._flush_requested.is_set() or time.monotonic() >= deadline:
+                    return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._flush_requested.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.05)))
+            except queue.Empty:
+                continue
+        batch.extend(self._drain(self.batch_size - len(batch)))
+        return batch
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                if self._last_replay is None or time.monotonic() - self._last_replay > self.replay_interval:
+                    self._replay_spill()
+                batch = self._next_batch()
+                if batch:
+                    self._write(batch)
+                elif self._flush_requested.is_set() and self._queue.empty():
+                    self._flush_requested.clear()
+                    if self._stopping.is_set():
+                        return
+            except Exception as e:
+                # The thread must survive anything, or submit() would queue into a queue nobody drains
+                print(f"Error: History writer failed: {e!r}")
+                with self._pending_lock:
+                    unwritten = [doc for doc in batch if doc["_id"] in self._pending]
+                if unwritten:
+                    self._spill(unwritten)
+                    self._forget(unwritten)
+                self._last_replay = time.monotonic()
+            batch = []
+
+    def _insert(self, docs):
+        """
+        insert_many(ordered=False) that treats duplicate keys as already written.
+
+        Returns:
+            Documents that could not be written
+        """
+        try:
+            self.collection.insert_many(self._prepare(docs), ordered=False)
+            return []
+        except errors.BulkWriteError as e:
+            failed = [docs[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+            if e.details.get("writeConcernErrors"):
+                print(f"Warning: History batch written with write concern errors: {e.details['writeConcernErrors']}")
+            return failed
+        except errors.PyMongoError as e:
+            print(f"Failed to write history batch of {len(docs)}: {e}")
+            return docs
+
+    def _insert_safely(self, docs):
+        """_insert, with unexpected errors (e.g. a document bson cannot encode) failing the batch instead."""
+        try:
+            return self._insert(docs)
+        except Exception as e:
+            print(f"Error: Could not write history batch of {len(docs)}: {e!r}")
+            return docs
+
+    def _prepare(self, docs):
+        """Documents as written: large bodies replaced by blob references when a blob store is set."""
+        return self.blob_store.externalize(docs) if self.blob_store is not None else docs
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        failed = self._insert_safely(batch)
+        self.counters["last_batch_ms"] = (time.perf_counter() - start) * 1000
+        self.counters["batches"] += 1
+        self.counters["written"] += len(batch) - len(failed)
+        if failed:
+            self._spill(failed)
+        self._forget(batch)
+
+    def _forget(self, docs):
+        with self._pending_lock:
+            for doc in docs:
+                self._pending.pop(doc["_id"], None)
+
+    # --- spill file ---
+
+    def _spill(self, docs):
+        lines = []
+        for doc in docs:
+            try:
+                lines.append(json_util.dumps(doc) + "\n")
+            except (TypeError, ValueError) as e:
+                print(f"Error: Dropping history document {doc.get('_id')} that cannot be serialized: {e}")
+        try:
+            with self._spill_lock:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            self.counters["spilled"] += len(lines)
+        except OSError as e:
+            print(f"Error: Could not spill {len(lines)} history documents to {self.spill_path}: {e}")
+
+    def _replay_spill(self):
+        """Re-insert spilled documents; anything that still fails is spilled again."""
+        self._last_replay = time.monotonic()
+        replaying = self.spill_path.with_suffix(".replaying")
+        with self._spill_lock:
+            if not replaying.exists():
+                if not self.spill_path.exists():
+                    return
+                self.spill_path.replace(replaying)
+        docs = []
+        with open(replaying, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    docs.append(json_util.loads(line))
+                except ValueError:
+                    print("Warning: Skipping unreadable line in history spill file")
+        failed = []
+        for i in range(0, len(docs), self.batch_size):
+            chunk = docs[i:i + self.batch_size]
+            chunk_failed = self._insert_safely(chunk)
+            failed.extend(chunk_failed)
+            if len(chunk_failed) == len(chunk):
+                # Database still unreachable; keep the rest for the next attempt
+                failed.extend(docs[i + self.batch_size:])
+                break
+        self.counters["replayed"] += len(docs) - len(failed)
+        if failed:
+            self._spill(failed)
+        replaying.unlink()
+        if docs:
+            print(f"Replayed {len(docs) - len(failed)} of {len(docs)} spilled history documents")
+
+    def stats(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {**self.counters, "queued": self._queue.qsize(), "pending": pending,
+                "spill_file": str(self.spill_path), "spill_exists": self.spill_path.exists()}
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_history_writer(collection, writer_class=HistoryWriter, blob_store=None, key=None):
+    """
+    Return the process-wide writer for a collection, creating it once.
+
+    Args:
+        key: (backend, database, table) identifying a non-MongoDB target
+    """
+    # The MongoClient is shared through the connection registry, so its identity is stable
+    key = key or (id(collection.database.client), collection.database.name, collection.name)
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = _writers[key] = writer_class(collection, blob_store=blob_store)
+    return writer
+
+
+def history_writer_stats():
+    return {f"{db}.{coll}": writer.stats() for (_, db, coll), writer in _writers.items()}
@@ -0,0 +1,266 @@
+"""
+Convert a history collection between the one-document-per-turn and the
+bucketed layout (see db_history_buckets.py).
+
+Example (from src/):
+    python -m app.database.migrate_history --dry-run
+    python -m app.database.migrate_history
+    python -m app.database.migrate_history --to documents   # back again
+    python -m app.database.migrate_history --to blobs       # move bodies to history_blobs
+    python -m app.database.migrate_history --to sqlite      # copy history into SQLITE_PATH
+
+Moving bodies to the blob store (see blob_store.py) rewrites the documents
+of a one-document-per-turn collection in place; run it before converting to
+buckets, as the references are carried over. Otherwise the source
+collection is only read. Turns already in the target are skipped,
+so the migration can be re-run, e.g. once more after switching
+HISTORY_LAYOUT to pick up answers saved in the meantime. Sessions are read
+in index order and each one is turned into full buckets directly, so the
+target is written with insert_many rather than one upsert per turn.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from operator import itemgetter
+
+import bson
+from pymongo import ASCENDING, DESCENDING, UpdateOne, errors
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.database.db_connection import DEFAULT_DB_NAME
+from app.database.blob_store import BLOB_FIELDS, blob_ref_field
+from app.database.db_history_buckets import (BUCKET_MAX_BYTES, BUCKET_MAX_TURNS, BucketedHistoryManager,
+                                             flatten_turn, split_history_doc)
+from app.database.db_history_manager import HistoryManager
+from app.database.history_search import search_copy_field
+from app.database.history_writer import DUPLICATE_KEY
+
+
+def _new_bucket(session_id, user):
+    return {"session_id": session_id, "user": user, "count": 0, "bytes": 0,
+            "first_timestamp": None, "last_timestamp": None, "models": [], "turns": []}
+
+
+def _add_turn(bucket, turn, size):
+    bucket["turns"].append(turn)
+    bucket["count"] += 1
+    bucket["bytes"] += size
+    # Turns arrive oldest first
+    if bucket["first_timestamp"] is None:
+        bucket["first_timestamp"] = turn["timestamp"]
+    bucket["last_timestamp"] = turn["timestamp"]
+    if turn["model"] not in bucket["models"]:
+        bucket["models"].append(turn["model"])
+
+
+def _insert_buckets(target, buckets, dry_run):
+    if buckets and not dry_run:
+        target.insert_many(buckets, ordered=True)
+    return len(buckets)
+
+
+def to_buckets(source, target, max_turns=BUCKET_MAX_TURNS, max_bytes=BUCKET_MAX_BYTES, batch_size=100,
+               dry_run=False):
+    """
+    Group one-document-per-turn history into session buckets.
+
+    Returns:
+        Counters: sessions, turns (migrated), skipped (already in the target), buckets
+    """
+    counters = {"sessions": 0, "turns": 0, "skipped": 0, "buckets": 0}
+    # Walks the session_timestamp index backwards: sessions grouped, turns oldest first
+    cursor = source.find({}).sort([("session_id", DESCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
+    done = []
+    for session_id, docs in itertools.groupby(cursor, key=itemgetter("session_id")):
+        counters["sessions"] += 1
+        existing = set(target.distinct("turns._id", {"session_id": session_id}))
+        bucket = None
+        for doc in docs:
+            if doc["_id"] in existing:
+                counters["skipped"] += 1
+                continue
+            _, user, turn = split_history_doc(doc)
+            size = len(bson.encode(turn))
+            if bucket is None or bucket["count"] >= max_turns or bucket["bytes"] + size > max_bytes:
+                if bucket is not None:
+                    done.append(bucket)
+                bucket = _new_bucket(session_id, user)
+            _add_turn(bucket, turn, size)
+            counters["turns"] += 1
+            if len(done) >= batch_size:
+                counters["buckets"] += _insert_buckets(target, done, dry_run)
+                done = []
+        if bucket is not None:
+            done.append(bucket)
+    counters["buckets"] += _insert_buckets(target, done, dry_run)
+    return counters
+
+
+def to_documents(source, target, batch_size=1000, dry_run=False):
+    """
+    Expand session buckets back into one document per turn.
+
+    Returns:
+        Counters: buckets (read), turns (migrated), skipped (already in the target)
+    """
+    counters = {"buckets": 0, "turns": 0, "skipped": 0}
+    batch = []
+
+    def flush():
+        if not batch or dry_run:
+            counters["turns"] += len(batch)
+            return
+        try:
+            target.insert_many(batch, ordered=False)
+            counters["turns"] += len(batch)
+        except errors.BulkWriteError as e:
+            duplicates = sum(1 for err in e.details.get("writeErrors", []) if err.get("code") == DUPLICATE_KEY)
+            if duplicates != len(e.details.get("writeErrors", [])):
+                raise
+            counters["turns"] += len(batch) - duplicates
+            counters["skipped"] += duplicates
+
+    for bucket in source.find({}):
+        counters["buckets"] += 1
+        for turn in bucket.get("turns", []):
+            batch.append(flatten_turn(bucket, turn))
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+    flush()
+    return counters
+
+
+def to_blobs(collection, blob_store, batch_size=100, dry_run=False):
+    """
+    Replace inline bodies of one-document-per-turn history with blob references.
+
+    Returns:
+        Counters: scanned, rewritten (documents), blobs_written
+    """
+    counters = {"scanned": 0, "rewritten": 0, "blobs_written": 0}
+    written_before = blob_store.counters["blobs_written"]
+    cursor = collection.find({"$or": [{field: {"$type": "string"}} for field in BLOB_FIELDS]},
+                             {field: 1 for field in BLOB_FIELDS}).batch_size(batch_size)
+
+    def flush(docs):
+        if dry_run:
+            counters["rewritten"] += sum(any(len((doc.get(field) or "").encode("utf-8")) >= blob_store.min_bytes
+                                             for field in BLOB_FIELDS) for doc in docs)
+            return
+        updates = []
+        for doc in blob_store.externalize(docs):
+            refs = {name: doc[name] for field in BLOB_FIELDS
+                    for name in (blob_ref_field(field), search_copy_field(field)) if name in doc}
+            if refs:
+                updates.append(UpdateOne({"_id": doc["_id"]},
+                                         {"$set": refs, "$unset": {field: "" for field in BLOB_FIELDS if field not in doc}}))
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+            counters["rewritten"] += len(updates)
+
+    batch = []
+    for doc in cursor:
+        counters["scanned"] += 1
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    counters["blobs_written"] = blob_store.counters["blobs_written"] - written_before
+    return counters
+
+
+def to_sqlite(source_manager, database, batch_size=1000, dry_run=False):
+    """
+    Copy one-document-per-turn history into a SQLite database, resolving blob references.
+
+    Returns:
+        Counters: turns (copied), skipped (already in the database)
+    """
+    counters = {"turns": 0, "skipped": 0}
+    batch = []
+
+    def flush():
+        docs = source_manager._resolve(batch)
+        inserted = len(docs) if dry_run else database.insert_history(docs)
+        counters["turns"] += inserted
+        counters["skipped"] += len(docs) - inserted
+
+    for doc in source_manager.collection.find({}).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return counters
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the history collection between storage layouts.")
+    parser.add_argument("--to", choices=("buckets", "documents", "blobs", "sqlite"), default="buckets",
+                        help="Target layout, 'blobs' to move bodies of --source to the blob store, "
+                             "or 'sqlite' to copy --source into SQLite")
+    parser.add_argument("--uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--source", help="Source collection (default: history, or history_buckets with --to documents)")
+    parser.add_argument("--target", help="Target collection (default: history_buckets, or history with --to documents)")
+    parser.add_argument("--sqlite-path", help="SQLite file for --to sqlite (default: SQLITE_PATH)")
+    parser.add_argument("--max-turns", type=int, default=BUCKET_MAX_TURNS, help="Turns per bucket")
+    parser.add_argument("--max-bytes", type=int, default=BUCKET_MAX_BYTES, help="Encoded turn bytes per bucket")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents per insert_many")
+    parser.add_argument("--dry-run", action="store_true", help="Read and count, but write nothing")
+    args = parser.parse_args(argv)
+
+    documents, buckets = "history", "history_buckets"
+    if args.to == "blobs":
+        manager = HistoryManager(args.uri, args.db, args.source or documents, async_writes=False)
+        description = f"{args.db}.{manager.collection.name} bodies -> {args.db}.{manager.blobs.collection.name}"
+        migrate = lambda: to_blobs(manager.collection, manager.blobs, args.batch_size, args.dry_run)
+    elif args.to == "sqlite":
+        from app.database.db_sqlite import get_sqlite_database
+        manager = HistoryManager(args.uri, args.db, args.source or documents, async_writes=False)
+        database = get_sqlite_database(args.sqlite_path)
+        description = f"{args.db}.{manager.collection.name} -> {database.path}"
+        migrate = lambda: to_sqlite(manager, database, args.batch_size, args.dry_run)
+    else:
+        if args.to == "buckets":
+            source_manager = HistoryManager(args.uri, args.db, args.source or documents, async_writes=False)
+            target_manager = BucketedHistoryManager(args.uri, args.db, args.target or buckets, async_writes=False)
+        else:
+            source_manager = BucketedHistoryManager(args.uri, args.db, args.source or buckets, async_writes=False)
+            target_manager = HistoryManager(args.uri, args.db, args.target or documents, async_writes=False)
+        # The source index makes the session-ordered read a scan instead of an in-memory sort
+        source_manager.ensure_indexes()
+        if not args.dry_run:
+            target_manager.ensure_indexes()
+        source, target = source_manager.collection, target_manager.collection
+        description = f"{args.db}.{source.name} -> {args.db}.{target.name} ({args.to})"
+        if args.to == "buckets":
+            migrate = lambda: to_buckets(source, target, args.max_turns, args.max_bytes, args.batch_size, args.dry_run)
+        else:
+            migrate = lambda: to_documents(source, target, args.batch_size, args.dry_run)
+
+    print(f"Migrating {description}" + (" [dry run]" if args.dry_run else ""))
+    start = time.perf_counter()
+    try:
+        counters = migrate()
+    except errors.PyMongoError as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    print(", ".join(f"{name}: {value}" for name, value in counters.items())
+          + f" in {time.perf_counter() - start:.1f}s")
+    if args.to == "buckets" and not args.dry_run:
+        print("Set HISTORY_LAYOUT=buckets to use the new collection; the source collection was left unchanged.")
+    elif args.to == "blobs" and not args.dry_run:
+        print("Set HISTORY_BLOBS=1 so new answers are stored the same way.")
+    elif args.to == "sqlite" and not args.dry_run:
+        print("Set STORAGE_BACKEND=sqlite to use it; the model catalog is seeded from configurations/models.yml.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+from pymongo import errors
+import os
+import threading
+import time
+import yaml
+
+from app.database.db_llm_model import ACTIVE_STATUS, create_model_manager
+from app.database.storage_backend import StorageError
+from app.modelList.fake_llm import FAKE_MODELS, fake_provider_enabled
+from configurations.settings import MODELS_FILE, get_config_service
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def load_yaml_catalog():
+    """Read configurations/models.yml ({provider: [model, ...]}) into catalog entries."""
+    try:
+        config = get_config_service().load(MODELS_FILE)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Failed to read fallback model catalog {MODELS_FILE}: {e}")
+        return []
+    return [{"company": company, "model": model, "status": ACTIVE_STATUS}
+            for company, models in config.items() for model in (models or [])]
+
+
+class ModelCatalog:
+    """
+    Process-wide cache of the active model catalog.
+
+    The status filter and projection run in MongoDB and the result is kept
+    for MODEL_CATALOG_TTL_S seconds, so Streamlit reruns do not query the
+    database. Edits made through this class invalidate the cache at once and
+    bump a version document; other processes see the change through a change
+    stream on the catalog collection, or, on a standalone server without
+    change streams, by polling that version every MODEL_CATALOG_POLL_S
+    seconds on a background thread.
+
+    The YAML catalog in configurations/models.yml is served only while the
+    database is unreachable, and for a short time so recovery is picked up
+    quickly. With STORAGE_BACKEND=sqlite the catalog table is read instead
+    and edits are always picked up by polling its version.
+
+    Configuration (environment):
+        MODEL_CATALOG_TTL_S (default 300), MODEL_CATALOG_POLL_S (default 10)
+    """
+
+    fallback_ttl = 15.0
+
+    def __init__(self, manager=None, ttl=None, poll_interval=None):
+        self.manager = manager or create_model_manager()
+        self.ttl = ttl if ttl is not None else _env_float("MODEL_CATALOG_TTL_S", 300)
+        self.poll_interval = poll_interval if poll_interval is not None else _env_float("MODEL_CATALOG_POLL_S", 10)
+        self._lock = threading.Lock()
+        self._models = None
+        self._expires_at = 0.0
+        self._version = None
+        self.source = None
+        self.counters = {"loads": 0, "fallbacks": 0, "invalidations": 0}
+        self._watcher = None
+
+    def get_models(self):
+        """
+        Active catalog entries, served from cache while fresh.
+
+        Returns:
+            List of {'company', 'model', ...} dictionaries (treat as read-only)
+        """
+        models = self._models
+        if models is not None and time.monotonic() < self._expires_at:
+            return models
+        with self._lock:
+            if self._models is None or time.monotonic() >= self._expires_at:
+                self._load()
+            self._start_watcher()
+            return self._models
+
+    def _load(self):
+        try:
+            models = self.manager.find_models(ACTIVE_STATUS)
+            self._version = self.manager.get_catalog_version()
+            self.source = self.manager.backend
+            ttl = self.ttl
+        except StorageError as e:
+            print(f"Model catalog unavailable ({e}); using {MODELS_FILE}")
+            models = load_yaml_catalog()
+            self.source = "yaml"
+            self.counters["fallbacks"] += 1
+            ttl = self.fallback_ttl
+        if fake_provider_enabled():
+            models = models + [{"company": "fake", "model": model, "status": ACTIVE_STATUS} for model in FAKE_MODELS]
+        self.counters["loads"] += 1
+        self._models = models
+        self._expires_at = time.monotonic() + ttl
+
+    def invalidate(self):
+        """Drop the cached catalog so the next read reloads it."""
+        self._expires_at = 0.0
+        self.counters["invalidations"] += 1
+
+    # --- edits (admin) ---
+
+    def add_model(self, company, model, model_detail=None):
+        self.manager.upsert_model(company, model, model_detail)
+        self.invalidate()
+
+    def set_status(self, company, model, status):
+        self.manager.set_status(company, model, status)
+        self.invalidate()
+
+    def all_models(self):
+        """Every catalog entry regardless of status, read directly for the admin page."""
+        return self.manager.find_models(status=None)
+
+    # --- cross-process invalidation ---
+
+    def _start_watcher(self):
+        if self._watcher is None and self.source not in (None, "yaml"):
+            self._watcher = threading.Thread(target=self._watch, name="model-catalog-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        if self.manager.change_streams:
+            try:
+                with self.manager.collection.watch() as stream:
+                    print("Model catalog: watching change stream for edits")
+                    for _ in stream:
+                        self.invalidate()
+            except errors.OperationFailure:
+                # Standalone servers have no change streams; fall back to the version document
+                pass
+            except errors.PyMongoError as e:
+                print(f"Model catalog change stream stopped: {e}; polling for changes instead")
+        self._poll_version()
+
+    def _poll_version(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                version = self.manager.get_catalog_version()
+            except StorageError:
+                continue
+            if self._version is not None and version != self._version:
+                self._version = version
+                self.invalidate()
+
+    def stats(self):
+        return {**self.counters, "source": self.source, "entries": len(self._models or []),
+                "version": self._version, "ttl_s": self.ttl,
+                "expires_in_s": round(max(0.0, self._expires_at - time.monotonic()), 1)}
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_model_catalog():
+    """Return the process-wide ModelCatalog, creating it once."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ModelCatalog()
+    return _catalog
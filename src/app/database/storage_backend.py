@@ -0,0 +1,29 @@
+"""
+Storage backend selection.
+
+STORAGE_BACKEND=mongodb (the default) keeps everything in MongoDB.
+STORAGE_BACKEND=sqlite stores history, the model catalog and user preferences
+in an embedded SQLite file instead (see db_sqlite.py), so a single developer
+or a single-node deployment needs no database server.
+
+The managers of both backends have the same methods. Code that handles
+storage failures catches StorageError rather than a driver's own error type.
+"""
+import os
+import sqlite3
+
+from pymongo import errors
+
+BACKENDS = ("mongodb", "sqlite")
+
+# Raised by the managers of either backend
+StorageError = (errors.PyMongoError, sqlite3.Error)
+
+
+def storage_backend():
+    """The configured backend name, 'mongodb' or 'sqlite'."""
+    backend = (os.getenv("STORAGE_BACKEND") or "mongodb").strip().lower()
+    if backend not in BACKENDS:
+        print(f"Warning: Unknown STORAGE_BACKEND {backend!r}; using 'mongodb'")
+        return "mongodb"
+    return backend
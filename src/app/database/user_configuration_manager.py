@@ -1,35 +1,220 @@
-from pymongo import MongoClient
+from collections import OrderedDict
 from datetime import datetime
+from pymongo import errors
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from app.database.db_connection import DEFAULT_DB_NAME, get_connection_registry
+from app.database.storage_backend import StorageError, storage_backend
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-DB_NAME = "llm_experimenter"
 COLLECTION_NAME = "user_configuration"
-
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-user_config_collection = db[COLLECTION_NAME]
+# Preferences used to be saved here; they are copied to DEFAULT_DB_NAME on first read
+LEGACY_DB_NAME = "llm_experimenter"
 
 DEFAULT_FIELDS = ["temperature", "max_tokens", "top_p", "presence_penalty", "frequency_penalty"]
+PREFERENCE_PROJECTION = {"_id": 0, **{field: 1 for field in DEFAULT_FIELDS}}
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class UserPreferenceStore:
+    """
+    Per-user sampling defaults behind a bounded in-process LRU cache.
+
+    Reads go through the cache, so re-rendering the config panel costs no
+    database round trip once a user's preferences are loaded; users without
+    saved preferences are cached too. save() writes to MongoDB and updates
+    the cache in the same call.
+
+    Other processes learn about saves from a background thread: a change
+    stream on replica sets, or otherwise polling for documents whose
+    updated_at is newer than the last one seen. Entries also expire after
+    USER_PREFS_CACHE_TTL_S, which bounds staleness if clocks between workers
+    disagree.
+
+    Configuration (environment):
+        USER_PREFS_CACHE_SIZE (default 1000), USER_PREFS_CACHE_TTL_S (default 300),
+        USER_PREFS_POLL_S (default 5)
+    """
+
+    def __init__(self, collection=None, legacy_collection=None, max_entries=None, ttl=None, poll_interval=None):
+        registry = get_connection_registry()
+        self.collection = collection if collection is not None else registry.get_collection(
+            DEFAULT_DB_NAME, COLLECTION_NAME, uri=MONGO_URI)
+        self.legacy_collection = legacy_collection
+        if legacy_collection is None and collection is None and DEFAULT_DB_NAME != LEGACY_DB_NAME:
+            self.legacy_collection = registry.get_collection(LEGACY_DB_NAME, COLLECTION_NAME, uri=MONGO_URI)
+        self.max_entries = max_entries or _env_number("USER_PREFS_CACHE_SIZE", 1000)
+        self.ttl = ttl if ttl is not None else _env_number("USER_PREFS_CACHE_TTL_S", 300.0, float)
+        self.poll_interval = poll_interval if poll_interval is not None else _env_number("USER_PREFS_POLL_S", 5.0, float)
+        # email -> (preferences dict or None, expires_at)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._last_seen = None
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "invalidations": 0, "evictions": 0}
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index("email", name="email")
+            self.collection.create_index("updated_at", name="updated_at")
+        except errors.PyMongoError as e:
+            print(f"Warning: Could not create user configuration indexes: {e}")
+
+    # --- cache ---
+
+    def _cached(self, email):
+        with self._lock:
+            entry = self._cache.get(email)
+            if entry is None or time.monotonic() >= entry[1]:
+                return False, None
+            self._cache.move_to_end(email)
+            return True, entry[0]
+
+    def _store(self, email, prefs):
+        with self._lock:
+            self._cache[email] = (prefs, time.monotonic() + self.ttl)
+            self._cache.move_to_end(email)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, email=None):
+        """Forget one user's cached preferences, or everyone's."""
+        with self._lock:
+            if email is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(email, None)
+        self.counters["invalidations"] += 1
+
+    # --- reads and writes ---
+
+    def _fetch(self, email):
+        prefs = self.collection.find_one({"email": email}, PREFERENCE_PROJECTION)
+        if prefs is None and self.legacy_collection is not None:
+            prefs = self.legacy_collection.find_one({"email": email}, PREFERENCE_PROJECTION)
+            if prefs:
+                self._write(email, prefs)
+        return prefs or None
+
+    def get(self, email):
+        """
+        Saved preferences for a user.
+
+        Returns:
+            Dictionary with the saved subset of DEFAULT_FIELDS (empty if none
+            are saved or the database is unreachable). Do not modify it.
+        """
+        self._start_watcher()
+        found, prefs = self._cached(email)
+        if found:
+            self.counters["hits"] += 1
+            return prefs or {}
+        self.counters["misses"] += 1
+        try:
+            prefs = self._fetch(email)
+        except StorageError as e:
+            # Not cached, so the next render retries
+            print(f"Failed to load user configuration: {e}")
+            return {}
+        self._store(email, prefs)
+        return prefs or {}
+
+    def _write(self, email, prefs):
+        config_doc = {"email": email, "updated_at": datetime.utcnow()}
+        config_doc.update({field: prefs.get(field) for field in DEFAULT_FIELDS})
+        self.collection.update_one({"email": email}, {"$set": config_doc}, upsert=True)
+        self.counters["writes"] += 1
+
+    def save(self, email, config):
+        """Persist a user's preferences and update the cache (raises StorageError on failure)."""
+        prefs = {field: config.get(field) for field in DEFAULT_FIELDS}
+        self._write(email, prefs)
+        self._store(email, prefs)
+
+    # --- cross-process invalidation ---
+
+    def _start_watcher(self):
+        if self._watcher is None:
+            with self._lock:
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self._watch, name="user-prefs-watcher", daemon=True)
+                    self._watcher.start()
+
+    def _watch(self):
+        try:
+            with self.collection.watch(full_document="updateLookup") as stream:
+                for change in stream:
+                    email = (change.get("fullDocument") or {}).get("email")
+                    # Deletes only carry the _id, so drop everything
+                    self.invalidate(email)
+        except errors.OperationFailure:
+            # Standalone servers have no change streams
+            pass
+        except errors.PyMongoError as e:
+            print(f"User configuration change stream stopped: {e}; polling for changes instead")
+        self._poll_changes()
+
+    def _newest_update(self):
+        newest = self.collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+        return (newest or {}).get("updated_at")
+
+    def _changed_since(self, timestamp):
+        """(email, updated_at) of every preference saved after 'timestamp'."""
+        changed = self.collection.find({"updated_at": {"$gt": timestamp}}, {"_id": 0, "email": 1, "updated_at": 1})
+        return [(doc["email"], doc["updated_at"]) for doc in changed]
+
+    def _poll_changes(self):
+        while True:
+            try:
+                if self._last_seen is None:
+                    self._last_seen = self._newest_update() or datetime.utcnow()
+                else:
+                    for email, updated_at in self._changed_since(self._last_seen):
+                        self.invalidate(email)
+                        self._last_seen = max(self._last_seen, updated_at)
+            except StorageError:
+                pass
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        return {**self.counters, "entries": len(self._cache), "max_entries": self.max_entries, "ttl_s": self.ttl}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_user_preference_store():
+    """Return the process-wide UserPreferenceStore, creating it once."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if storage_backend() == "sqlite":
+                    from app.database.db_sqlite import SQLitePreferenceStore
+                    _store = SQLitePreferenceStore()
+                else:
+                    _store = UserPreferenceStore()
+    return _store
+
 
 def get_user_config(user_email: str, fallback: dict) -> dict:
-    config = user_config_collection.find_one({"email": user_email})
-    if config:
-        return {field: config.get(field, fallback[field]) for field in DEFAULT_FIELDS}
-    return fallback
+    prefs = get_user_preference_store().get(user_email)
+    return {field: prefs[field] if prefs.get(field) is not None else fallback[field] for field in DEFAULT_FIELDS}
+
 
 def save_user_config(user_email: str, config: dict):
-    config_doc = {
-        "email": user_email,
-        "updated_at": datetime.utcnow(),
-    }
-    config_doc.update({field: config.get(field) for field in DEFAULT_FIELDS})
-    
-    user_config_collection.update_one(
-        {"email": user_email},
-        {"$set": config_doc},
-        upsert=True
-    )
\ No newline at end of file
+    get_user_preference_store().save(user_email, config)
@@ -0,0 +1,300 @@
+"""
+Local HTTP stand-in for the OpenAI and Anthropic APIs, backed by the fake LLM.
+
+Example (from src/):
+    python -m app.fake_llm_server --port 8900 --ttft-ms 300 --tokens-per-s 80 --rate-limit-rate 0.05
+
+Then point the real clients at it (any API key is accepted):
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8900 ANTHROPIC_API_KEY=fake
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=fake
+
+Serves chat completions (POST .../chat/completions, streaming or not, with
+stream_options.include_usage), messages (POST /v1/messages, with the
+Anthropic SSE event sequence) and the model list (GET .../models). This
+exercises the real SDKs, their HTTP connection pools and the rate-limit
+header handling end to end. Injected 429s carry retry-after. With --rpm the
+server also enforces a per-minute request budget and sends
+x-ratelimit-* / anthropic-ratelimit-* headers.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.modelList.fake_llm import ERROR, FAKE_MODELS, RATE_LIMITED, FakeLLMConfig, FakeLLMEngine
+
+
+class RequestBudget:
+    """Fixed one-minute window of requests, shared by every connection."""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self._window_start = time.monotonic()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Count one request.
+
+        Returns:
+            (allowed, remaining, seconds until the window resets)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start, self._used = now, 0
+            reset = 60 - (now - self._window_start)
+            if self._used >= self.rpm:
+                return False, 0, reset
+            self._used += 1
+            return True, self.rpm - self._used, reset
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeLLM/1.0"
+    engine: FakeLLMEngine = None
+    budget: Optional[RequestBudget] = None
+    verbose = False
+    _ids = itertools.count(1)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    # --- plumbing ---
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("content-length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _start_stream(self, headers: Dict):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("transfer-encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _send_event(self, data: str, event: Optional[str] = None):
+        text = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        chunk = text.encode("utf-8")
+        self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _rate_limit_headers(self, anthropic: bool, remaining: int, reset: float) -> Dict:
+        if self.budget is None:
+            return {}
+        if anthropic:
+            reset_at = (datetime.now(timezone.utc) + timedelta(seconds=reset)).isoformat().replace("+00:00", "Z")
+            return {"anthropic-ratelimit-requests-limit": str(self.budget.rpm),
+                    "anthropic-ratelimit-requests-remaining": str(remaining),
+                    "anthropic-ratelimit-requests-reset": reset_at}
+        return {"x-ratelimit-limit-requests": str(self.budget.rpm),
+                "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s"}
+
+    def _send_error(self, anthropic: bool, status: int, message: str, headers: Optional[Dict] = None):
+        if anthropic:
+            kind = {429: "rate_limit_error", 500: "api_error"}.get(status, "invalid_request_error")
+            body = {"type": "error", "error": {"type": kind, "message": message}}
+        else:
+            kind = {429: "rate_limit_exceeded", 500: "server_error"}.get(status, "invalid_request_error")
+            body = {"error": {"message": message, "type": kind, "param": None, "code": kind}}
+        self._send_json(status, body, headers)
+
+    def _plan(self, anthropic: bool, request: Dict):
+        """
+        Plan the reply, or answer with the injected or budget-enforced error.
+
+        Returns:
+            (FakeReply, response headers), or (None, None) if an error was sent
+        """
+        headers = {}
+        if self.budget is not None:
+            allowed, remaining, reset = self.budget.take()
+            headers = self._rate_limit_headers(anthropic, remaining, reset)
+            if not allowed:
+                self._send_error(anthropic, 429, "Request budget exhausted", {**headers, "retry-after": f"{reset:.0f}"})
+                return None, None
+        messages = list(request.get("messages") or [])
+        if anthropic and request.get("system"):
+            messages.insert(0, {"role": "system", "content": request["system"]})
+        max_tokens = request.get("max_tokens") or request.get("max_completion_tokens") or 4096
+        reply = self.engine.plan(request.get("model", ""), messages, int(max_tokens))
+        if reply.outcome == RATE_LIMITED:
+            self._send_error(anthropic, 429, "Rate limit exceeded (injected)",
+                             {**headers, "retry-after": f"{reply.retry_after:g}"})
+            return None, None
+        if reply.outcome == ERROR:
+            time.sleep(reply.ttft)
+            self._send_error(anthropic, 500, "Internal server error (injected)", headers)
+            return None, None
+        return reply, headers
+
+    # --- routes ---
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": model, "object": "model", "created": 0, "owned_by": "fake"} for model in FAKE_MODELS]})
+        elif "/models/" in path:
+            self._send_json(200, {"id": path.rsplit("/", 1)[1], "object": "model", "created": 0, "owned_by": "fake"})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        request = self._read_json()
+        try:
+            if path.endswith("/chat/completions"):
+                self._chat_completions(request)
+            elif path.endswith("/messages"):
+                self._messages(request)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-stream (cancelled or timed out)
+            self.close_connection = True
+
+    def _chat_completions(self, request: Dict):
+        reply, headers = self._plan(False, request)
+        if reply is None:
+            return
+        response_id, created, model = f"chatcmpl-fake-{next(self._ids)}", int(time.time()), request.get("model", "")
+        usage = {"prompt_tokens": reply.prompt_tokens, "completion_tokens": reply.completion_tokens,
+                 "total_tokens": reply.prompt_tokens + reply.completion_tokens}
+        if not request.get("stream"):
+            time.sleep(reply.duration)
+            self._send_json(200, {
+                "id": response_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply.text},
+                             "finish_reason": reply.finish_reason, "logprobs": None}],
+                "usage": usage,
+            }, headers)
+            return
+
+        def chunk(choices, **extra):
+            return json.dumps({"id": response_id, "object": "chat.completion.chunk", "created": created,
+                               "model": model, "choices": choices, **extra})
+
+        self._start_stream(headers)
+        self._send_event(chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))
+        for token in self.engine.stream(reply):
+            self._send_event(chunk([{"index": 0, "delta": {"content": token}, "finish_reason": None}]))
+        self._send_event(chunk([{"index": 0, "delta": {}, "finish_reason": reply.finish_reason}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event(chunk([], usage=usage))
+        self._send_event("[DONE]")
+        self._end_stream()
+
+    def _messages(self, request: Dict):
+        reply, headers = self._plan(True, request)
+        if reply is None:
+            return
+        message_id, model = f"msg_fake_{next(self._ids)}", request.get("model", "")
+        stop_reason = "max_tokens" if reply.finish_reason == "length" else "end_turn"
+        if not request.get("stream"):
+            time.sleep(reply.duration)
+            self._send_json(200, {
+                "id": message_id, "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": reply.text}],
+                "stop_reason": stop_reason, "stop_sequence": None,
+                "usage": {"input_tokens": reply.prompt_tokens, "output_tokens": reply.completion_tokens},
+            }, headers)
+            return
+
+        def event(name, **data):
+            self._send_event(json.dumps({"type": name, **data}), event=name)
+
+        self._start_stream(headers)
+        event("message_start", message={
+            "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+            "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": reply.prompt_tokens, "output_tokens": 1}})
+        event("content_block_start", index=0, content_block={"type": "text", "text": ""})
+        for token in self.engine.stream(reply):
+            event("content_block_delta", index=0, delta={"type": "text_delta", "text": token})
+        event("content_block_stop", index=0)
+        event("message_delta", delta={"stop_reason": stop_reason, "stop_sequence": None},
+              usage={"output_tokens": reply.completion_tokens})
+        event("message_stop")
+        self._end_stream()
+
+
+def make_server(host: str, port: int, config: FakeLLMConfig, rpm: Optional[int] = None,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    """Build (but do not start) a server; port 0 picks a free port."""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {
+        "engine": FakeLLMEngine(config),
+        "budget": RequestBudget(rpm) if rpm else None,
+        "verbose": verbose,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    defaults = FakeLLMConfig.from_env()
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI/Anthropic-compatible API for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms, help="Time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=defaults.tokens_per_second, help="Streaming token rate")
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens,
+                        help="Reply length before max_tokens is applied")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate,
+                        help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after-s", type=float, default=defaults.retry_after_s, help="retry-after sent with 429s")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed for reply text and fault sequence")
+    parser.add_argument("--rpm", type=int, help="Enforce a requests-per-minute budget and send rate-limit headers")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    config = FakeLLMConfig(ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_s, output_tokens=args.output_tokens,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           retry_after_s=args.retry_after_s, seed=args.seed)
+    server = make_server(args.host, args.port, config, args.rpm, args.verbose)
+    print(f"Fake LLM API listening on http://{args.host}:{server.server_port} "
+          f"(OpenAI base URL http://{args.host}:{server.server_port}/v1)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Profile what the app imports at startup and enforce a cold-start budget.
+
+Example (from src/):
+    python -m app.import_profile
+    python -m app.import_profile --budget-ms 800 --top 15 --runs 5
+
+The top-level imports of app/main.py are read from its source, so the list
+follows the app as it changes. They are imported in a fresh interpreter
+under `python -X importtime`, and the report shows:
+- each of those modules' cumulative import time;
+- the packages with the most self time;
+- the total wall time, which is the median over --runs interpreters.
+
+Exits with status 1 when the total exceeds the budget or when a provider SDK
+(openai, anthropic, groq, google.genai) is imported at startup instead of on
+first use, so the command can gate CI.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MAIN_PATH = os.path.join(SRC_DIR, "app", "main.py")
+
+# Imported by the provider client modules; loading them at startup defeats lazy loading
+EAGER_FORBIDDEN = ("openai", "anthropic", "groq", "google.genai")
+
+
+@dataclass
+class ImportTiming:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def startup_imports(path: str = MAIN_PATH) -> List[str]:
+    """Module names imported at the top level of a script, in source order."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+def parse_importtime(stderr: str) -> List[ImportTiming]:
+    """Parse `-X importtime` lines: 'import time: self [us] | cumulative | imported package'."""
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us),
+                                        (len(name) - len(name.lstrip())) // 2))
+        except ValueError:
+            continue
+    return timings
+
+
+_PROBE = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{"wall_ms": (time.perf_counter() - start) * 1000,
+                  "loaded": sorted(sys.modules)}}))
+"""
+
+
+def profile_once(modules: List[str]) -> Dict:
+    """Import the modules in a fresh interpreter and return its timings."""
+    # main.py runs with app/ on sys.path (for `utils`) and appends src/ itself
+    code = _PROBE.format(paths=[SRC_DIR, os.path.join(SRC_DIR, "app")], modules=modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, cwd=SRC_DIR)
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["no output"]
+        raise SystemExit(f"Import probe failed: {tail[0]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["timings"] = parse_importtime(proc.stderr)
+    return result
+
+
+def package_self_times(timings: List[ImportTiming]) -> Dict[str, int]:
+    """Self time summed per top-level package (e.g. every pymongo.* module under 'pymongo')."""
+    totals: Dict[str, int] = {}
+    for timing in timings:
+        package = timing.name.split(".")[0]
+        totals[package] = totals.get(package, 0) + timing.self_us
+    return totals
+
+
+def eager_violations(loaded: List[str], forbidden=EAGER_FORBIDDEN) -> List[str]:
+    loaded = set(loaded)
+    return [name for name in forbidden if name in loaded]
+
+
+def report(modules: List[str], result: Dict, wall_ms: List[float], top: int, source: str = "app/main.py") -> str:
+    timings = result["timings"]
+    # Cumulative time of each requested module, from the line where it was first imported
+    first_seen = {}
+    for timing in timings:
+        first_seen.setdefault(timing.name, timing)
+    lines = [f"Startup imports of {source} ({len(modules)} modules):"]
+    for name in sorted(modules, key=lambda n: -(first_seen[n].cumulative_us if n in first_seen else 0)):
+        cumulative = first_seen[name].cumulative_us / 1000 if name in first_seen else 0.0
+        lines.append(f"  {cumulative:8.1f} ms  {name}")
+
+    lines.append(f"Heaviest packages by self time (top {top}):")
+    packages = sorted(package_self_times(timings).items(), key=lambda kv: -kv[1])[:top]
+    for package, self_us in packages:
+        lines.append(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    lines.append(f"Wall time: median {statistics.median(wall_ms):.0f} ms over {len(wall_ms)} runs "
+                 f"(min {min(wall_ms):.0f}, max {max(wall_ms):.0f}); {len(result['loaded'])} modules loaded")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Profile app start-up imports and enforce a time budget.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")),
+                        help="Fail if the median wall time exceeds this (default IMPORT_BUDGET_MS or 1000)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="Packages to list by self time")
+    parser.add_argument("--module", action="append", help="Profile these modules instead of main.py's imports")
+    parser.add_argument("--allow-eager-sdk", action="store_true",
+                        help="Do not fail when a provider SDK is imported at startup")
+    args = parser.parse_args(argv)
+
+    modules = args.module or startup_imports()
+    runs = [profile_once(modules) for _ in range(max(1, args.runs))]
+    wall_ms = [run["wall_ms"] for run in runs]
+    # Break down the median run rather than the first, which pays for .pyc compilation
+    median_run = sorted(runs, key=lambda run: run["wall_ms"])[len(runs) // 2]
+    print(report(modules, median_run, wall_ms, args.top, "--module" if args.module else "app/main.py"))
+
+    failures = []
+    if statistics.median(wall_ms) > args.budget_ms:
+        failures.append(f"startup imports took {statistics.median(wall_ms):.0f} ms, budget is {args.budget_ms:.0f} ms")
+    eager = eager_violations(median_run["loaded"])
+    if eager and not args.allow_eager_sdk:
+        failures.append(f"provider SDKs imported at startup: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
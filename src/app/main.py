@@ -11,27 +11,82 @@ from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils import SessionManager
-from app.database.db_history_manager import HistoryManager
-from app.database.db_llm_model import LLM_MODEL_Manager
-from app.database.user_configuration_manager import get_user_config
+from app import chat_session
+from app.database.db_history_manager import create_history_manager
+from app.database.model_catalog import get_model_catalog
+from app.database.user_configuration_manager import get_user_config, save_user_config
 
-from app.modelList.openai_class import CLS_OpenAI_Client
-from app.modelList.anthropic_class import CLS_Anthropic_Client
-from app.modelList.llama_class import CLS_Groq_Client
-from app.modelList.gemini_class import CLS_Gemini_Client
+from app.modelList.client_registry import get_provider_client
+from app.modelList.base_client import GenerationParams
+from app.modelList.compare import compare_models
+from app.modelList.resilience import get_resilience
+from app.metrics import start_metrics_server
+from app.cache.similarity_cache import get_similarity_cache, similarity_cache_enabled
 
-from configurations.settings import Settings
+from configurations.settings import settings
+
+
+MAX_COMPARE_MODELS = 6
+SIDEBAR_HISTORY_LIMIT = 10
+SIDEBAR_PREVIEW_CHARS = 200
+
+
+def render_compare_result(result):
+    if result.ok:
+        st.markdown(result.text)
+        if result.metadata.get("cache"):
+            st.caption("⚡ Served from response cache")
+    else:
+        st.error(f"Failed: {result.error}")
+    ttft = f"{result.time_to_first_token:.2f}s" if result.time_to_first_token is not None else "-"
+    total = f"{result.latency:.2f}s" if result.latency is not None else "-"
+    st.caption(f"⏱️ First token: {ttft} | Total: {total}")
+
+
+def retry_with_model(prompt):
+    # Drop the reused answer and its prompt, then resend the prompt on the next run
+    chat_session.drop_last(st.session_state, 2)
+    st.session_state.retry_prompt = prompt
+
+
+def render_compare_results(results):
+    for column, result in zip(st.columns(len(results)), results):
+        with column:
+            st.markdown(f"**{result.provider}: {result.model}**")
+            render_compare_result(result)
 
 
 # Initialize SessionManager
 session_manager = SessionManager()
 
-# Initialize session state
-if "session_id" not in st.session_state:
-    st.session_state.session_id = session_manager.generate_session_id()
+# Prometheus endpoint for provider and database timings (started once per process)
+start_metrics_server()
+
+# Database managers share one pooled MongoClient, so build them once per process
+@st.cache_resource
+def get_history_manager():
+    manager = create_history_manager()
+    manager.ensure_indexes()
+    return manager
+
+@st.cache_resource
+def get_prompt_similarity_cache():
+    # Index previously saved prompts once per process without blocking the first render
+    cache = get_similarity_cache()
+    cache.load_in_background(get_history_manager())
+    return cache
 
 # Initialize HistoryManager
-history_manager = HistoryManager()
+history_manager = get_history_manager()
+
+# The session id lives in the URL, so a refresh or a link resumes the conversation
+requested_session = st.query_params.get("session")
+if "session_id" not in st.session_state or (requested_session and requested_session != st.session_state.session_id):
+    if requested_session:
+        chat_session.resume_session(st.session_state, history_manager, requested_session)
+    else:
+        chat_session.start_session(st.session_state, session_manager.generate_session_id())
+        st.query_params["session"] = st.session_state.session_id
 
 # Load environment variables
 load_dotenv()
@@ -43,10 +98,11 @@ st.title("LLM Experimenter")
 # Initialize session state
 if "user" not in st.session_state:
     st.session_state.user = None
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+chat_session.init_state(st.session_state)
 if "selected_model" not in st.session_state:
     st.session_state.selected_model = "gpt-3.5-turbo"
+if "compare_runs" not in st.session_state:
+    st.session_state.compare_runs = []
 
 
 
@@ -54,8 +110,9 @@ top_left, top_spacer, top_right = st.columns([2,6,2])
 with top_left:
     if st.button("New_Session", key="new_session_btn"
                  ):
-        st.session_state.session_id = session_manager.generate_session_id()
-        st.session_state.chat_history = []
+        chat_session.start_session(st.session_state, session_manager.generate_session_id())
+        st.query_params["session"] = st.session_state.session_id
+        st.session_state.compare_runs = []
         st.session_state['show_config'] = False  # Hide config on new session
         st.success("Started a new session.")
 with top_right:
@@ -75,20 +132,44 @@ with st.sidebar:
         else:
             st.warning("Please enter a name or email.")
 
+    # Upstreams currently failing fast after repeated errors
+    open_breakers = get_resilience().open_breakers()
+    if open_breakers:
+        st.markdown("---")
+        st.subheader("🔌 Provider Status")
+        for name, retry_in in open_breakers.items():
+            st.warning(f"{name} is unavailable; retrying in {retry_in:.0f}s")
+
     # Show session history only if user is logged in
     if st.session_state.get("user"):
         st.markdown("---")
         st.subheader("📜 Session History")
-        saved_history = history_manager.get_history(st.session_state.session_id, limit=10)
+        # Keyset cursors of the pages above the one shown; reset when the session changes
+        if st.session_state.get("history_pages_session") != st.session_state.session_id:
+            st.session_state.history_pages = []
+            st.session_state.history_pages_session = st.session_state.session_id
+        page_cursor = st.session_state.history_pages[-1] if st.session_state.history_pages else None
+        saved_history = history_manager.get_session_history(
+            st.session_state.session_id, limit=SIDEBAR_HISTORY_LIMIT,
+            before=page_cursor, preview_chars=SIDEBAR_PREVIEW_CHARS)
         for item in saved_history:
             st.markdown(f"🕒 `{item['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}` | **{item['model']}**")
-            st.markdown(f"- **Prompt:** {item['prompt']}")
-            st.markdown(f"- **Response:** {item['response']}")
+            st.markdown(f"- **Prompt:** {item['prompt']}{'…' if item.get('prompt_truncated') else ''}")
+            st.markdown(f"- **Response:** {item['response']}{'…' if item.get('response_truncated') else ''}")
+        newer_col, older_col = st.columns(2)
+        with newer_col:
+            if st.session_state.history_pages and st.button("◂ Newer", key="history_newer"):
+                st.session_state.history_pages.pop()
+                st.rerun()
+        with older_col:
+            next_cursor = history_manager.next_page_cursor(saved_history, SIDEBAR_HISTORY_LIMIT)
+            if next_cursor is not None and st.button("Older ▸", key="history_older"):
+                st.session_state.history_pages.append(next_cursor)
+                st.rerun()
 
 
 # --- Show configuration in main area if toggled ---
 if st.session_state.get('show_config', False) and st.session_state.get("user"):
-    settings = Settings()
     user_defaults = get_user_config(st.session_state.user, fallback=settings.defaults)
     st.markdown("---")
     st.subheader("⚙️ Advanced Parameters")
@@ -97,6 +178,18 @@ if st.session_state.get('show_config', False) and st.session_state.get("user"):
     top_p = st.slider("Top-p", 0.0, 1.0, user_defaults["top_p"], step=0.05, key="sidebar_top_p")
     presence_penalty = st.slider("Presence Penalty", -2.0, 2.0, user_defaults["presence_penalty"], step=0.1, key="sidebar_presence_penalty")
     frequency_penalty = st.slider("Frequency Penalty", -2.0, 2.0, user_defaults["frequency_penalty"], step=0.1, key="sidebar_frequency_penalty")
+    if st.button("💾 Save as my defaults", key="save_user_config"):
+        try:
+            save_user_config(st.session_state.user, {
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "top_p": top_p,
+                "presence_penalty": presence_penalty,
+                "frequency_penalty": frequency_penalty,
+            })
+            st.success("Saved your default parameters.")
+        except Exception as e:
+            st.error(f"Failed to save your defaults: {e}")
 
 # App Body (show only if config is not shown)
 if st.session_state.user and not st.session_state.get('show_config', False):
@@ -106,101 +199,215 @@ if st.session_state.user and not st.session_state.get('show_config', False):
     top_p = st.session_state.get("sidebar_top_p", 1.0)
     presence_penalty = st.session_state.get("sidebar_presence_penalty", 0.0)
     frequency_penalty = st.session_state.get("sidebar_frequency_penalty", 0.0)
-
-    flattened_options = []
-    # Load model configurations
-    llm_model_manager = LLM_MODEL_Manager()
-    available_models = llm_model_manager.get_models()
-
-    if available_models:
-        for model in available_models:
-            flattened_options.append(f"{model['company']}: {model['model']}")
+    sampling_parameters = {
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+        "presence_penalty": presence_penalty,
+        "frequency_penalty": frequency_penalty,
+    }
+
+    # Active models from the cached catalog (falls back to models.yml only if MongoDB is unreachable)
+    model_catalog = get_model_catalog()
+    flattened_options = [f"{model['company']}: {model['model']}" for model in model_catalog.get_models()]
+    if not flattened_options:
+        st.warning("No active models in the catalog. Add models on the Admin page.")
+    elif model_catalog.source == "yaml":
+        st.caption("⚠️ Database unavailable; showing models from models.yml")
+
+    compare_mode = st.toggle("Compare models", key="compare_mode")
+    use_cache = st.checkbox("Use response cache", value=True, key="use_response_cache",
+                            help="Reuse a stored answer for an identical prompt, model and settings")
+    reuse_similar = st.checkbox("Reuse answers for similar prompts", value=similarity_cache_enabled(),
+                                key="reuse_similar_answers",
+                                help="Answer a new conversation instantly from a near-duplicate earlier prompt")
+    if compare_mode:
+        compare_targets = st.multiselect("Select Models:", flattened_options, key="compare_flat",
+                                         max_selections=MAX_COMPARE_MODELS)
     else:
-        model_config = settings.model_config
-        for provider, model_list in model_config.items():
-            for model in model_list:
-                flattened_options.append(f"{provider}: {model}")
-
-    selected_flat = st.selectbox("Select Model:", flattened_options, key="flat")
-    if selected_flat:
-        provider_name = selected_flat.split(": ")[0]
-        model_name = selected_flat.split(": ")[1]
-        st.write(f"Provider: {provider_name}, Model: {model_name}")
+        # None when the catalog is empty
+        selected_flat = st.selectbox("Select Model:", flattened_options, key="flat")
+        if selected_flat:
+            provider_name = selected_flat.split(": ")[0]
+            model_name = selected_flat.split(": ")[1]
+            st.write(f"Provider: {provider_name}, Model: {model_name}")
 
     st.divider()
 
+    # Older turns of a resumed or long session are loaded on request
+    if st.session_state.older_available and st.button("⬆️ Load earlier messages", key="load_earlier"):
+        chat_session.load_earlier(st.session_state, history_manager)
+        st.rerun()
+    for chat in st.session_state.earlier_messages:
+        with st.chat_message(chat["role"]):
+            st.markdown(chat["content"])
+    if st.session_state.earlier_messages:
+        hidden = st.session_state.earlier_hidden
+        st.caption("⬆️ Earlier messages" + (f" ({hidden} newer earlier messages unloaded)" if hidden else ""))
+        if st.button("⬇️ Back to latest", key="back_to_latest"):
+            chat_session.back_to_latest(st.session_state)
+            st.rerun()
+
     # Display chat history
     for chat in st.session_state.chat_history:
         with st.chat_message(chat["role"]):
             st.markdown(chat["content"])
 
-    # Prompt input
-    prompt = st.chat_input("Ask something...")
+    # Previous compare runs for this session
+    if compare_mode:
+        for run in st.session_state.compare_runs:
+            st.chat_message("user").markdown(run["prompt"])
+            render_compare_results(run["results"])
+
+    # Prompt input; a prompt re-sent from a reused answer skips the similarity lookup
+    retry_prompt = st.session_state.pop("retry_prompt", None)
+    prompt = st.chat_input("Ask something...") or retry_prompt
+
+    if prompt and compare_mode:
+        if not compare_targets:
+            st.warning("Select at least one model to compare.")
+        else:
+            st.chat_message("user").markdown(prompt)
+            targets = [tuple(flat.split(": ", 1)) for flat in compare_targets]
+            params = GenerationParams(temperature=temperature, max_tokens=max_tokens, top_p=top_p,
+                                      presence_penalty=presence_penalty, frequency_penalty=frequency_penalty)
+
+            # Fan out to every model at once and fill each column as its answer completes
+            columns = st.columns(len(targets))
+            placeholders = {}
+            for column, (provider, model) in zip(columns, targets):
+                with column:
+                    st.markdown(f"**{provider}: {model}**")
+                    placeholders[(provider, model)] = st.empty()
+                    placeholders[(provider, model)].caption("Waiting for response...")
+
+            results = {}
+            for result in compare_models(targets, st.session_state.chat_history + [{"role": "user", "content": prompt}],
+                                         params, use_cache=use_cache):
+                results[(result.provider, result.model)] = result
+                with placeholders[(result.provider, result.model)].container():
+                    render_compare_result(result)
+                if result.ok:
+                    history_manager.save_history(
+                        user=st.session_state.user,
+                        session_id=st.session_state.session_id,
+                        model=result.model,
+                        prompt=prompt,
+                        response=result.text,
+                        parameters=sampling_parameters,
+                        context_turns=len(st.session_state.chat_history)
+                    )
 
-    if prompt:
+            st.session_state.compare_runs.append({"prompt": prompt, "results": [results[target] for target in targets]})
+
+    elif prompt and not selected_flat:
+        st.warning("Select a model to start chatting.")
+
+    elif prompt:
         # Display user message
         st.chat_message("user").markdown(prompt)
-        st.session_state.chat_history.append({"role": "user", "content": prompt})
-
-        # Call OpenAI API
-        try:
-            with st.spinner("Thinking..."):
+        chat_session.add_user_message(st.session_state, prompt)
+
+        # A new conversation can be answered from a near-duplicate earlier prompt
+        context_turns = len(st.session_state.chat_history) - 1
+        similarity_cache = get_prompt_similarity_cache()
+        similar, reused_entry = None, None
+        if reuse_similar and retry_prompt is None and context_turns == 0:
+            similar = similarity_cache.lookup(model_name, sampling_parameters, prompt)
+            if similar:
+                reused_entry = history_manager.get_history_entry(similar.entry_id)
+
+        if reused_entry:
+            with st.chat_message("assistant"):
+                st.markdown(reused_entry["response"])
+                st.caption(f"♻️ Reused the answer to a similar earlier prompt ({similar.similarity:.0%} similar): "
+                           f"“{reused_entry['prompt'][:200]}”")
+                st.button("Ask the model instead", on_click=retry_with_model, args=(prompt,))
+            chat_session.add_assistant_message(st.session_state, reused_entry["response"])
+        else:
+            # Stream the answer from the selected provider
+            try:
                 print(f"Selected Model: {model_name}")
                 print(f"Provider: {provider_name}")
 
                 if provider_name == "openai":
-                    openai_client = CLS_OpenAI_Client()
-                    answer = openai_client.generate_text_response(
+                    openai_client = get_provider_client("openai")
+                    chunks = openai_client.stream_text_response(
                         selected_model=model_name,
                         chat_history=st.session_state.chat_history,
                         temperature=temperature,
                         max_tokens=max_tokens,
                         presence_penalty=presence_penalty,
-                        frequency_penalty=frequency_penalty)
-                    print(f"Response from OpenAI: {answer}")
+                        frequency_penalty=frequency_penalty,
+                        use_cache=use_cache)
                 elif provider_name == "anthropic":
-                    anthropic_client = CLS_Anthropic_Client()
-                    answer = anthropic_client.generate_text_response(
+                    anthropic_client = get_provider_client("anthropic")
+                    chunks = anthropic_client.stream_text_response(
                         selected_model=model_name,
                         chat_history=st.session_state.chat_history,
                         temperature=temperature,
-                        max_tokens=max_tokens
+                        max_tokens=max_tokens,
+                        use_cache=use_cache
                     )
-                    print(f"Response from Anthropic: {answer}")
                 elif provider_name == "llama":
-                    llama_client = CLS_Groq_Client()
-                    answer = llama_client.generate_text_response(
+                    llama_client = get_provider_client("llama")
+                    chunks = llama_client.stream_text_response(
                         selected_model=model_name,
                         chat_history=st.session_state.chat_history,
                         temperature=temperature,
-                        max_tokens=max_tokens,
-                        frequency_penalty=frequency_penalty
+                        max_completion_tokens=max_tokens,
+                        frequency_penalty=frequency_penalty,
+                        use_cache=use_cache
                     )
-                    print(f"Response from Llama: {answer}")
                 elif provider_name == "google":
-                    google_client = CLS_Gemini_Client()
-                    answer = google_client.generate_text_response(
+                    google_client = get_provider_client("google")
+                    chunks = google_client.stream_text_response(
                         selected_model=model_name,
                         chat_history=st.session_state.chat_history,
                         temperature=temperature,
                         max_tokens=max_tokens,
+                        use_cache=use_cache
                     )
-                    print(f"Response from Llama: {answer}")
-
-            # Display assistant response
-            st.chat_message("assistant").markdown(answer)
-            st.session_state.chat_history.append({"role": "assistant", "content": answer})
-
-            # Save interaction to MongoDB
-            history_manager.save_history(
-                user=st.session_state.user,
-                session_id=st.session_state.session_id,
-                model=model_name,
-                prompt=prompt,
-                response=answer
-            )
-
-        except Exception as e:
-            st.error(f"Error: {e}")
+                elif provider_name == "fake":
+                    fake_client = get_provider_client("fake")
+                    chunks = fake_client.stream_text_response(
+                        selected_model=model_name,
+                        chat_history=st.session_state.chat_history,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        presence_penalty=presence_penalty,
+                        frequency_penalty=frequency_penalty,
+                        use_cache=use_cache)
+                else:
+                    raise ValueError(f"Unsupported provider '{provider_name}'")
+
+                # Display assistant response as tokens arrive
+                with st.chat_message("assistant"):
+                    answer = st.write_stream(chunks)
+
+                if not answer:
+                    st.error(f"No response received from {provider_name}: {model_name}")
+                else:
+                    print(f"Response from {provider_name}: {answer}")
+                    entry_id = None
+                    try:
+                        # Save interaction to MongoDB
+                        entry_id = history_manager.save_history(
+                            user=st.session_state.user,
+                            session_id=st.session_state.session_id,
+                            model=model_name,
+                            prompt=prompt,
+                            response=answer,
+                            parameters=sampling_parameters,
+                            context_turns=context_turns
+                        )
+                    finally:
+                        # The entry id lets the turn be reloaded after it is dropped from memory
+                        chat_session.add_assistant_message(st.session_state, answer, entry_id)
+                    if context_turns == 0:
+                        similarity_cache.add(entry_id, model_name, sampling_parameters, prompt)
+
+            except Exception as e:
+                st.error(f"Error: {e}")
 elif not st.session_state.get('show_config', False):
     st.info("Please login using the sidebar to start chatting.")
\ No newline at end of file
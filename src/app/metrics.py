@@ -0,0 +1,170 @@
+"""
+Prometheus metrics for provider calls and MongoDB operations.
+
+Metrics live in the default prometheus_client registry and are served in
+Prometheus text format by start_metrics_server(), by default on
+http://127.0.0.1:9464/metrics.
+
+Configuration (environment):
+    METRICS_ENABLED (default on), METRICS_ADDR (default 127.0.0.1), METRICS_PORT (default 9464)
+"""
+import os
+import threading
+from typing import Optional
+
+from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from pymongo import monitoring
+
+LLM_LABELS = ("provider", "model", "outcome")
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a streaming request to its first text chunk",
+    LLM_LABELS, buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20, 30),
+)
+REQUEST_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Total duration of a provider call, excluding rate-limit waits",
+    LLM_LABELS, buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 120),
+)
+TOKENS_PER_SECOND = Histogram(
+    "llm_output_tokens_per_second", "Completion tokens per second after the first token",
+    LLM_LABELS, buckets=(5, 10, 20, 40, 60, 80, 120, 160, 250, 500, 1000),
+)
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt tokens per request as reported by the provider",
+    LLM_LABELS, buckets=(16, 64, 256, 1024, 4096, 16384, 65536, 262144),
+)
+COMPLETION_TOKENS = Histogram(
+    "llm_completion_tokens", "Completion tokens per request as reported by the provider",
+    LLM_LABELS, buckets=(16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 32768),
+)
+REQUESTS = Counter(
+    "llm_requests_total", "Generation requests by outcome (ok, error, empty, invalid, circuit_open, cached)",
+    LLM_LABELS,
+)
+RETRIES = Counter("llm_retries_total", "Provider call attempts that were retried", ("provider", "model"))
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time",
+    ("database", "command", "outcome"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def outcome_of(result) -> str:
+    if result.metadata.get("cache"):
+        return "cached"
+    if result.ok:
+        return "ok"
+    return {"CircuitOpen": "circuit_open", "ValidationError": "invalid",
+            "EmptyResponse": "empty"}.get(result.error_type, "error" if result.error else "empty")
+
+
+def record_generation(result):
+    """Record one finished GenerationResult (successful, failed or served from cache)."""
+    outcome = outcome_of(result)
+    labels = (result.provider, result.model, outcome)
+    REQUESTS.labels(*labels).inc()
+    # Cached answers and requests that never reached the provider carry no fresh timings
+    if outcome in ("cached", "invalid", "circuit_open"):
+        return
+    if result.latency is not None:
+        REQUEST_LATENCY.labels(*labels).observe(result.latency)
+    if result.time_to_first_token is not None:
+        TIME_TO_FIRST_TOKEN.labels(*labels).observe(result.time_to_first_token)
+    if result.prompt_tokens is not None:
+        PROMPT_TOKENS.labels(*labels).observe(result.prompt_tokens)
+    if result.completion_tokens:
+        COMPLETION_TOKENS.labels(*labels).observe(result.completion_tokens)
+        generating = (result.latency or 0) - (result.time_to_first_token or 0)
+        if generating > 0:
+            TOKENS_PER_SECOND.labels(*labels).observe(result.completion_tokens / generating)
+
+
+def record_retry(provider: str, selected_model: str):
+    RETRIES.labels(provider, selected_model).inc()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command sent through the shared MongoClient (finds, inserts, aggregates, ...)."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.database_name, event.command_name, "ok").observe(
+            event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.database_name, event.command_name, "error").observe(
+            event.duration_micros / 1e6)
+
+
+class _RuntimeStateCollector:
+    """Reads circuit breaker and rate limiter state at scrape time."""
+
+    _BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        # Imported here so this module stays importable from the database layer
+        from app.modelList.rate_limiter import rate_limit_stats
+        from app.modelList.resilience import get_resilience
+
+        state = GaugeMetricFamily("llm_circuit_breaker_state", "0 closed, 1 half-open, 2 open", labels=["breaker"])
+        opened = GaugeMetricFamily("llm_circuit_breaker_opened", "Times the breaker has opened", labels=["breaker"])
+        rejected = GaugeMetricFamily("llm_circuit_breaker_rejected", "Calls rejected while open", labels=["breaker"])
+        for name, stats in get_resilience().breaker_stats().items():
+            state.add_metric([name], self._BREAKER_STATES[stats["state"]])
+            opened.add_metric([name], stats["opened"])
+            rejected.add_metric([name], stats["rejected"])
+
+        concurrency = GaugeMetricFamily("llm_rate_limit_concurrency", "Current adaptive concurrency limit",
+                                        labels=["provider"])
+        in_flight = GaugeMetricFamily("llm_rate_limit_in_flight", "Requests holding a rate-limit slot",
+                                      labels=["provider"])
+        throttled = GaugeMetricFamily("llm_rate_limit_throttled_seconds", "Total time spent waiting for rate budget",
+                                      labels=["provider"])
+        for provider, stats in rate_limit_stats().items():
+            concurrency.add_metric([provider], stats["concurrency_limit"])
+            in_flight.add_metric([provider], stats["in_flight"])
+            throttled.add_metric([provider], stats["throttled_seconds"])
+        return [state, opened, rejected, concurrency, in_flight, throttled]
+
+
+REGISTRY.register(_RuntimeStateCollector())
+
+_server_running: Optional[bool] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, addr: Optional[str] = None) -> bool:
+    """
+    Serve /metrics once per process. Safe to call on every Streamlit rerun;
+    only the first call tries to bind the port.
+
+    Returns:
+        True if the endpoint is running in this process
+    """
+    global _server_running
+    if _server_running is not None:
+        return _server_running
+    with _server_lock:
+        if _server_running is not None:
+            return _server_running
+        if os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("1", "true", "yes", "on"):
+            _server_running = False
+            return False
+        port = port or int(os.getenv("METRICS_PORT", "9464"))
+        addr = addr or os.getenv("METRICS_ADDR", "127.0.0.1")
+        try:
+            start_http_server(port, addr=addr)
+        except OSError as e:
+            print(f"Warning: Could not start metrics endpoint on {addr}:{port}: {e}")
+            _server_running = False
+            return False
+        print(f"Metrics available at http://{addr}:{port}/metrics")
+        _server_running = True
+        return True
@@ -1,24 +1,40 @@
 import os
 import sys
 import time
-from typing import List, Dict, Optional
-from anthropic import Anthropic
+from typing import List, Dict, Optional, Iterator, AsyncIterator
+from anthropic import Anthropic, AsyncAnthropic
+import anthropic
 from dotenv import load_dotenv
 
-class CLS_Anthropic_Client:
+from app.modelList.base_client import BaseLLMClient, GenerationParams, GenerationResult
+from app.modelList.rate_limiter import get_rate_limiter
+
+class CLS_Anthropic_Client(BaseLLMClient):
+    provider = "anthropic"
+    display_name = "Anthropic"
+    max_tokens_limit = 4096  # Adjust based on your model's limits
+    validate_roles = False
+
     def __init__(self):
         load_dotenv()
         print(os.getenv("ANTHROPIC_API_KEY"))
         self.client = Anthropic(
             api_key=os.getenv("ANTHROPIC_API_KEY"),
         )
+        # Rate-limit headers from every response feed the shared per-provider limiter
+        self.async_client = AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            max_retries=0,  # retries are handled by app.modelList.resilience
+            http_client=anthropic.DefaultAsyncHttpxClient(event_hooks=get_rate_limiter(self.provider).http_event_hooks()),
+        )
 
     def generate_text_response(self, selected_model: str,                                 
                             chat_history: List[Dict],                                 
                             temperature: float = 0.7,                                 
                             max_tokens: int = 1000,                                 
                             top_p: float = 0.9,  
-                            timeout: int = 30) -> Optional[str]:
+                            timeout: int = 30,
+                            use_cache: bool = True) -> Optional[str]:
         """
         Generate text response with comprehensive error handling and validation.
         
@@ -29,88 +45,108 @@ class CLS_Anthropic_Client:
             max_tokens: Maximum tokens to generate
             top_p: Nucleus sampling parameter (0.0-1.0)
             timeout: Request timeout in seconds
+            use_cache: Serve and store the answer through the response cache (False bypasses it)
             
         Returns:
             Generated text or None if failed
         """
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens,
+                                  top_p=top_p, timeout=timeout)
+        return self.generate(selected_model, chat_history, params, use_cache=use_cache).text
+
+    def stream_text_response(self, selected_model: str,
+                             chat_history: List[Dict],
+                             temperature: float = 0.7,
+                             max_tokens: int = 1000,
+                             top_p: float = 0.9,
+                             timeout: int = 30,
+                             use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream text response chunks as they are generated.
+
+        Args:
+            Same as generate_text_response
+
+        Yields:
+            Text chunks in order; yields nothing if the request failed
+        """
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens,
+                                  top_p=top_p, timeout=timeout)
+        return self.stream(selected_model, chat_history, params, use_cache=use_cache)
+
+    def _request_kwargs(self, selected_model: str, chat_history: List[Dict], params: GenerationParams) -> Dict:
+        # The Messages API takes system prompts (including context summaries) as a separate parameter
+        system = "\n\n".join(msg["content"] for msg in chat_history if msg["role"] == "system")
+        kwargs = dict(
+            model=selected_model,
+            messages=[msg for msg in chat_history if msg["role"] != "system"],
+            max_tokens=params.max_tokens,
+            temperature=params.temperature,
+            timeout=params.timeout
+        )
+        if system:
+            kwargs["system"] = system
+        if params.top_p is not None:
+            kwargs["top_p"] = params.top_p
+        if params.stop:
+            kwargs["stop_sequences"] = params.stop
+        return kwargs
+
+    async def _agenerate(self, selected_model: str, chat_history: List[Dict],
+                         params: GenerationParams, result: GenerationResult) -> None:
+        response = await self.async_client.messages.create(
+            **self._request_kwargs(selected_model, chat_history, params)
+        )
+        result.text = response.content[0].text if response.content else None
+        result.finish_reason = response.stop_reason
+        if response.usage:
+            result.prompt_tokens = response.usage.input_tokens
+            result.completion_tokens = response.usage.output_tokens
+
+    async def _astream(self, selected_model: str, chat_history: List[Dict],
+                       params: GenerationParams, result: GenerationResult) -> AsyncIterator[str]:
+        async with self.async_client.messages.stream(
+            **self._request_kwargs(selected_model, chat_history, params)
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            final_message = await stream.get_final_message()
+            result.finish_reason = final_message.stop_reason
+            if final_message.usage:
+                result.prompt_tokens = final_message.usage.input_tokens
+                result.completion_tokens = final_message.usage.output_tokens
+
+    def _report_error(self, e: Exception, selected_model: str, elapsed_time: float, timeout: float):
+        error_msg = str(e).lower()
         
-        # Input validation
-        if not selected_model or not isinstance(selected_model, str):
-            print("Error: Invalid model name provided")
-            return None
-            
-        if not chat_history or not isinstance(chat_history, list):
-            print("Error: Invalid chat history provided")
-            return None
-            
-        # Parameter validation
-        if not (0.0 <= temperature <= 2.0):
-            print(f"Error: Temperature must be between 0.0 and 2.0, got {temperature}")
-            return None
+        # Specific error handling
+        if "invalid_api_key" in error_msg or "unauthorized" in error_msg:
+            print("Error: Invalid API key or unauthorized access")
             
-        if not (1 <= max_tokens <= 4096):  # Adjust based on your model's limits
-            print(f"Error: max_tokens must be between 1 and 4096, got {max_tokens}")
-            return None
+        elif "insufficient_quota" in error_msg or "quota" in error_msg:
+            print("Error: API quota exceeded or insufficient balance")
             
-        if not (0.0 <= top_p <= 1.0):
-            print(f"Error: top_p must be between 0.0 and 1.0, got {top_p}")
-            return None
+        elif "rate_limit" in error_msg:
+            print("Error: Rate limit exceeded. Please wait before making another request")
             
-        
-        start_time = time.time()
-        
-        try:
-            response = self.client.messages.create(
-                model=selected_model,
-                messages=chat_history,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                timeout=timeout
-            )
+        elif "timeout" in error_msg or elapsed_time > timeout:
+            print(f"Error: Request timed out after {elapsed_time:.2f} seconds")
             
-            elapsed_time = time.time() - start_time
+        elif "model_not_found" in error_msg or "invalid_model" in error_msg:
+            print(f"Error: Model '{selected_model}' not found or invalid")
             
-            # Log response time if it's slow
-            if elapsed_time > 10:
-                print(f"Warning: Response took {elapsed_time:.2f} seconds")
+        elif "context_length_exceeded" in error_msg or "too_many_tokens" in error_msg:
+            print(f"Error: Token limit exceeded. Try reducing max_tokens or chat history length")
             
-            return response.content[0].text if response.content else None
+        elif "invalid_request" in error_msg:
+            print("Error: Invalid request parameters")
             
-        except Exception as e:
-            elapsed_time = time.time() - start_time
-            error_msg = str(e).lower()
+        elif "server_error" in error_msg or "internal_error" in error_msg:
+            print("Error: Server error occurred. Please try again later")
             
-            # Specific error handling
-            if "invalid_api_key" in error_msg or "unauthorized" in error_msg:
-                print("Error: Invalid API key or unauthorized access")
-                
-            elif "insufficient_quota" in error_msg or "quota" in error_msg:
-                print("Error: API quota exceeded or insufficient balance")
-                
-            elif "rate_limit" in error_msg:
-                print("Error: Rate limit exceeded. Please wait before making another request")
-                
-            elif "timeout" in error_msg or elapsed_time > timeout:
-                print(f"Error: Request timed out after {elapsed_time:.2f} seconds")
-                
-            elif "model_not_found" in error_msg or "invalid_model" in error_msg:
-                print(f"Error: Model '{selected_model}' not found or invalid")
-                
-            elif "context_length_exceeded" in error_msg or "too_many_tokens" in error_msg:
-                print(f"Error: Token limit exceeded. Try reducing max_tokens or chat history length")
-                
-            elif "invalid_request" in error_msg:
-                print("Error: Invalid request parameters")
-                
-            elif "server_error" in error_msg or "internal_error" in error_msg:
-                print("Error: Server error occurred. Please try again later")
-                
-            elif "network" in error_msg or "connection" in error_msg:
-                print("Error: Network connection issue")
-                
-            else:
-                print(f"Error generating text response: {e}")
-                print(f"Request duration: {elapsed_time:.2f} seconds")
+        elif "network" in error_msg or "connection" in error_msg:
+            print("Error: Network connection issue")
             
-            return None
\ No newline at end of file
+        else:
+            print(f"Error generating text response: {e}")
+            print(f"Request duration: {elapsed_time:.2f} seconds")
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import concurrent.futures
+from typing import AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop that runs all async provider calls.
+
+    The loop lives on a daemon thread for the life of the process, so async SDK
+    clients (and their HTTP connection pools) stay bound to a single loop no
+    matter which Streamlit session or worker thread issues the request.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-async-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+    """Schedule a coroutine on the shared loop and return a thread-safe future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_sync(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the shared loop and block the calling thread for its result.
+
+    Args:
+        coro: Coroutine to run
+        timeout: Optional seconds to wait before raising TimeoutError
+
+    Returns:
+        The coroutine's result
+    """
+    loop = get_event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() cannot be called from the shared event loop thread; await the coroutine instead")
+    return submit(coro).result(timeout)
+
+
+def iterate_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Drive an async iterator on the shared loop and yield its items synchronously.
+
+    Closing the returned generator early also closes the async iterator, so
+    upstream streams are released when a consumer stops reading.
+    """
+    finished = False
+    try:
+        while True:
+            try:
+                item = run_sync(agen.__anext__())
+            except StopAsyncIteration:
+                finished = True
+                return
+            yield item
+    finally:
+        if not finished and hasattr(agen, "aclose"):
+            run_sync(agen.aclose())
@@ -0,0 +1,380 @@
+import asyncio
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from app.metrics import record_generation, record_retry
+from app.modelList.async_runner import iterate_sync, run_sync
+from app.modelList.context_manager import context_management_enabled, get_context_manager
+from app.modelList.resilience import CircuitOpenError, get_resilience
+from app.modelList.rate_limiter import RateLimitPermit, get_rate_limiter, rate_limiting_enabled
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    """
+    Sampling parameters shared by every provider. Providers ignore the ones
+    their API does not support (e.g. Anthropic has no penalties); top_p and
+    stop are only sent when set.
+    """
+    temperature: float = 0.7
+    max_tokens: int = 1000
+    top_p: Optional[float] = None
+    presence_penalty: float = 0.0
+    frequency_penalty: float = 0.0
+    stop: Optional[List[str]] = None
+    timeout: float = 30
+
+
+@dataclass
+class GenerationResult:
+    """
+    Outcome of one generation call. 'text' is None and 'error' is set when
+    the request failed.
+    """
+    provider: str
+    model: str
+    text: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    finish_reason: Optional[str] = None
+    latency: Optional[float] = None
+    time_to_first_token: Optional[float] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    metadata: Dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and bool(self.text)
+
+
+class BaseLLMClient:
+    """
+    Common async interface for every provider client.
+
+    Subclasses set 'provider', create 'async_client' with the SDK's async
+    client and implement _agenerate and _astream. agenerate and astream add
+    validation, context window fitting, caching, rate limiting, retries with
+    circuit breakers, timing and error reporting around them; the synchronous
+    generate_text_response / stream_text_response methods on each subclass
+    are thin wrappers that run these coroutines on the shared event loop.
+    """
+
+    provider = ""
+    display_name = ""
+    max_tokens_limit: Optional[int] = None
+    validate_roles = True
+
+    # --- hooks implemented by each provider ---
+
+    async def _agenerate(self, selected_model: str, chat_history: List[Dict],
+                         params: GenerationParams, result: GenerationResult) -> None:
+        """Send one request and fill in result.text, token counts and finish_reason."""
+        raise NotImplementedError
+
+    async def _astream(self, selected_model: str, chat_history: List[Dict],
+                       params: GenerationParams, result: GenerationResult) -> AsyncIterator[str]:
+        """Yield text deltas, filling in token counts and finish_reason on result when known."""
+        raise NotImplementedError
+        yield ""
+
+    def _report_error(self, e: Exception, selected_model: str, elapsed_time: float, timeout: float):
+        print(f"Unexpected error generating response: {e}")
+        print(f"Request duration: {elapsed_time:.2f} seconds")
+        print(f"Error type: {type(e).__name__}")
+
+    # --- shared logic ---
+
+    def _validate_request(self, selected_model: str, chat_history: List[Dict],
+                          params: GenerationParams) -> Optional[str]:
+        """
+        Validate model name, chat history format and sampling parameters.
+
+        Returns:
+            Error message, or None if the request can be sent
+        """
+        if not selected_model or not isinstance(selected_model, str):
+            return "Invalid model name provided"
+
+        if not chat_history or not isinstance(chat_history, list):
+            return "Invalid chat history provided"
+
+        for i, msg in enumerate(chat_history):
+            if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
+                return f"Invalid message format at index {i}. Expected dict with 'role' and 'content'"
+            if self.validate_roles and msg['role'] not in ['system', 'user', 'assistant']:
+                return f"Invalid role '{msg['role']}' at index {i}. Must be 'system', 'user', or 'assistant'"
+
+        if not (0.0 <= params.temperature <= 2.0):
+            return f"Temperature must be between 0.0 and 2.0, got {params.temperature}"
+
+        if self.max_tokens_limit and not (1 <= params.max_tokens <= self.max_tokens_limit):
+            return f"max_tokens must be between 1 and {self.max_tokens_limit}, got {params.max_tokens}"
+
+        if params.top_p is not None and not (0.0 <= params.top_p <= 1.0):
+            return f"top_p must be between 0.0 and 1.0, got {params.top_p}"
+
+        if not (-2.0 <= params.presence_penalty <= 2.0):
+            return f"presence_penalty must be between -2.0 and 2.0, got {params.presence_penalty}"
+
+        if not (-2.0 <= params.frequency_penalty <= 2.0):
+            return f"frequency_penalty must be between -2.0 and 2.0, got {params.frequency_penalty}"
+
+        if params.stop is not None and not isinstance(params.stop, list):
+            return "stop must be a list of strings or None"
+
+        return None
+
+    def _fit_context(self, selected_model: str, chat_history: List[Dict],
+                     params: GenerationParams, result: GenerationResult):
+        """
+        Trim the history and clamp max_tokens to the model's context window.
+
+        Returns:
+            (chat_history, params) to send
+        """
+        if not context_management_enabled():
+            return chat_history, params
+        fit = get_context_manager().fit(selected_model, chat_history, params.max_tokens)
+        if fit.changed:
+            print(f"Context: {fit.prompt_tokens} prompt tokens for {selected_model}, "
+                  f"dropped {fit.dropped_messages} messages, max_tokens {params.max_tokens} -> {fit.max_tokens}")
+            result.metadata["context"] = {
+                "prompt_tokens": fit.prompt_tokens,
+                "dropped_messages": fit.dropped_messages,
+                "summarized": fit.summarized,
+                "max_tokens": fit.max_tokens,
+            }
+        if not fit.fits:
+            print(f"Warning: Prompt may not fit the {fit.policy.context_window}-token context window of {selected_model}")
+        if fit.max_tokens_clamped:
+            params = replace(params, max_tokens=fit.max_tokens)
+        return fit.messages, params
+
+    def _rate_limit(self, chat_history: List[Dict], params: GenerationParams):
+        """Async context manager holding this provider's rate limit budget for one request."""
+        if not rate_limiting_enabled():
+            return nullcontext(RateLimitPermit(0))
+        estimated_tokens = get_context_manager().counter.count_messages(chat_history) + params.max_tokens
+        return get_rate_limiter(self.provider).request(estimated_tokens)
+
+    @staticmethod
+    def _record_usage(permit: RateLimitPermit, result: GenerationResult):
+        if result.prompt_tokens is not None:
+            permit.used_tokens = result.prompt_tokens + (result.completion_tokens or 0)
+
+    @staticmethod
+    def _attempt_params(params: GenerationParams, guard) -> GenerationParams:
+        """Give each attempt only what is left of the caller's timeout."""
+        return replace(params, timeout=max(1.0, guard.remaining()))
+
+    @staticmethod
+    def _complete(result: GenerationResult, on_complete: Optional[Callable[[GenerationResult], None]]):
+        record_generation(result)
+        if on_complete:
+            on_complete(result)
+
+    def _report_retry(self, e: Exception, selected_model: str, delay: float, guard):
+        record_retry(self.provider, selected_model)
+        print(f"Retrying {self.display_name} {selected_model} in {delay:.1f}s "
+              f"(attempt {guard.attempts + 1}) after {type(e).__name__}: {e}")
+
+    @staticmethod
+    def _response_cache():
+        # Imported lazily: the cache module depends on this one and on pymongo
+        from app.cache.response_cache import get_response_cache
+        cache = get_response_cache()
+        return cache if cache.enabled else None
+
+    def _cache_key(self, selected_model: str, params: GenerationParams, chat_history: List[Dict]) -> str:
+        from app.cache.response_cache import make_cache_key
+        return make_cache_key(self.provider, selected_model, params, chat_history)
+
+    def _new_result(self, selected_model: str) -> GenerationResult:
+        return GenerationResult(provider=self.provider, model=selected_model)
+
+    def _fail(self, result: GenerationResult, message: str, error_type: str = "ValidationError") -> GenerationResult:
+        print(f"Error: {message}")
+        result.error = message
+        result.error_type = error_type
+        return result
+
+    async def agenerate(self, selected_model: str, chat_history: List[Dict],
+                        params: Optional[GenerationParams] = None,
+                        use_cache: bool = True) -> GenerationResult:
+        """
+        Generate a complete response.
+
+        Args:
+            selected_model: Provider model name
+            chat_history: List of message dictionaries with 'role' and 'content'
+            params: Sampling parameters; defaults to GenerationParams()
+            use_cache: Serve and store the answer through the response cache
+
+        Returns:
+            GenerationResult; check result.ok before using result.text
+        """
+        result = await self._run_agenerate(selected_model, chat_history, params, use_cache)
+        record_generation(result)
+        return result
+
+    async def _run_agenerate(self, selected_model: str, chat_history: List[Dict],
+                             params: Optional[GenerationParams], use_cache: bool) -> GenerationResult:
+        params = params or GenerationParams()
+        result = self._new_result(selected_model)
+        error = self._validate_request(selected_model, chat_history, params)
+        if error:
+            return self._fail(result, error)
+        chat_history, params = self._fit_context(selected_model, chat_history, params, result)
+
+        cache = self._response_cache() if use_cache else None
+        if cache is not None:
+            cache_key = self._cache_key(selected_model, params, chat_history)
+            cached = await cache.aget(cache_key, self.provider, selected_model)
+            if cached is not None:
+                return cached
+
+        guard = get_resilience().guard(self.provider, selected_model, params.timeout)
+        while True:
+            start_time = time.perf_counter()
+            try:
+                guard.check()
+                async with self._rate_limit(chat_history, params) as permit:
+                    start_time = time.perf_counter()
+                    await self._agenerate(selected_model, chat_history, self._attempt_params(params, guard), result)
+                    self._record_usage(permit, result)
+            except CircuitOpenError as e:
+                return self._fail(result, str(e), "CircuitOpen")
+            except asyncio.CancelledError:
+                guard.abandon()
+                raise
+            except Exception as e:
+                elapsed_time = time.perf_counter() - start_time
+                delay = guard.failed(e)
+                if delay is not None:
+                    self._report_retry(e, selected_model, delay, guard)
+                    await asyncio.sleep(delay)
+                    continue
+                self._report_error(e, selected_model, elapsed_time, params.timeout)
+                result.latency = elapsed_time
+                result.error = str(e)
+                result.error_type = type(e).__name__
+                return result
+            guard.succeeded()
+            break
+        if guard.attempts > 1:
+            result.metadata["attempts"] = guard.attempts
+
+        result.latency = time.perf_counter() - start_time
+
+        if not result.text:
+            return self._fail(result, f"Empty response received from {self.display_name}", "EmptyResponse")
+
+        if cache is not None:
+            await cache.aset(cache_key, result)
+        return result
+
+    async def astream(self, selected_model: str, chat_history: List[Dict],
+                      params: Optional[GenerationParams] = None,
+                      on_complete: Optional[Callable[[GenerationResult], None]] = None,
+                      use_cache: bool = True) -> AsyncIterator[str]:
+        """
+        Stream a response as text deltas.
+
+        Args:
+            selected_model: Provider model name
+            chat_history: List of message dictionaries with 'role' and 'content'
+            params: Sampling parameters; defaults to GenerationParams()
+            on_complete: Called with the final GenerationResult (full text,
+                timings and token counts) once the stream ends or fails
+            use_cache: Serve a cached answer as a single chunk, and store the
+                finished stream in the response cache
+
+        Yields:
+            Text chunks in order; yields nothing if the request failed
+        """
+        params = params or GenerationParams()
+        result = self._new_result(selected_model)
+        error = self._validate_request(selected_model, chat_history, params)
+        if error:
+            self._fail(result, error)
+            self._complete(result, on_complete)
+            return
+        chat_history, params = self._fit_context(selected_model, chat_history, params, result)
+
+        cache = self._response_cache() if use_cache else None
+        if cache is not None:
+            cache_key = self._cache_key(selected_model, params, chat_history)
+            cached = await cache.aget(cache_key, self.provider, selected_model)
+            if cached is not None:
+                yield cached.text
+                self._complete(cached, on_complete)
+                return
+
+        parts = []
+        guard = get_resilience().guard(self.provider, selected_model, params.timeout)
+        start_time = time.perf_counter()
+        try:
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    guard.check()
+                    async with self._rate_limit(chat_history, params) as permit:
+                        start_time = time.perf_counter()
+                        async for chunk in self._astream(selected_model, chat_history,
+                                                         self._attempt_params(params, guard), result):
+                            if not chunk:
+                                continue
+                            if result.time_to_first_token is None:
+                                result.time_to_first_token = time.perf_counter() - start_time
+                            parts.append(chunk)
+                            yield chunk
+                        self._record_usage(permit, result)
+                except (CircuitOpenError, GeneratorExit, asyncio.CancelledError) as e:
+                    if not isinstance(e, CircuitOpenError):
+                        guard.abandon()
+                    raise
+                except Exception as e:
+                    # Text already shown to the caller cannot be taken back, so only retry before the first chunk
+                    delay = guard.failed(e) if not parts else None
+                    if delay is None:
+                        raise
+                    self._report_retry(e, selected_model, delay, guard)
+                    await asyncio.sleep(delay)
+                    continue
+                guard.succeeded()
+                break
+            if guard.attempts > 1:
+                result.metadata["attempts"] = guard.attempts
+        except CircuitOpenError as e:
+            self._fail(result, str(e), "CircuitOpen")
+        except Exception as e:
+            elapsed_time = time.perf_counter() - start_time
+            print(f"Error during streaming from {self.display_name}:")
+            self._report_error(e, selected_model, elapsed_time, params.timeout)
+            result.error = str(e)
+            result.error_type = type(e).__name__
+        finally:
+            result.latency = time.perf_counter() - start_time
+            result.text = "".join(parts) or None
+            self._complete(result, on_complete)
+
+        if cache is not None and result.ok:
+            await cache.aset(cache_key, result)
+
+    # --- synchronous wrappers ---
+
+    def generate(self, selected_model: str, chat_history: List[Dict],
+                 params: Optional[GenerationParams] = None,
+                 use_cache: bool = True) -> GenerationResult:
+        """Blocking version of agenerate, run on the shared event loop."""
+        return run_sync(self.agenerate(selected_model, chat_history, params, use_cache=use_cache))
+
+    def stream(self, selected_model: str, chat_history: List[Dict],
+               params: Optional[GenerationParams] = None,
+               on_complete: Optional[Callable[[GenerationResult], None]] = None,
+               use_cache: bool = True) -> Iterator[str]:
+        """Blocking iterator over astream, run on the shared event loop."""
+        return iterate_sync(self.astream(selected_model, chat_history, params, on_complete, use_cache=use_cache))
@@ -0,0 +1,126 @@
+import os
+import hashlib
+import importlib
+import threading
+from typing import Dict, Optional, Tuple
+from dotenv import find_dotenv, load_dotenv
+
+# provider name (as used in the model catalog) -> (API key variable, module, client class).
+# Provider modules import their SDK at module level, so they are only imported on
+# first use of that provider; a process serving one provider never loads the others.
+PROVIDER_CLIENTS = {
+    "openai": ("OPENAI_API_KEY", "app.modelList.openai_class", "CLS_OpenAI_Client"),
+    "anthropic": ("ANTHROPIC_API_KEY", "app.modelList.anthropic_class", "CLS_Anthropic_Client"),
+    "llama": ("GROQ_API_KEY", "app.modelList.llama_class", "CLS_Groq_Client"),
+    "google": ("GOOGLE_LLM_API_KEY", "app.modelList.gemini_class", "CLS_Gemini_Client"),
+    # Offline stand-in for tests and benchmarks; needs no key
+    "fake": (None, "app.modelList.fake_class", "CLS_Fake_Client"),
+}
+
+
+def load_client_class(provider: str):
+    """
+    Import a provider's client module on demand and return its client class.
+
+    Args:
+        provider: Provider name ('openai', 'anthropic', 'llama', 'google', 'fake')
+
+    Returns:
+        The BaseLLMClient subclass for the provider
+    """
+    provider = provider.lower()
+    if provider not in PROVIDER_CLIENTS:
+        raise ValueError(f"Unknown provider '{provider}'")
+    _, module_name, class_name = PROVIDER_CLIENTS[provider]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class ProviderClientRegistry:
+    """
+    Builds each provider client once per process and hands out the same
+    instance to every session, so the SDK's HTTP connection pool and the
+    one-off API key validation are reused across prompts.
+
+    A client is rebuilt only when its API key changes, either in the process
+    environment or in the .env file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Tuple[str, object]] = {}
+        self._dotenv_path = find_dotenv(usecwd=True)
+        self._dotenv_mtime: Optional[float] = None
+
+    def _refresh_dotenv(self):
+        """Reload .env only when the file has changed since the last load."""
+        if not self._dotenv_path:
+            return
+        try:
+            mtime = os.path.getmtime(self._dotenv_path)
+        except OSError:
+            return
+        if mtime != self._dotenv_mtime:
+            load_dotenv(self._dotenv_path, override=True)
+            self._dotenv_mtime = mtime
+
+    @staticmethod
+    def _fingerprint(api_key: Optional[str]) -> str:
+        return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+    def get_client(self, provider: str):
+        """
+        Return the cached client for a provider, building it on first use.
+
+        Args:
+            provider: Provider name ('openai', 'anthropic', 'llama', 'google', 'fake')
+
+        Returns:
+            Provider client instance
+        """
+        provider = provider.lower()
+        if provider not in PROVIDER_CLIENTS:
+            raise ValueError(f"Unknown provider '{provider}'")
+        key_name = PROVIDER_CLIENTS[provider][0]
+
+        self._refresh_dotenv()
+        fingerprint = self._fingerprint(os.getenv(key_name) if key_name else None)
+
+        cached = self._clients.get(provider)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        with self._lock:
+            cached = self._clients.get(provider)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            if cached is not None:
+                print(f"{key_name} changed, rebuilding {provider} client")
+            client = load_client_class(provider)()
+            self._clients[provider] = (fingerprint, client)
+            return client
+
+    def invalidate(self, provider: Optional[str] = None):
+        """Drop one cached client, or all of them, so the next lookup rebuilds it."""
+        with self._lock:
+            if provider is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(provider.lower(), None)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ProviderClientRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ProviderClientRegistry()
+    return _registry
+
+
+def get_provider_client(provider: str):
+    """Shortcut for get_client_registry().get_client(provider)."""
+    return get_client_registry().get_client(provider)
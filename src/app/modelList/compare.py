@@ -0,0 +1,56 @@
+import concurrent.futures
+from typing import Dict, Iterator, List, Tuple
+
+from app.modelList.async_runner import submit
+from app.modelList.base_client import BaseLLMClient, GenerationParams, GenerationResult
+from app.modelList.client_registry import get_provider_client
+
+
+async def _collect_stream(client: BaseLLMClient, selected_model: str,
+                          chat_history: List[Dict], params: GenerationParams,
+                          use_cache: bool) -> GenerationResult:
+    """Consume a stream to completion so time-to-first-token is measured on the wire."""
+    completed = []
+    async for _ in client.astream(selected_model, chat_history, params,
+                                  on_complete=completed.append, use_cache=use_cache):
+        pass
+    return completed[0]
+
+
+def compare_models(targets: List[Tuple[str, str]],
+                   chat_history: List[Dict],
+                   params: GenerationParams,
+                   use_cache: bool = True) -> Iterator[GenerationResult]:
+    """
+    Send the same chat history to several models at once.
+
+    All requests are scheduled on the shared event loop before any result is
+    awaited, so the total wait is roughly that of the slowest model.
+
+    Args:
+        targets: List of (provider, model) pairs
+        chat_history: List of message dictionaries with 'role' and 'content'
+        params: Sampling parameters applied to every model
+        use_cache: Serve and store answers through the response cache
+
+    Yields:
+        GenerationResult for each target in completion order, with
+        time_to_first_token and latency filled in
+    """
+    futures = {}
+    for provider, model in targets:
+        try:
+            # Client construction is blocking on first use, so keep it off the event loop
+            client = get_provider_client(provider)
+        except Exception as e:
+            print(f"Error: Could not create {provider} client: {e}")
+            yield GenerationResult(provider=provider, model=model, error=str(e), error_type=type(e).__name__)
+            continue
+        futures[submit(_collect_stream(client, model, chat_history, params, use_cache))] = (provider, model)
+
+    for future in concurrent.futures.as_completed(futures):
+        provider, model = futures[future]
+        try:
+            yield future.result()
+        except Exception as e:
+            yield GenerationResult(provider=provider, model=model, error=str(e), error_type=type(e).__name__)
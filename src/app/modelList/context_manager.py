@@ -0,0 +1,263 @@
+import fnmatch
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import yaml
+
+from configurations.settings import get_config_service
+
+CONTEXT_WINDOWS_FILE = "context_windows.yml"
+
+# Chat formats add a few tokens per message for role and separators, plus a few to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Stands in for a missing context_windows.yml
+_NO_CONFIG: Dict = {}
+
+
+class TokenCounter:
+    """
+    Counts tokens locally. Uses tiktoken's o200k_base encoding when it is
+    installed and its encoding file is available, and otherwise falls back to
+    a conservative estimate of one token per three characters. Exact counts
+    are cached per message text, so re-counting a long history on every turn
+    is a dictionary lookup per message.
+
+    On a cold cache tiktoken downloads the encoding file without a timeout
+    (point TIKTOKEN_CACHE_DIR at a directory holding it to avoid that), so it
+    is loaded on a background thread started with the counter. Requests are
+    never held up by it: counts are estimates until the encoding is ready.
+    """
+
+    def __init__(self, encoding_name: str = "o200k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = threading.Event()
+        self._count_exact = lru_cache(maxsize=16384)(self._encode_length)
+        threading.Thread(target=self._load_encoding, name="tiktoken-load", daemon=True).start()
+
+    def _load_encoding(self):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            print(f"Warning: tiktoken unavailable ({e}); using character-based token estimates")
+        self._loaded.set()
+
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Block until the encoding has been loaded (or failed to load); False on timeout."""
+        return self._loaded.wait(timeout)
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def _encode_length(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def count_text(self, text: str) -> int:
+        if self._encoding is not None:
+            return self._count_exact(text)
+        # Not cached, so exact counts replace the estimates as soon as the encoding is loaded
+        return math.ceil(len(text) / 3)
+
+    def count_message(self, message: Dict) -> int:
+        return MESSAGE_OVERHEAD_TOKENS + self.count_text(str(message.get("content", "")))
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        return REPLY_PRIMING_TOKENS + sum(self.count_message(msg) for msg in messages)
+
+
+@dataclass
+class ContextPolicy:
+    context_window: int = 8192
+    safety_margin: float = 0.05
+    min_output_tokens: int = 256
+    policy: str = "sliding_window"
+    keep_last_messages: int = 2
+    summary_max_tokens: int = 512
+
+    @property
+    def budget(self) -> int:
+        return int(self.context_window * (1 - self.safety_margin))
+
+
+@dataclass
+class ContextFit:
+    """Messages and max_tokens adjusted to fit the model's context window."""
+    messages: List[Dict]
+    max_tokens: int
+    prompt_tokens: int
+    dropped_messages: int = 0
+    summarized: bool = False
+    max_tokens_clamped: bool = False
+    fits: bool = True
+    policy: Optional[ContextPolicy] = field(default=None, repr=False)
+
+    @property
+    def changed(self) -> bool:
+        return self.dropped_messages > 0 or self.max_tokens_clamped
+
+
+class ContextWindowManager:
+    """
+    Keeps each request within the model's context window before it is sent.
+
+    The prompt size is estimated with TokenCounter. If prompt plus max_tokens
+    does not fit, max_tokens is clamped first (never below
+    min_output_tokens); if the prompt alone is still too large, the oldest
+    non-system turns are dropped, keeping the most recent keep_last_messages.
+    Under the 'summarize' policy the dropped turns are replaced by a system
+    message holding the first sentence of each, so earlier context is not lost
+    entirely. Limits and policy come from configurations/context_windows.yml,
+    read through the ConfigService, so edits apply without a restart.
+    """
+
+    def __init__(self, config_name: str = CONTEXT_WINDOWS_FILE, counter: Optional[TokenCounter] = None,
+                 config_service=None):
+        self.counter = counter or TokenCounter()
+        self.config_name = config_name
+        self.config_service = config_service or get_config_service()
+        self.defaults = ContextPolicy()
+        self.models: Dict[str, Dict] = {}
+        self._config = None
+        # Resolved policy per model name; rebuilt when the file changes
+        self._policies: Dict[str, ContextPolicy] = {}
+        self._refresh()
+
+    def _refresh(self):
+        """Pick up a changed context_windows.yml; cheap while the file is unchanged."""
+        try:
+            config = self.config_service.load(self.config_name)
+        except FileNotFoundError:
+            if self._config is None:
+                print(f"Warning: Context window config {self.config_name} not found; using defaults")
+            config = _NO_CONFIG
+        except yaml.YAMLError as e:
+            print(f"Warning: Invalid context window config {self.config_name}: {e}")
+            config = self._config if self._config is not None else _NO_CONFIG
+        if config is self._config:
+            return
+        self.defaults = ContextPolicy(**(config.get("defaults") or {}))
+        self.models = config.get("models") or {}
+        self._policies = {}
+        self._config = config
+
+    def policy_for(self, selected_model: str) -> ContextPolicy:
+        self._refresh()
+        policy = self._policies.get(selected_model)
+        if policy is None:
+            overrides = self.models.get(selected_model)
+            if overrides is None:
+                patterns = [p for p in self.models if fnmatch.fnmatchcase(selected_model, p)]
+                overrides = self.models[max(patterns, key=len)] if patterns else {}
+            policy = self._policies[selected_model] = ContextPolicy(**{**self.defaults.__dict__, **overrides})
+        return policy
+
+    def _summarize(self, messages: List[Dict], max_tokens: int) -> Dict:
+        lines = []
+        used = self.counter.count_text("Summary of earlier conversation:")
+        for msg in messages:
+            first_sentence = _SENTENCE_RE.split(str(msg.get("content", "")).strip(), maxsplit=1)[0][:300]
+            line = f"- {msg.get('role')}: {first_sentence}"
+            cost = self.counter.count_text(line) + 1
+            if used + cost > max_tokens:
+                break
+            lines.append(line)
+            used += cost
+        return {"role": "system", "content": "Summary of earlier conversation:\n" + "\n".join(lines)}
+
+    def fit(self, selected_model: str, chat_history: List[Dict], max_tokens: int) -> ContextFit:
+        """
+        Fit chat_history and max_tokens into the model's context window.
+
+        Args:
+            selected_model: Model name used to pick the policy
+            chat_history: Messages to send; never modified in place
+            max_tokens: Requested completion limit
+
+        Returns:
+            ContextFit with the messages and max_tokens to send
+        """
+        policy = self.policy_for(selected_model)
+        budget = policy.budget
+        prompt_tokens = self.counter.count_messages(chat_history)
+        fit = ContextFit(messages=chat_history, max_tokens=max_tokens, prompt_tokens=prompt_tokens, policy=policy)
+
+        if prompt_tokens + max_tokens <= budget:
+            return fit
+
+        output_floor = min(max_tokens, policy.min_output_tokens)
+        if prompt_tokens + output_floor > budget:
+            self._trim(fit, chat_history, budget - output_floor)
+
+        available = budget - fit.prompt_tokens
+        if available < max_tokens:
+            fit.max_tokens = max(1, available)
+            fit.max_tokens_clamped = True
+        fit.fits = fit.prompt_tokens + fit.max_tokens <= budget
+        return fit
+
+    def _trim(self, fit: ContextFit, chat_history: List[Dict], prompt_budget: int):
+        policy = fit.policy
+        leading_system = []
+        for msg in chat_history:
+            if msg.get("role") != "system":
+                break
+            leading_system.append(msg)
+        turns = chat_history[len(leading_system):]
+        protected = min(len(turns), max(1, policy.keep_last_messages))
+
+        costs = [self.counter.count_message(msg) for msg in turns]
+        total = fit.prompt_tokens
+        summary_reserve = policy.summary_max_tokens + MESSAGE_OVERHEAD_TOKENS if policy.policy == "summarize" else 0
+
+        # Drop from the oldest turn forward until the rest (plus room for a summary) fits
+        drop = 0
+        while drop < len(turns) - protected and total + summary_reserve > prompt_budget:
+            total -= costs[drop]
+            drop += 1
+        if drop == 0:
+            return
+        # Keep the chat starting with a user message; providers such as Anthropic reject an assistant first
+        while drop < len(turns) - 1 and turns[drop].get("role") != "user":
+            total -= costs[drop]
+            drop += 1
+
+        messages = list(leading_system)
+        if policy.policy == "summarize":
+            summary = self._summarize(turns[:drop], policy.summary_max_tokens)
+            messages.append(summary)
+            total += self.counter.count_message(summary)
+            fit.summarized = True
+        messages.extend(turns[drop:])
+
+        fit.messages = messages
+        fit.prompt_tokens = total
+        fit.dropped_messages = drop
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_context_manager() -> ContextWindowManager:
+    """Return the process-wide ContextWindowManager, creating it once."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ContextWindowManager()
+    return _manager
+
+
+def context_management_enabled() -> bool:
+    return os.getenv("CONTEXT_MANAGER_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List, Dict, Optional, Iterator, AsyncIterator
+
+from app.modelList.base_client import BaseLLMClient, GenerationParams, GenerationResult
+from app.modelList.fake_llm import ERROR, FAKE_MODELS, RATE_LIMITED, FakeLLMEngine, FakeReply
+from app.modelList.rate_limiter import get_rate_limiter
+
+
+class FakeLLMError(Exception):
+    """
+    Injected failure, shaped like an SDK APIStatusError: status_code drives
+    error classification and response.headers carries retry-after.
+    """
+
+    def __init__(self, message: str, status_code: int, headers: Optional[Dict] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class CLS_Fake_Client(BaseLLMClient):
+    """
+    Offline provider with configurable latency, token rate and fault injection
+    (see app.modelList.fake_llm). Needs no API key or network, and goes
+    through the same validation, caching, rate limiting, retries and metrics
+    as the real providers.
+    """
+
+    provider = "fake"
+    display_name = "Fake LLM"
+    max_tokens_limit = 128000
+
+    def __init__(self, engine: Optional[FakeLLMEngine] = None):
+        self.engine = engine or FakeLLMEngine()
+        self.async_client = None
+        config = self.engine.config
+        print(f"Fake LLM client initialized (ttft {config.ttft_ms:.0f} ms, {config.tokens_per_second:g} tokens/s, "
+              f"error rate {config.error_rate:g}, 429 rate {config.rate_limit_rate:g}, seed {config.seed})")
+
+    def generate_text_response(self,
+                               selected_model: str,
+                               chat_history: List[Dict],
+                               temperature: float = 0.7,
+                               max_tokens: int = 1000,
+                               presence_penalty: float = 0.0,
+                               frequency_penalty: float = 0.0,
+                               timeout: int = 30,
+                               use_cache: bool = True) -> Optional[str]:
+        """
+        Generate a fake response.
+
+        Args:
+            Same as CLS_OpenAI_Client.generate_text_response
+
+        Returns:
+            Generated text or None if failed
+        """
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens,
+                                  presence_penalty=presence_penalty,
+                                  frequency_penalty=frequency_penalty, timeout=timeout)
+        return self.generate(selected_model, chat_history, params, use_cache=use_cache).text
+
+    def stream_text_response(self,
+                             selected_model: str,
+                             chat_history: List[Dict],
+                             temperature: float = 0.7,
+                             max_tokens: int = 1000,
+                             presence_penalty: float = 0.0,
+                             frequency_penalty: float = 0.0,
+                             timeout: int = 30,
+                             use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream a fake response at the configured token rate.
+
+        Args:
+            Same as generate_text_response
+
+        Yields:
+            Text chunks in order; yields nothing if the request failed
+        """
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens,
+                                  presence_penalty=presence_penalty,
+                                  frequency_penalty=frequency_penalty, timeout=timeout)
+        return self.stream(selected_model, chat_history, params, use_cache=use_cache)
+
+    async def _start(self, selected_model: str, chat_history: List[Dict], params: GenerationParams) -> FakeReply:
+        """Plan the reply and raise the injected fault, if any, the way the real SDKs would."""
+        reply = self.engine.plan(selected_model, chat_history, params.max_tokens)
+        if reply.outcome == RATE_LIMITED:
+            headers = {"retry-after": f"{reply.retry_after:g}"}
+            # Real clients report response headers to the limiter through an httpx hook
+            get_rate_limiter(self.provider).observe_headers(headers, 429)
+            raise FakeLLMError("Rate limit exceeded (injected)", 429, headers)
+        if reply.outcome == ERROR:
+            await asyncio.sleep(reply.ttft)
+            raise FakeLLMError("Internal server error (injected)", 500)
+        return reply
+
+    @staticmethod
+    def _fill(result: GenerationResult, reply: FakeReply):
+        result.prompt_tokens = reply.prompt_tokens
+        result.completion_tokens = reply.completion_tokens
+        result.finish_reason = reply.finish_reason
+
+    async def _agenerate(self, selected_model: str, chat_history: List[Dict],
+                         params: GenerationParams, result: GenerationResult) -> None:
+        reply = await self._start(selected_model, chat_history, params)
+        if reply.duration > params.timeout:
+            await asyncio.sleep(params.timeout)
+            raise asyncio.TimeoutError(f"Request timed out after {params.timeout:.0f}s")
+        await asyncio.sleep(reply.duration)
+        result.text = reply.text
+        self._fill(result, reply)
+
+    async def _astream(self, selected_model: str, chat_history: List[Dict],
+                       params: GenerationParams, result: GenerationResult) -> AsyncIterator[str]:
+        reply = await self._start(selected_model, chat_history, params)
+        async for token in self.engine.astream(reply):
+            yield token
+        self._fill(result, reply)
+
+    def get_available_models(self) -> Optional[List[str]]:
+        return list(FAKE_MODELS)
+
+    def validate_model(self, model_name: str) -> bool:
+        return True
@@ -0,0 +1,163 @@
+"""
+Deterministic fake LLM used by the in-process fake provider and the local
+HTTP stand-in (app.fake_llm_server).
+
+Replies are generated from the prompt, so the same prompt always gets the
+same text. Faults are decided by the request's position in the process
+(the n-th request with a given seed always gets the same outcome), so a load
+test with a fixed seed produces the same sequence of errors and 429s.
+
+Configuration (environment):
+    FAKE_LLM_ENABLED (adds the fake models to the catalog; default off),
+    FAKE_LLM_TTFT_MS (default 200), FAKE_LLM_TOKENS_PER_S (default 50),
+    FAKE_LLM_OUTPUT_TOKENS (reply length before max_tokens, default 200),
+    FAKE_LLM_ERROR_RATE (default 0), FAKE_LLM_429_RATE (default 0),
+    FAKE_LLM_RETRY_AFTER_S (default 1), FAKE_LLM_SEED (default 0)
+"""
+import asyncio
+import hashlib
+import itertools
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List
+
+OK = "ok"
+ERROR = "error"
+RATE_LIMITED = "rate_limited"
+
+FAKE_MODELS = ["fake-model"]
+
+_WORDS = ("the model answers with plain words so token counts stay predictable while the stream "
+          "keeps a steady pace for latency and throughput measurements across every provider").split()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def fake_provider_enabled() -> bool:
+    return os.getenv("FAKE_LLM_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class FakeLLMConfig:
+    ttft_ms: float = 200.0
+    tokens_per_second: float = 50.0
+    output_tokens: int = 200
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_s: float = 1.0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMConfig":
+        return cls(
+            ttft_ms=_env_float("FAKE_LLM_TTFT_MS", 200.0),
+            tokens_per_second=_env_float("FAKE_LLM_TOKENS_PER_S", 50.0),
+            output_tokens=int(_env_float("FAKE_LLM_OUTPUT_TOKENS", 200)),
+            error_rate=_env_float("FAKE_LLM_ERROR_RATE", 0.0),
+            rate_limit_rate=_env_float("FAKE_LLM_429_RATE", 0.0),
+            retry_after_s=_env_float("FAKE_LLM_RETRY_AFTER_S", 1.0),
+            seed=int(_env_float("FAKE_LLM_SEED", 0)),
+        )
+
+
+@dataclass
+class FakeReply:
+    """What the fake model will do for one request."""
+    outcome: str
+    prompt_tokens: int
+    tokens: List[str] = field(default_factory=list)
+    finish_reason: str = "stop"
+    ttft: float = 0.0
+    interval: float = 0.0
+    retry_after: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.tokens)
+
+    @property
+    def completion_tokens(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def duration(self) -> float:
+        return self.ttft + self.interval * max(0, len(self.tokens) - 1)
+
+
+def _message_text(message: Dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        # OpenAI/Anthropic content parts
+        return " ".join(str(part.get("text", "")) if isinstance(part, dict) else str(part) for part in content)
+    return str(content or "")
+
+
+class FakeLLMEngine:
+    def __init__(self, config: FakeLLMConfig = None):
+        self.config = config or FakeLLMConfig.from_env()
+        self._requests = itertools.count()
+
+    def plan(self, selected_model: str, messages: List[Dict], max_tokens: int) -> FakeReply:
+        """
+        Decide the outcome, text and timing of the next request.
+
+        Args:
+            selected_model: Model name (part of the seed for the reply text)
+            messages: Chat history with 'role' and 'content'
+            max_tokens: Completion limit; longer replies finish with 'length'
+
+        Returns:
+            FakeReply
+        """
+        config = self.config
+        prompt = "\n".join(_message_text(m) for m in messages)
+        prompt_tokens = max(1, math.ceil(len(prompt) / 4)) + 3 * len(messages)
+
+        draw = random.Random(f"{config.seed}:{next(self._requests)}").random()
+        if draw < config.rate_limit_rate:
+            return FakeReply(RATE_LIMITED, prompt_tokens, retry_after=config.retry_after_s)
+        if draw < config.rate_limit_rate + config.error_rate:
+            return FakeReply(ERROR, prompt_tokens, ttft=config.ttft_ms / 1000)
+
+        digest = hashlib.sha256(f"{config.seed}:{selected_model}:{prompt}".encode("utf-8")).hexdigest()
+        rng = random.Random(digest)
+        count = max(1, min(config.output_tokens, max_tokens))
+        tokens = [rng.choice(_WORDS) + " " for _ in range(count)]
+        tokens[0] = tokens[0].capitalize()
+        tokens[-1] = tokens[-1].rstrip() + "."
+        return FakeReply(
+            OK, prompt_tokens, tokens,
+            finish_reason="length" if max_tokens < config.output_tokens else "stop",
+            ttft=config.ttft_ms / 1000,
+            interval=1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0,
+        )
+
+    @staticmethod
+    def _schedule(reply: FakeReply, start: float):
+        # Deadlines are absolute so sleep overshoot does not accumulate over long replies
+        for i, token in enumerate(reply.tokens):
+            yield start + reply.ttft + i * reply.interval, token
+
+    @classmethod
+    async def astream(cls, reply: FakeReply) -> AsyncIterator[str]:
+        for deadline, token in cls._schedule(reply, time.perf_counter()):
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield token
+
+    @classmethod
+    def stream(cls, reply: FakeReply) -> Iterator[str]:
+        for deadline, token in cls._schedule(reply, time.perf_counter()):
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield token
@@ -1,11 +1,17 @@
 import os
 import time
-from typing import List, Dict, Optional, Iterator
+from typing import List, Dict, Optional, Iterator, AsyncIterator
 from dotenv import load_dotenv
 from google import genai
-from google.genai import types
+from google.genai import types, errors
+
+from app.modelList.base_client import BaseLLMClient, GenerationParams, GenerationResult
+
+class CLS_Gemini_Client(BaseLLMClient):
+    provider = "google"
+    display_name = "Google Gemini"
+    validate_roles = False
 
-class CLS_Gemini_Client:
     def __init__(self):
         load_dotenv()
         
@@ -15,6 +21,8 @@ class CLS_Gemini_Client:
             raise ValueError("GOOGLE_LLM_API_KEY not found in environment variables")
             
         self.client = genai.Client(api_key=api_key)
+        # The same client exposes the async API under .aio
+        self.async_client = self.client.aio
         print("Google Gemini client initialized with API key")
 
         # Test connection on initialization
@@ -28,7 +36,8 @@ class CLS_Gemini_Client:
     def generate_text_response(self, selected_model: str,
                                 chat_history: List[Dict],
                                 temperature: float = 0.7,
-                                max_tokens: int = 1000,) -> Optional[str]:
+                                max_tokens: int = 1000,
+                                use_cache: bool = True) -> Optional[str]:
         """
         Generate text response using Google's Gemini API.
 
@@ -37,18 +46,87 @@ class CLS_Gemini_Client:
             chat_history: List of message dictionaries
             temperature: Sampling temperature (0.0-2.0)
             max_tokens: Maximum tokens to generate
+            use_cache: Serve and store the answer through the response cache (False bypasses it)
             
         Returns:
             Generated text or None if failed
         """
-        prompt = "\n".join([msg["content"] for msg in chat_history])
-        print(f"Generating response using model: {selected_model} with prompt: {prompt}")
-        response = self.client.models.generate_content(
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens)
+        return self.generate(selected_model, chat_history, params, use_cache=use_cache).text
+
+    def stream_text_response(self, selected_model: str,
+                             chat_history: List[Dict],
+                             temperature: float = 0.7,
+                             max_tokens: int = 1000,
+                             use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream text response chunks from Google's Gemini API as they are generated.
+
+        Args:
+            Same as generate_text_response
+
+        Yields:
+            Text chunks in order; yields nothing if the request failed
+        """
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens)
+        return self.stream(selected_model, chat_history, params, use_cache=use_cache)
+
+    def _build_prompt(self, chat_history: List[Dict]) -> str:
+        return "\n".join([msg["content"] for msg in chat_history])
+
+    def _generation_config(self, params: GenerationParams) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            temperature=params.temperature,         # Increase randomness for a more creative story
+            max_output_tokens=params.max_tokens,   # Limit the story's length to a reasonable size
+            top_p=params.top_p,
+            stop_sequences=params.stop,
+            http_options=types.HttpOptions(timeout=int(params.timeout * 1000)),
+        )
+
+    @staticmethod
+    def _read_usage(response, result: GenerationResult):
+        usage = response.usage_metadata
+        if usage:
+            result.prompt_tokens = usage.prompt_token_count
+            result.completion_tokens = usage.candidates_token_count
+        if response.candidates and response.candidates[0].finish_reason:
+            result.finish_reason = str(response.candidates[0].finish_reason)
+
+    async def _agenerate(self, selected_model: str, chat_history: List[Dict],
+                         params: GenerationParams, result: GenerationResult) -> None:
+        prompt = self._build_prompt(chat_history)
+        response = await self.async_client.models.generate_content(
                 model=selected_model, 
                 contents=[prompt],
-                config=types.GenerateContentConfig(
-                                temperature=temperature,         # Increase randomness for a more creative story
-                                max_output_tokens=max_tokens,   # Limit the story's length to a reasonable size
-                            ),
+                config=self._generation_config(params),
         )
-        return response.text
\ No newline at end of file
+        result.text = response.text
+        self._read_usage(response, result)
+
+    async def _astream(self, selected_model: str, chat_history: List[Dict],
+                       params: GenerationParams, result: GenerationResult) -> AsyncIterator[str]:
+        prompt = self._build_prompt(chat_history)
+        stream = await self.async_client.models.generate_content_stream(
+                model=selected_model,
+                contents=[prompt],
+                config=self._generation_config(params),
+        )
+        async for chunk in stream:
+            self._read_usage(chunk, result)
+            if chunk.text:
+                yield chunk.text
+
+    def _report_error(self, e: Exception, selected_model: str, elapsed_time: float, timeout: float):
+        if isinstance(e, errors.ClientError):
+            print(f"Error: Google Gemini rejected the request ({e.code}): {e.message}")
+            if e.code == 429:
+                print("Please wait before making another request or check your usage limits")
+            elif e.code == 404:
+                print(f"Hint: Model '{selected_model}' may not exist or be accessible")
+
+        elif isinstance(e, errors.ServerError):
+            print(f"Error: Google Gemini server error ({e.code}): {e.message}")
+            print("Please try again later")
+
+        else:
+            super()._report_error(e, selected_model, elapsed_time, timeout)
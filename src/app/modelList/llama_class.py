@@ -1,12 +1,19 @@
 import sys
 import os
 import time
-from typing import List, Dict, Optional, Iterator
+from typing import List, Dict, Optional, Iterator, AsyncIterator
 from dotenv import load_dotenv
-from groq import Groq
+from groq import Groq, AsyncGroq
 import groq
 
-class CLS_Groq_Client:
+from app.modelList.base_client import BaseLLMClient, GenerationParams, GenerationResult
+from app.modelList.rate_limiter import get_rate_limiter
+
+class CLS_Groq_Client(BaseLLMClient):
+    provider = "llama"
+    display_name = "Groq"
+    max_tokens_limit = 32768  # Groq's typical max context
+
     def __init__(self):
         load_dotenv()
         
@@ -16,6 +23,12 @@ class CLS_Groq_Client:
             raise ValueError("GROQ_API_KEY not found in environment variables")
             
         self.client = Groq(api_key=api_key)
+        # Rate-limit headers from every response feed the shared per-provider limiter
+        self.async_client = AsyncGroq(
+            api_key=api_key,
+            max_retries=0,  # retries are handled by app.modelList.resilience
+            http_client=groq.DefaultAsyncHttpxClient(event_hooks=get_rate_limiter(self.provider).http_event_hooks()),
+        )
         print("Groq client initialized with API key")
         
         # Test connection on initialization
@@ -36,7 +49,8 @@ class CLS_Groq_Client:
                              frequency_penalty: float = 0.0,
                              stream: bool = False,
                              stop: Optional[List[str]] = None,
-                             timeout: int = 30) -> Optional[str]:
+                             timeout: int = 30,
+                             use_cache: bool = True) -> Optional[str]:
         """
         Generate text response with comprehensive error handling and validation.
         
@@ -51,109 +65,104 @@ class CLS_Groq_Client:
             stream: Whether to stream the response
             stop: List of stop sequences
             timeout: Request timeout in seconds
+            use_cache: Serve and store the answer through the response cache (False bypasses it)
             
         Returns:
             Generated text or None if failed
         """
-        
-        # Input validation
-        if not selected_model or not isinstance(selected_model, str):
-            print("Error: Invalid model name provided")
-            return None
-            
-        if not chat_history or not isinstance(chat_history, list):
-            print("Error: Invalid chat history provided")
-            return None
-            
-        # Validate chat history format
-        for i, msg in enumerate(chat_history):
-            if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
-                print(f"Error: Invalid message format at index {i}. Expected dict with 'role' and 'content'")
-                return None
-            if msg['role'] not in ['system', 'user', 'assistant']:
-                print(f"Error: Invalid role '{msg['role']}' at index {i}. Must be 'system', 'user', or 'assistant'")
-                return None
-        
-        # Parameter validation
-        if not (0.0 <= temperature <= 2.0):
-            print(f"Error: Temperature must be between 0.0 and 2.0, got {temperature}")
-            return None
-            
-        if not (1 <= max_completion_tokens <= 32768):  # Groq's typical max context
-            print(f"Error: max_completion_tokens must be between 1 and 32768, got {max_completion_tokens}")
-            return None
-            
-        if not (0.0 <= top_p <= 1.0):
-            print(f"Error: top_p must be between 0.0 and 1.0, got {top_p}")
-            return None
-            
-        if not (-2.0 <= presence_penalty <= 2.0):
-            print(f"Error: presence_penalty must be between -2.0 and 2.0, got {presence_penalty}")
-            return None
-            
-        if not (-2.0 <= frequency_penalty <= 2.0):
-            print(f"Error: frequency_penalty must be between -2.0 and 2.0, got {frequency_penalty}")
-            return None
-        
-        if stop is not None and not isinstance(stop, list):
-            print("Error: stop must be a list of strings or None")
-            return None
-        
-        start_time = time.time()
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=selected_model,
-                messages=chat_history,
-                temperature=temperature,
-                max_tokens=max_completion_tokens,  # Groq uses max_tokens, not max_completion_tokens
-                top_p=top_p,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
-                stream=stream,
-                stop=stop,
-                timeout=timeout
-            )
-            print(response)
-            
-            elapsed_time = time.time() - start_time
-            
-            # Log response time if it's slow
-            if elapsed_time > 10:
-                print(f"Warning: Response took {elapsed_time:.2f} seconds")
-            
-            # Handle streaming vs non-streaming responses
-            if stream:
-                return self._handle_streaming_response(response)
-            else:
-                # Check if response has content
-                if not response.choices or not response.choices[0].message.content:
-                    print("Error: Empty response received from Groq")
-                    return None
-                    
-                return response.choices[0].message.content
-                
-        except groq.AuthenticationError as e:
+        params = GenerationParams(temperature=temperature, max_tokens=max_completion_tokens,
+                                  top_p=top_p, presence_penalty=presence_penalty,
+                                  frequency_penalty=frequency_penalty, stop=stop, timeout=timeout)
+        if stream:
+            full_response = "".join(self.stream(selected_model, chat_history, params, use_cache=use_cache))
+            return full_response if full_response else None
+        return self.generate(selected_model, chat_history, params, use_cache=use_cache).text
+
+    def stream_text_response(self,
+                             selected_model: str,
+                             chat_history: List[Dict],
+                             temperature: float = 0.7,
+                             max_completion_tokens: int = 1024,
+                             top_p: float = 0.9,
+                             presence_penalty: float = 0.0,
+                             frequency_penalty: float = 0.0,
+                             stop: Optional[List[str]] = None,
+                             timeout: int = 30,
+                             use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream text response chunks as they are generated.
+
+        Args:
+            Same as generate_text_response
+
+        Yields:
+            Text chunks in order; yields nothing if the request failed
+        """
+        params = GenerationParams(temperature=temperature, max_tokens=max_completion_tokens,
+                                  top_p=top_p, presence_penalty=presence_penalty,
+                                  frequency_penalty=frequency_penalty, stop=stop, timeout=timeout)
+        return self.stream(selected_model, chat_history, params, use_cache=use_cache)
+
+    def _request_kwargs(self, selected_model: str, chat_history: List[Dict], params: GenerationParams) -> Dict:
+        return dict(
+            model=selected_model,
+            messages=chat_history,
+            temperature=params.temperature,
+            max_tokens=params.max_tokens,  # Groq uses max_tokens, not max_completion_tokens
+            top_p=params.top_p if params.top_p is not None else 1.0,
+            presence_penalty=params.presence_penalty,
+            frequency_penalty=params.frequency_penalty,
+            stop=params.stop,
+            timeout=params.timeout
+        )
+
+    async def _agenerate(self, selected_model: str, chat_history: List[Dict],
+                         params: GenerationParams, result: GenerationResult) -> None:
+        response = await self.async_client.chat.completions.create(
+            **self._request_kwargs(selected_model, chat_history, params)
+        )
+        if response.choices:
+            result.text = response.choices[0].message.content
+            result.finish_reason = response.choices[0].finish_reason
+        if response.usage:
+            result.prompt_tokens = response.usage.prompt_tokens
+            result.completion_tokens = response.usage.completion_tokens
+
+    async def _astream(self, selected_model: str, chat_history: List[Dict],
+                       params: GenerationParams, result: GenerationResult) -> AsyncIterator[str]:
+        response = await self.async_client.chat.completions.create(
+            **self._request_kwargs(selected_model, chat_history, params),
+            stream=True
+        )
+        async for chunk in response:
+            # Groq reports usage on the final chunk under x_groq
+            usage = chunk.x_groq.usage if chunk.x_groq and chunk.x_groq.usage else chunk.usage
+            if usage:
+                result.prompt_tokens = usage.prompt_tokens
+                result.completion_tokens = usage.completion_tokens
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason:
+                result.finish_reason = chunk.choices[0].finish_reason
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _report_error(self, e: Exception, selected_model: str, elapsed_time: float, timeout: float):
+        if isinstance(e, groq.AuthenticationError):
             print(f"Error: Invalid API key or authentication failed: {e}")
-            return None
-            
-        except groq.RateLimitError as e:
+
+        elif isinstance(e, groq.RateLimitError):
             print(f"Error: Rate limit exceeded: {e}")
             print("Please wait before making another request or check your usage limits")
-            return None
-            
-        except groq.APIConnectionError as e:
-            elapsed_time = time.time() - start_time
+
+        elif isinstance(e, groq.APITimeoutError):
+            print(f"Error: Request timed out after {elapsed_time:.2f} seconds: {e}")
+
+        elif isinstance(e, groq.APIConnectionError):
             print(f"Error: Failed to connect to Groq API: {e}")
             print(f"Request duration: {elapsed_time:.2f} seconds")
-            return None
-            
-        except groq.APITimeoutError as e:
-            elapsed_time = time.time() - start_time
-            print(f"Error: Request timed out after {elapsed_time:.2f} seconds: {e}")
-            return None
-            
-        except groq.BadRequestError as e:
+
+        elif isinstance(e, groq.BadRequestError):
             print(f"Error: Invalid request parameters: {e}")
             # Check for specific bad request issues
             error_msg = str(e).lower()
@@ -163,53 +172,20 @@ class CLS_Groq_Client:
                 print("Hint: Try reducing max_tokens or chat history length")
             elif "context" in error_msg:
                 print("Hint: Chat history may be too long for the model's context window")
-            return None
-            
-        except groq.InternalServerError as e:
+
+        elif isinstance(e, groq.InternalServerError):
             print(f"Error: Groq server error: {e}")
             print("Please try again later")
-            return None
-            
-        except groq.PermissionDeniedError as e:
+
+        elif isinstance(e, groq.PermissionDeniedError):
             print(f"Error: Permission denied: {e}")
             print("Check if your API key has access to the requested model")
-            return None
-            
-        except groq.UnprocessableEntityError as e:
+
+        elif isinstance(e, groq.UnprocessableEntityError):
             print(f"Error: Unprocessable request: {e}")
-            return None
-            
-        except Exception as e:
-            elapsed_time = time.time() - start_time
-            print(f"Unexpected error generating response: {e}")
-            print(f"Request duration: {elapsed_time:.2f} seconds")
-            print(f"Error type: {type(e).__name__}")
-            return None
-    
-    def _handle_streaming_response(self, response: Iterator) -> Optional[str]:
-        """
-        Handle streaming response from Groq.
-        
-        Args:
-            response: Streaming response iterator
-            
-        Returns:
-            Complete response text or None if failed
-        """
-        try:
-            full_response = ""
-            for chunk in response:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    full_response += content
-                    print(content, end="", flush=True)
-            
-            print()  # New line after streaming
-            return full_response if full_response else None
-            
-        except Exception as e:
-            print(f"\nError during streaming: {e}")
-            return None
+
+        else:
+            super()._report_error(e, selected_model, elapsed_time, timeout)
     
     def generate_streaming_response(self, 
                                   selected_model: str,
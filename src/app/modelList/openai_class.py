@@ -1,12 +1,19 @@
 import sys
 import os
 import time
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, AsyncIterator
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import openai
 
-class CLS_OpenAI_Client:
+from app.modelList.base_client import BaseLLMClient, GenerationParams, GenerationResult
+from app.modelList.rate_limiter import get_rate_limiter
+
+class CLS_OpenAI_Client(BaseLLMClient):
+    provider = "openai"
+    display_name = "OpenAI"
+    max_tokens_limit = 128000  # GPT-4 Turbo max context
+
     def __init__(self):
         load_dotenv()
         
@@ -16,6 +23,12 @@ class CLS_OpenAI_Client:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
             
         self.client = OpenAI(api_key=api_key)
+        # Rate-limit headers from every response feed the shared per-provider limiter
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,  # retries are handled by app.modelList.resilience
+            http_client=openai.DefaultAsyncHttpxClient(event_hooks=get_rate_limiter(self.provider).http_event_hooks()),
+        )
         
         # Test connection on initialization
         try:
@@ -33,7 +46,8 @@ class CLS_OpenAI_Client:
                             #  top_p: float = 0.9,
                              presence_penalty: float = 0.0,
                              frequency_penalty: float = 0.0,
-                             timeout: int = 30) -> Optional[str]:
+                             timeout: int = 30,
+                             use_cache: bool = True) -> Optional[str]:
         """
         Generate text response with comprehensive error handling and validation.
         
@@ -45,97 +59,101 @@ class CLS_OpenAI_Client:
             presence_penalty: Presence penalty (-2.0 to 2.0)
             frequency_penalty: Frequency penalty (-2.0 to 2.0)
             timeout: Request timeout in seconds
+            use_cache: Serve and store the answer through the response cache (False bypasses it)
             
         Returns:
             Generated text or None if failed
         """
-        
-        # Input validation
-        if not selected_model or not isinstance(selected_model, str):
-            print("Error: Invalid model name provided")
-            return None
-            
-        if not chat_history or not isinstance(chat_history, list):
-            print("Error: Invalid chat history provided")
-            return None
-            
-        # Validate chat history format
-        for i, msg in enumerate(chat_history):
-            if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
-                print(f"Error: Invalid message format at index {i}. Expected dict with 'role' and 'content'")
-                return None
-            if msg['role'] not in ['system', 'user', 'assistant']:
-                print(f"Error: Invalid role '{msg['role']}' at index {i}. Must be 'system', 'user', or 'assistant'")
-                return None
-        
-        # Parameter validation
-        if not (0.0 <= temperature <= 2.0):
-            print(f"Error: Temperature must be between 0.0 and 2.0, got {temperature}")
-            return None
-            
-        if not (1 <= max_tokens <= 128000):  # GPT-4 Turbo max context
-            print(f"Error: max_tokens must be between 1 and 128000, got {max_tokens}")
-            return None
-            
-        # if not (0.0 <= top_p <= 1.0):
-        #     print(f"Error: top_p must be between 0.0 and 1.0, got {top_p}")
-        #     return None
-            
-        if not (-2.0 <= presence_penalty <= 2.0):
-            print(f"Error: presence_penalty must be between -2.0 and 2.0, got {presence_penalty}")
-            return None
-            
-        if not (-2.0 <= frequency_penalty <= 2.0):
-            print(f"Error: frequency_penalty must be between -2.0 and 2.0, got {frequency_penalty}")
-            return None
-        
-        start_time = time.time()
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=selected_model,
-                messages=chat_history,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
-                timeout=timeout
-            )
-            
-            elapsed_time = time.time() - start_time
-            
-            # Log response time if it's slow
-            if elapsed_time > 10:
-                print(f"Warning: Response took {elapsed_time:.2f} seconds")
-            
-            # Check if response has content
-            if not response.choices or not response.choices[0].message.content:
-                print("Error: Empty response received from OpenAI")
-                return None
-                
-            return response.choices[0].message.content
-            
-        except openai.AuthenticationError as e:
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens,
+                                  presence_penalty=presence_penalty,
+                                  frequency_penalty=frequency_penalty, timeout=timeout)
+        return self.generate(selected_model, chat_history, params, use_cache=use_cache).text
+
+    def stream_text_response(self,
+                             selected_model: str,
+                             chat_history: List[Dict],
+                             temperature: float = 0.7,
+                             max_tokens: int = 1000,
+                             presence_penalty: float = 0.0,
+                             frequency_penalty: float = 0.0,
+                             timeout: int = 30,
+                             use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream text response chunks as they are generated.
+
+        Args:
+            Same as generate_text_response
+
+        Yields:
+            Text chunks in order; yields nothing if the request failed
+        """
+        params = GenerationParams(temperature=temperature, max_tokens=max_tokens,
+                                  presence_penalty=presence_penalty,
+                                  frequency_penalty=frequency_penalty, timeout=timeout)
+        return self.stream(selected_model, chat_history, params, use_cache=use_cache)
+
+    def _request_kwargs(self, selected_model: str, chat_history: List[Dict], params: GenerationParams) -> Dict:
+        kwargs = dict(
+            model=selected_model,
+            messages=chat_history,
+            temperature=params.temperature,
+            max_tokens=params.max_tokens,
+            presence_penalty=params.presence_penalty,
+            frequency_penalty=params.frequency_penalty,
+            timeout=params.timeout
+        )
+        if params.top_p is not None:
+            kwargs["top_p"] = params.top_p
+        if params.stop:
+            kwargs["stop"] = params.stop
+        return kwargs
+
+    async def _agenerate(self, selected_model: str, chat_history: List[Dict],
+                         params: GenerationParams, result: GenerationResult) -> None:
+        response = await self.async_client.chat.completions.create(
+            **self._request_kwargs(selected_model, chat_history, params)
+        )
+        if response.choices:
+            result.text = response.choices[0].message.content
+            result.finish_reason = response.choices[0].finish_reason
+        if response.usage:
+            result.prompt_tokens = response.usage.prompt_tokens
+            result.completion_tokens = response.usage.completion_tokens
+
+    async def _astream(self, selected_model: str, chat_history: List[Dict],
+                       params: GenerationParams, result: GenerationResult) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            **self._request_kwargs(selected_model, chat_history, params),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                result.prompt_tokens = chunk.usage.prompt_tokens
+                result.completion_tokens = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason:
+                result.finish_reason = chunk.choices[0].finish_reason
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _report_error(self, e: Exception, selected_model: str, elapsed_time: float, timeout: float):
+        if isinstance(e, openai.AuthenticationError):
             print(f"Error: Invalid API key or authentication failed: {e}")
-            return None
-            
-        except openai.RateLimitError as e:
+
+        elif isinstance(e, openai.RateLimitError):
             print(f"Error: Rate limit exceeded: {e}")
             print("Please wait before making another request or check your usage limits")
-            return None
-            
-        except openai.APIConnectionError as e:
-            elapsed_time = time.time() - start_time
+
+        elif isinstance(e, openai.APITimeoutError):
+            print(f"Error: Request timed out after {elapsed_time:.2f} seconds: {e}")
+
+        elif isinstance(e, openai.APIConnectionError):
             print(f"Error: Failed to connect to OpenAI API: {e}")
             print(f"Request duration: {elapsed_time:.2f} seconds")
-            return None
-            
-        except openai.APITimeoutError as e:
-            elapsed_time = time.time() - start_time
-            print(f"Error: Request timed out after {elapsed_time:.2f} seconds: {e}")
-            return None
-            
-        except openai.BadRequestError as e:
+
+        elif isinstance(e, openai.BadRequestError):
             print(f"Error: Invalid request parameters: {e}")
             # Check for specific bad request issues
             error_msg = str(e).lower()
@@ -145,28 +163,20 @@ class CLS_OpenAI_Client:
                 print("Hint: Try reducing max_tokens or chat history length")
             elif "context" in error_msg:
                 print("Hint: Chat history may be too long for the model's context window")
-            return None
-            
-        except openai.InternalServerError as e:
+
+        elif isinstance(e, openai.InternalServerError):
             print(f"Error: OpenAI server error: {e}")
             print("Please try again later")
-            return None
-            
-        except openai.PermissionDeniedError as e:
+
+        elif isinstance(e, openai.PermissionDeniedError):
             print(f"Error: Permission denied: {e}")
             print("Check if your API key has access to the requested model")
-            return None
-            
-        except openai.UnprocessableEntityError as e:
+
+        elif isinstance(e, openai.UnprocessableEntityError):
             print(f"Error: Unprocessable request: {e}")
-            return None
-            
-        except Exception as e:
-            elapsed_time = time.time() - start_time
-            print(f"Unexpected error generating response: {e}")
-            print(f"Request duration: {elapsed_time:.2f} seconds")
-            print(f"Error type: {type(e).__name__}")
-            return None
+
+        else:
+            super()._report_error(e, selected_model, elapsed_time, timeout)
     
     def get_available_models(self) -> Optional[List[str]]:
         """
@@ -0,0 +1,349 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Mapping, Optional
+
+# provider -> (requests per minute, tokens per minute); override with RATE_LIMIT_<PROVIDER>_RPM / _TPM
+DEFAULT_LIMITS = {
+    "openai": (500, 30000),
+    "anthropic": (50, 40000),
+    "llama": (30, 6000),
+    "google": (15, 1000000),
+    # Local fake provider: effectively unlimited so load tests measure the app, not the limiter
+    "fake": (1000000, 1000000000),
+}
+
+# (remaining, reset) header pairs sent by OpenAI/Groq and by Anthropic
+REQUEST_HEADERS = (
+    ("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+    ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset"),
+)
+TOKEN_HEADERS = (
+    ("x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+    ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"),
+)
+
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds until a rate-limit window resets.
+
+    Accepts plain seconds ('12', '0.5'), Go-style durations as sent by OpenAI
+    and Groq ('1m30s', '250ms') and RFC 3339 timestamps as sent by Anthropic.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    if "T" in value:
+        try:
+            reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+        except ValueError:
+            return None
+    total, number = 0.0, ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+            i += 1
+            continue
+        unit = "ms" if value.startswith("ms", i) else ch
+        if unit not in _DURATION_UNITS or not number:
+            return None
+        total += float(number) * _DURATION_UNITS[unit]
+        number = ""
+        i += len(unit)
+    return total if not number else None
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    """True for HTTP 429 errors from any of the provider SDKs."""
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    return status == 429 or "rate_limit" in str(e).lower() or "resource_exhausted" in str(e).lower()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at capacity per minute.
+
+    reserve() debits immediately and returns how long the caller must wait
+    for the debt to be repaid, so waiters are served in arrival order without
+    holding a lock while they sleep.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A single request larger than the bucket would never fit; let it wait for a full bucket instead
+            self.tokens -= min(amount, self.capacity)
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def refund(self, amount: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync_remaining(self, remaining: float, reset_seconds: Optional[float]):
+        """Never assume more headroom than the server reports; pause until reset when it is exhausted."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset_seconds:
+                self.blocked_until = max(self.blocked_until, now + reset_seconds)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit adjusted AIMD-style: +1 slot per limit-many successful
+    requests, halved on a 429 (at most once per cooldown so a burst of
+    rejections from requests already in flight counts as one signal).
+
+    Waiters may come from any thread or event loop; each is woken through its
+    own loop.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 32, cooldown: float = 2.0):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was granted just as we were cancelled; give it back
+            if waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def _grant(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _wake(self):
+        # Caller holds the lock
+        while self._waiters and self.in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            self.in_flight += 1
+            loop.call_soon_threadsafe(self._grant, future)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_rate_limited(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+
+
+class RateLimitPermit:
+    """Handed to the caller while a request is in flight; set used_tokens once usage is known."""
+    __slots__ = ("reserved_tokens", "used_tokens")
+
+    def __init__(self, reserved_tokens: int):
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens: Optional[int] = None
+
+
+class ProviderRateLimiter:
+    """
+    Client-side limits for one provider: requests per minute, tokens per
+    minute and adaptive concurrency.
+
+    Each request reserves one request and its estimated tokens (prompt plus
+    max_tokens) up front; the difference is refunded once actual usage is
+    known, and all of it when the request fails or is cancelled. Rate-limit response headers tighten the buckets to what the server
+    reports, and retry-after on a 429 pauses new requests.
+
+    Configuration (environment, per provider name in upper case):
+        RATE_LIMIT_<PROVIDER>_RPM, RATE_LIMIT_<PROVIDER>_TPM,
+        RATE_LIMIT_<PROVIDER>_CONCURRENCY (initial, default 8),
+        RATE_LIMIT_<PROVIDER>_MAX_CONCURRENCY (default 32)
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        prefix = f"RATE_LIMIT_{provider.upper()}"
+        default_rpm, default_tpm = DEFAULT_LIMITS.get(provider, (60, 100000))
+        self.requests = TokenBucket(_env_int(f"{prefix}_RPM", default_rpm))
+        self.tokens = TokenBucket(_env_int(f"{prefix}_TPM", default_tpm))
+        self.concurrency = AdaptiveConcurrency(
+            initial=_env_int(f"{prefix}_CONCURRENCY", 8),
+            maximum=_env_int(f"{prefix}_MAX_CONCURRENCY", 32),
+        )
+        self.counters = {"requests": 0, "rate_limited": 0, "throttled": 0, "throttled_seconds": 0.0}
+
+    @asynccontextmanager
+    async def request(self, estimated_tokens: int):
+        """
+        Wait for a concurrency slot and rate budget, then hold them for the request.
+
+        Usage:
+            async with limiter.request(estimated_tokens) as permit:
+                ...send the request...
+                permit.used_tokens = prompt_tokens + completion_tokens
+        """
+        await self.concurrency.acquire()
+        permit = RateLimitPermit(estimated_tokens)
+        sent = completed = False
+        try:
+            wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+            self.counters["requests"] += 1
+            if wait > 0:
+                self.counters["throttled"] += 1
+                self.counters["throttled_seconds"] += wait
+                await asyncio.sleep(wait)
+            sent = True
+            yield permit
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.counters["rate_limited"] += 1
+                self.concurrency.on_rate_limited()
+                retry_after = self._retry_after(getattr(getattr(e, "response", None), "headers", None))
+                if retry_after:
+                    self.requests.pause(retry_after)
+            raise
+        else:
+            completed = True
+            self.concurrency.on_success()
+        finally:
+            # Also runs on cancellation (a BaseException), so nothing reserved is lost with the task
+            self.concurrency.release()
+            if not sent:
+                self.requests.refund(1)
+            if permit.used_tokens is not None:
+                self.tokens.refund(permit.reserved_tokens - permit.used_tokens)
+            elif not completed:
+                self.tokens.refund(permit.reserved_tokens)
+
+    @staticmethod
+    def _retry_after(headers: Optional[Mapping]) -> Optional[float]:
+        if not headers:
+            return None
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        return parse_reset(headers.get("retry-after"))
+
+    def observe_headers(self, headers: Mapping, status_code: int = 200):
+        """Tighten the local buckets to the server's view of the remaining budget."""
+        for bucket, pairs in ((self.requests, REQUEST_HEADERS), (self.tokens, TOKEN_HEADERS)):
+            for remaining_name, reset_name in pairs:
+                remaining = headers.get(remaining_name)
+                if remaining is None:
+                    continue
+                try:
+                    bucket.sync_remaining(float(remaining), parse_reset(headers.get(reset_name)))
+                except ValueError:
+                    pass
+                break
+        if status_code == 429:
+            self.concurrency.on_rate_limited()
+            retry_after = self._retry_after(headers)
+            if retry_after:
+                self.requests.pause(retry_after)
+
+    async def on_http_response(self, response):
+        """httpx response event hook, so every SDK call (including retries) reports its headers."""
+        self.observe_headers(response.headers, response.status_code)
+
+    def http_event_hooks(self) -> Dict:
+        return {"response": [self.on_http_response]}
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "rpm": int(self.requests.capacity),
+            "tpm": int(self.tokens.capacity),
+        }
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """Return the process-wide limiter for a provider, creating it once."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limiter = _limiters[provider] = ProviderRateLimiter(provider)
+    return limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    return {provider: limiter.stats() for provider, limiter in sorted(_limiters.items())}
+
+
+def rate_limiting_enabled() -> bool:
+    return os.getenv("RATE_LIMIT_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from app.modelList.rate_limiter import parse_reset
+
+# Error categories; the first four are transient and worth retrying
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+SERVER = "server"
+CLIENT = "client"
+UNKNOWN = "unknown"
+RETRYABLE = (RATE_LIMIT, TIMEOUT, CONNECTION, SERVER)
+
+# Categories that mean the whole provider is unreachable vs. one model misbehaving
+PROVIDER_FAILURES = (TIMEOUT, CONNECTION)
+MODEL_FAILURES = (TIMEOUT, CONNECTION, SERVER)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _status_code(e: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def classify_error(e: BaseException) -> str:
+    """
+    Sort an SDK exception into a category without importing the SDKs.
+
+    OpenAI, Anthropic and Groq errors carry status_code and Google GenAI
+    errors carry code; timeouts and connection failures are recognised by
+    class name (APITimeoutError, APIConnectionError, httpx.ConnectError, ...).
+    """
+    status = _status_code(e)
+    if status == 429:
+        return RATE_LIMIT
+    if status in (408, 504):
+        return TIMEOUT
+    if status is not None and (status >= 500 or status in (409, 425)):
+        return SERVER
+    if status is not None and 400 <= status < 500:
+        return CLIENT
+
+    names = [cls.__name__ for cls in type(e).__mro__]
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)) or any("Timeout" in n for n in names):
+        return TIMEOUT
+    if isinstance(e, ConnectionError) or any("Connection" in n or n in ("ConnectError", "RemoteProtocolError") for n in names):
+        return CONNECTION
+    if any(n in ("ServerError", "InternalServerError", "OverloadedError") for n in names):
+        return SERVER
+    return UNKNOWN
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    return parse_reset(headers.get("retry-after"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold transient failures in a row the breaker opens and
+    calls fail fast for recovery_seconds. It then lets a single trial call
+    through (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.counters = {"opened": 0, "rejected": 0}
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.recovery_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and self.retry_in() == 0:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"Circuit breaker {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                print(f"Circuit breaker {self.name} opened after {self.failures} consecutive failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.counters["opened"] += 1
+            self._trial_in_flight = False
+
+    def record_neutral(self):
+        """Release a half-open trial whose outcome says nothing about upstream health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures,
+                    "retry_in": round(self.retry_in(), 1) if self.state == OPEN else 0.0, **self.counters}
+
+
+class RetryGuard:
+    """
+    Drives the attempts of one request.
+
+    Usage:
+        guard = get_resilience().guard(provider, model, timeout)
+        while True:
+            guard.check()                  # raises CircuitOpenError
+            try:
+                ...call with timeout=guard.remaining()...
+            except Exception as e:
+                delay = guard.failed(e)    # None: give up and surface e
+                ...
+                await asyncio.sleep(delay)
+                continue
+            guard.succeeded()
+            break
+    """
+
+    def __init__(self, layer: "ResilienceLayer", provider: str, selected_model: str, timeout: float):
+        self.layer = layer
+        self.breakers = (layer.breaker(provider), layer.breaker(f"{provider}/{selected_model}"))
+        self.deadline = time.monotonic() + timeout
+        self.attempts = 0
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        provider_breaker, model_breaker = self.breakers
+        for breaker in self.breakers:
+            if not breaker.allow():
+                if breaker is model_breaker:
+                    provider_breaker.record_neutral()
+                raise CircuitOpenError(f"{breaker.name} is unavailable (circuit open); "
+                                       f"retrying in {breaker.retry_in():.0f}s")
+        self.attempts += 1
+
+    def succeeded(self):
+        for breaker in self.breakers:
+            breaker.record_success()
+
+    def abandon(self):
+        """The caller stopped waiting (stream closed early or task cancelled); health is unknown."""
+        for breaker in self.breakers:
+            breaker.record_neutral()
+
+    def failed(self, e: BaseException) -> Optional[float]:
+        """
+        Record a failed attempt.
+
+        Returns:
+            Seconds to wait before the next attempt, or None if the error is
+            fatal, attempts are exhausted or the timeout would be exceeded
+        """
+        category = classify_error(e)
+        provider_breaker, model_breaker = self.breakers
+        (provider_breaker.record_failure if category in PROVIDER_FAILURES else provider_breaker.record_neutral)()
+        (model_breaker.record_failure if category in MODEL_FAILURES else model_breaker.record_neutral)()
+
+        if category not in RETRYABLE or self.attempts >= self.layer.max_attempts:
+            return None
+        # Full jitter over a capped exponential backoff, but never sooner than the server asked
+        delay = random.uniform(0, min(self.layer.max_delay, self.layer.base_delay * 2 ** (self.attempts - 1)))
+        delay = max(delay, _retry_after(e) or 0.0)
+        if delay + self.layer.min_attempt_seconds > self.remaining():
+            return None
+        self.layer.counters["retries"] += 1
+        return delay
+
+
+class ResilienceLayer:
+    """
+    Retry policy and circuit breakers shared by every provider client.
+
+    Configuration (environment):
+        RETRY_MAX_ATTEMPTS (default 3), RETRY_BASE_DELAY_S (default 0.5), RETRY_MAX_DELAY_S (default 8),
+        CIRCUIT_BREAKER_FAILURES (default 5), CIRCUIT_BREAKER_RECOVERY_S (default 30)
+    """
+
+    def __init__(self):
+        self.max_attempts = max(1, _env_int("RETRY_MAX_ATTEMPTS", 3))
+        self.base_delay = _env_float("RETRY_BASE_DELAY_S", 0.5)
+        self.max_delay = _env_float("RETRY_MAX_DELAY_S", 8.0)
+        # Don't start an attempt that would have less than this left before the timeout
+        self.min_attempt_seconds = 1.0
+        self.failure_threshold = _env_int("CIRCUIT_BREAKER_FAILURES", 5)
+        self.recovery_seconds = _env_float("CIRCUIT_BREAKER_RECOVERY_S", 30.0)
+        self.counters = {"retries": 0}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    name, CircuitBreaker(name, self.failure_threshold, self.recovery_seconds))
+        return breaker
+
+    def guard(self, provider: str, selected_model: str, timeout: float) -> RetryGuard:
+        return RetryGuard(self, provider, selected_model, timeout)
+
+    def breaker_stats(self) -> Dict[str, Dict]:
+        return {name: breaker.stats() for name, breaker in sorted(self._breakers.items())}
+
+    def open_breakers(self) -> Dict[str, float]:
+        """Names of breakers currently failing fast, with seconds until the next trial."""
+        return {name: breaker.retry_in() for name, breaker in sorted(self._breakers.items())
+                if breaker.state == OPEN}
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_resilience() -> ResilienceLayer:
+    """Return the process-wide ResilienceLayer, creating it once."""
+    global _layer
+    if _layer is None:
+        with _layer_lock:
+            if _layer is None:
+                _layer = ResilienceLayer()
+    return _layer
@@ -1,30 +1,159 @@
+import copy
 import os
+import threading
+import time
 import yaml
 from pathlib import Path
 
+CONFIG_DIR = Path(__file__).parent
+DEFAULTS_FILE = "defaultconfiguration.yml"
+MODELS_FILE = "models.yml"
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class ConfigService:
+    """
+    Process-wide cache of the YAML files in configurations/.
+
+    Each file is parsed once and kept until its modification time or size
+    changes, so every Streamlit session sees edits without a restart and
+    without re-parsing YAML on each rerun. Files are stat'ed at most once
+    every CONFIG_RELOAD_CHECK_S seconds (default 2); save() and invalidate()
+    take effect immediately in this process.
+
+    Parsed documents are shared between sessions; use get() for a private copy
+    when the caller needs to modify the result.
+    """
+
+    def __init__(self, base_dir=CONFIG_DIR, check_interval=None):
+        self.base_dir = Path(base_dir)
+        self.check_interval = check_interval if check_interval is not None else _env_float("CONFIG_RELOAD_CHECK_S", 2.0)
+        # name -> (parsed document, (mtime_ns, size), next stat time)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.counters = {"parses": 0, "reloads": 0, "invalidations": 0}
+
+    def path(self, name):
+        return self.base_dir / name
+
+    def _signature(self, path):
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, name):
+        """
+        Parsed contents of a configuration file, served from cache while unchanged.
+
+        Args:
+            name: File name inside the configurations directory
+
+        Returns:
+            The parsed YAML document (shared; do not modify)
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+            yaml.YAMLError: If the file cannot be parsed and nothing is cached yet
+        """
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and now < entry[2]:
+            return entry[0]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and now < entry[2]:
+                return entry[0]
+            path = self.path(name)
+            signature = self._signature(path)
+            if entry is not None and entry[1] == signature:
+                self._entries[name] = (entry[0], signature, now + self.check_interval)
+                return entry[0]
+            try:
+                with open(path, "r") as f:
+                    data = yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                if entry is None:
+                    raise
+                # Keep serving the last good version while the file is being edited
+                print(f"Warning: Ignoring invalid YAML in {path}: {e}")
+                self._entries[name] = (entry[0], signature, now + self.check_interval)
+                return entry[0]
+            self.counters["parses"] += 1
+            if entry is not None:
+                self.counters["reloads"] += 1
+                print(f"Reloaded configuration {name}")
+            self._entries[name] = (data, signature, now + self.check_interval)
+            return data
+
+    def get(self, name):
+        """Private deep copy of a configuration file, safe to modify."""
+        return copy.deepcopy(self.load(name))
+
+    def invalidate(self, name=None):
+        """Drop one cached file (or all of them) so the next read re-parses it."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+            self.counters["invalidations"] += 1
+
+    def save(self, name, data):
+        """Write a configuration file atomically and make the new contents visible at once."""
+        path = self.path(name)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            yaml.safe_dump(data, f, sort_keys=False)
+        os.replace(tmp_path, path)
+        self.invalidate(name)
+
+    def stats(self):
+        return {**self.counters, "files": sorted(self._entries)}
+
+
+_config_service = None
+_config_service_lock = threading.Lock()
+
+
+def get_config_service():
+    """Return the process-wide ConfigService, creating it once."""
+    global _config_service
+    if _config_service is None:
+        with _config_service_lock:
+            if _config_service is None:
+                _config_service = ConfigService()
+    return _config_service
+
+
 class Settings:
-    def __init__(self):
-        # Get the directory where the script is located
-        base_dir = Path(__file__).parent
+    """Read-only view of the current configuration; always reflects the latest files."""
 
-        # Build the full path to your YAML file
-        file_path = base_dir / 'defaultconfiguration.yml'
-        with open(file_path, "r") as f:
-            self.model_config =  yaml.safe_load(f)
-        self.defaults = self.model_config.get("defaults")
+    def __init__(self, service=None):
+        self.service = service or get_config_service()
 
-    def _load_model_config(self):
-        if not self.model_config_path.exists():
-            raise FileNotFoundError(f"Model config file not found at {self.model_config_path}")
+    @property
+    def model_config(self):
+        return self.service.load(DEFAULTS_FILE)
 
-        with open(self.model_config_path, "r") as f:
-            return yaml.safe_load(f)
+    @property
+    def defaults(self):
+        return dict(self.model_config.get("defaults") or {})
 
     def get_models(self, provider: str) -> list:
-        return self.model_config.get(provider.lower(), [])
+        return list(self.service.load(MODELS_FILE).get(provider.lower()) or [])
 
     def get_all_providers(self) -> list:
-        return list(self.model_config.keys())
+        return list(self.service.load(MODELS_FILE).keys())
+
+    def save_defaults(self, defaults: dict):
+        config_data = self.service.get(DEFAULTS_FILE)
+        config_data["defaults"] = defaults
+        self.service.save(DEFAULTS_FILE, config_data)
 
 # Singleton-style instantiation
 settings = Settings()
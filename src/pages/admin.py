@@ -1,19 +1,26 @@
 # pages/1_Admin.py
 import streamlit as st
-import yaml
-from pathlib import Path
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from configurations.settings import settings
+from configurations.settings import get_config_service, settings
+from app.database.db_connection import get_connection_registry
+from app.database.blob_store import blob_store_stats
+from app.database.db_sqlite import sqlite_stats
+from app.database.history_writer import history_writer_stats
+from app.database.storage_backend import StorageError, storage_backend
+from app.database.model_catalog import get_model_catalog
+from app.database.user_configuration_manager import get_user_preference_store
+from app.cache.response_cache import get_response_cache
+from app.cache.similarity_cache import get_similarity_cache
+from app.modelList.rate_limiter import rate_limit_stats
+from app.modelList.resilience import get_resilience
 
 st.set_page_config(page_title="Admin Settings")
 st.title("🛠️ Admin Configuration")
 
-config_path = Path("configurations/models.yml")
-
 # Show existing default settings
 st.markdown("### Current Default Settings")
 st.json(settings.defaults)
@@ -29,21 +36,106 @@ new_frequency_penalty = st.slider("Frequency Penalty", -2.0, 2.0, settings.defau
 
 if st.button("💾 Save Configuration"):
     try:
-        with open(config_path, "r") as f:
-            config_data = yaml.safe_load(f)
-
-        # Update default settings
-        config_data["defaults"] = {
+        # Written to defaultconfiguration.yml; every session picks it up on its next rerun
+        settings.save_defaults({
             "temperature": float(new_temperature),
             "max_tokens": int(new_max_tokens),
             "top_p": float(new_top_p),
             "presence_penalty": float(new_presence_penalty),
             "frequency_penalty": float(new_frequency_penalty)
-        }
-
-        with open(config_path, "w") as f:
-            yaml.safe_dump(config_data, f)
-
-        st.success("Configuration updated! Reload app to reflect changes.")
+        })
+        st.success("Configuration updated for all sessions.")
     except Exception as e:
         st.error(f"Failed to update: {e}")
+
+# Files edited by hand are picked up automatically within a few seconds; this forces it
+if st.button("🔄 Reload configuration files"):
+    get_config_service().invalidate()
+    st.success("Configuration files will be re-read on next use.")
+st.json(get_config_service().stats())
+
+# Model catalog: edits bump the catalog version so every app process reloads it
+st.markdown("### 🤖 Model Catalog")
+model_catalog = get_model_catalog()
+# Set before the rerun that redraws the table with an edit, so the message survives it
+if "catalog_notice" in st.session_state:
+    st.success(st.session_state.pop("catalog_notice"))
+try:
+    catalog_entries = model_catalog.all_models()
+except Exception as e:
+    catalog_entries = None
+    st.error(f"Model catalog unavailable: {e}")
+
+if catalog_entries is not None:
+    st.dataframe(
+        [{"company": m["company"], "model": m["model"], "status": m.get("status", "Active")} for m in catalog_entries],
+        use_container_width=True,
+    )
+    if catalog_entries:
+        entry_labels = [f"{m['company']}: {m['model']}" for m in catalog_entries]
+        status_col, action_col = st.columns([3, 1])
+        with status_col:
+            selected_entry = st.selectbox("Model", entry_labels, key="catalog_entry")
+            new_status = st.radio("Status", ["Active", "Inactive"], horizontal=True, key="catalog_status")
+        with action_col:
+            if st.button("Update status"):
+                company, model = selected_entry.split(": ", 1)
+                try:
+                    model_catalog.set_status(company, model, new_status)
+                except StorageError as e:
+                    st.error(f"Failed to update {selected_entry}: {e}")
+                else:
+                    st.session_state.catalog_notice = f"{selected_entry} is now {new_status}"
+                    st.rerun()
+
+    with st.form("add_model_form", clear_on_submit=True):
+        new_company = st.text_input("Provider (openai, anthropic, llama, google)")
+        new_model = st.text_input("Model name")
+        new_detail = st.text_input("Description (optional)")
+        if st.form_submit_button("➕ Add model") and new_company and new_model:
+            try:
+                model_catalog.add_model(new_company.strip().lower(), new_model.strip(), new_detail or None)
+            except StorageError as e:
+                st.error(f"Failed to add {new_company}: {new_model}: {e}")
+            else:
+                st.session_state.catalog_notice = f"Added {new_company}: {new_model}"
+                st.rerun()
+st.json(model_catalog.stats())
+
+if storage_backend() == "sqlite":
+    # Embedded database file and per-thread connections
+    st.markdown("### 🗄️ SQLite Database")
+    st.json(sqlite_stats())
+else:
+    # Shared MongoDB connection pool usage for this process
+    st.markdown("### 🗄️ Database Connection Pool")
+    connection_registry = get_connection_registry()
+    st.json({"health": connection_registry.health_check(), "pool": connection_registry.pool_stats()})
+
+# Background history writer queue and spill file
+st.markdown("### 📝 History Writer")
+st.json(history_writer_stats())
+
+# Deduplicated prompt/response bodies (HISTORY_BLOBS)
+st.markdown("### 🧱 History Blob Store")
+st.json(blob_store_stats())
+
+# Per-user parameter cache for this process
+st.markdown("### 👤 User Preferences Cache")
+st.json(get_user_preference_store().stats())
+
+# Response cache counters for this process
+st.markdown("### ⚡ Response Cache")
+st.json(get_response_cache().stats())
+
+st.markdown("### ♻️ Similar Prompt Cache")
+st.json(get_similarity_cache().stats())
+
+# Client-side rate limits per provider (only providers used since start-up are listed)
+st.markdown("### 🚦 Provider Rate Limits")
+st.json(rate_limit_stats())
+
+# Circuit breakers per provider and per provider/model, plus the retry counter
+st.markdown("### 🔌 Circuit Breakers")
+resilience = get_resilience()
+st.json({"retries": resilience.counters["retries"], "breakers": resilience.breaker_stats()})
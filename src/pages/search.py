@@ -0,0 +1,86 @@
+# pages/search.py
+import streamlit as st
+import sys
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database.db_history_manager import create_history_manager
+from app.database.history_search import HIGHLIGHT_END, HIGHLIGHT_START
+from app.database.model_catalog import get_model_catalog
+
+PAGE_SIZE = 20
+
+# Characters Streamlit's markdown would otherwise interpret in saved prompts and answers
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|<>~$])")
+
+
+def render_snippet(snippet):
+    """Search snippet -> markdown with the matched words in bold."""
+    text = _MARKDOWN_SPECIAL.sub(r"\\\1", snippet)
+    return text.replace(HIGHLIGHT_START, "**").replace(HIGHLIGHT_END, "**")
+
+
+# Shares the pooled client with the chat page, but the manager is built once per process here too
+@st.cache_resource
+def get_history_manager():
+    manager = create_history_manager()
+    manager.ensure_indexes()
+    return manager
+
+
+st.set_page_config(page_title="Search History")
+st.title("🔎 Search History")
+
+user = st.session_state.get("user")
+if not user:
+    st.info("Please login on the main page to search your history.")
+    st.stop()
+
+models = sorted({model["model"] for model in get_model_catalog().get_models()})
+
+with st.form("history_search"):
+    query = st.text_input("Search your prompts and responses", placeholder='e.g. pandas merge "left join" optim*')
+    model_col, date_col = st.columns(2)
+    model = model_col.selectbox("Model", ["All models", *models])
+    dates = date_col.date_input("Saved between (UTC)", value=(), max_value=datetime.utcnow().date())
+    if st.form_submit_button("🔍 Search"):
+        st.session_state.search = {
+            "query": query,
+            "model": None if model == "All models" else model,
+            "since": datetime.combine(dates[0], datetime.min.time()) if dates else None,
+            # The end date is inclusive
+            "until": datetime.combine(dates[-1], datetime.min.time()) + timedelta(days=1) if dates else None,
+        }
+        st.session_state.search_page = 0
+
+search = st.session_state.get("search")
+if search and search["query"].strip():
+    page = st.session_state.get("search_page", 0)
+    start = time.perf_counter()
+    results, has_more = get_history_manager().search_history(user, limit=PAGE_SIZE, offset=page * PAGE_SIZE,
+                                                             **search)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if not results:
+        st.info("No matching prompts or responses." if page == 0 else "No more results.")
+    else:
+        first = page * PAGE_SIZE + 1
+        st.caption(f"Results {first}–{first + len(results) - 1} in {elapsed_ms:.0f} ms, most relevant first")
+    for result in results:
+        with st.container(border=True):
+            st.caption(f"{result['timestamp']:%Y-%m-%d %H:%M} UTC · {result['model']} · "
+                       f"[Open session](/?session={result['session_id']})")
+            st.markdown("**Prompt:** " + render_snippet(result["prompt"]))
+            st.markdown("**Response:** " + render_snippet(result["response"]))
+
+    prev_col, next_col = st.columns(2)
+    if page > 0 and prev_col.button("⬅️ Previous"):
+        st.session_state.search_page = page - 1
+        st.rerun()
+    if has_more and next_col.button("Next ➡️"):
+        st.session_state.search_page = page + 1
+        st.rerun()
@@ -0,0 +1,188 @@
+"""
+App-side overhead per rerun and per turn: building the model options,
+reading Settings and saving/reading history.
+
+History benchmarks use mongomock as a local Mongo stand-in, or a real
+server when BENCH_MONGO_URI is set (its 'llm_bench' database is dropped).
+"""
+import itertools
+import os
+import shutil
+import tempfile
+
+from harness import SkipBenchmark, benchmark
+
+CATALOG_SIZES = (10, 100, 1000)
+
+
+def _mongo_database():
+    uri = os.getenv("BENCH_MONGO_URI")
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+        client.drop_database("llm_bench")
+        return client["llm_bench"]
+    try:
+        import mongomock
+    except ImportError:
+        raise SkipBenchmark("needs mongomock or BENCH_MONGO_URI")
+    return mongomock.MongoClient()["llm_bench"]
+
+
+def _history_manager(db, async_writes, buckets=False):
+    from app.database.db_history_buckets import BucketedHistoryManager
+    from app.database.db_history_manager import HistoryManager
+    manager_class = BucketedHistoryManager if buckets else HistoryManager
+    manager = manager_class.__new__(manager_class)
+    manager.collection = db["history_buckets" if buckets else "history"]
+    manager.writer = None
+    if async_writes:
+        spill_dir = tempfile.mkdtemp(prefix="bench-history-")
+        manager.writer = manager.writer_class(manager.collection, spill_path=os.path.join(spill_dir, "spill.jsonl"))
+    manager.ensure_indexes()
+    return manager
+
+
+def session_docs(size):
+    """'size' history documents of one session, oldest first."""
+    from datetime import datetime, timedelta
+    from bson import ObjectId
+    start = datetime.utcnow()
+    return [{
+        "_id": ObjectId(), "user": "bench@example.com", "session_id": "bench-session", "model": "gpt-4o-mini",
+        "prompt": f"prompt {i}", "response": "response " * 40, "timestamp": start + timedelta(seconds=i),
+    } for i in range(size)]
+
+
+def _seed_session(manager, size):
+    from app.database.db_history_buckets import BucketedHistoryManager
+    from app.database.migrate_history import to_buckets
+    docs = session_docs(size)
+    if isinstance(manager, BucketedHistoryManager):
+        seed = manager.collection.database["history_seed"]
+        seed.insert_many(docs)
+        to_buckets(seed, manager.collection)
+    else:
+        manager.collection.insert_many(docs)
+
+
+# --- model options (main.py) ---
+
+@benchmark("app", sizes=CATALOG_SIZES)
+def model_options_cached(size):
+    """Building the select box options from the cached catalog, as every rerun does."""
+    from app.database.model_catalog import ModelCatalog
+    catalog = ModelCatalog.__new__(ModelCatalog)
+    ModelCatalog.__init__(catalog, manager=object(), ttl=3600)
+    catalog._models = [{"company": f"provider{i % 4}", "model": f"model-{i}"} for i in range(size)]
+    catalog._expires_at = float("inf")
+    catalog._watcher = True  # no background watcher
+    return lambda: [f"{model['company']}: {model['model']}" for model in catalog.get_models()]
+
+
+@benchmark("app", sizes=CATALOG_SIZES)
+def model_options_from_db(size):
+    """Catalog query with the server-side status filter and projection (cache miss)."""
+    from app.database.db_llm_model import LLM_MODEL_Manager
+    db = _mongo_database()
+    manager = LLM_MODEL_Manager.__new__(LLM_MODEL_Manager)
+    manager.collection, manager.meta_collection, manager.collection_name = db["model_list"], db["catalog_meta"], "model_list"
+    manager.collection.insert_many([{"company": f"provider{i % 4}", "model": f"model-{i}",
+                                     "status": "Active" if i % 5 else "Inactive"} for i in range(size)])
+    return lambda: [f"{model['company']}: {model['model']}" for model in manager.find_models()]
+
+
+# --- Settings ---
+
+@benchmark("app", sizes=(1,))
+def settings_defaults_cached(size):
+    from configurations.settings import Settings
+    settings = Settings()
+    settings.defaults
+    return lambda: settings.defaults
+
+
+@benchmark("app", sizes=(1,))
+def settings_parse_uncached(size):
+    """What every config panel render cost before the configuration service."""
+    from configurations.settings import CONFIG_DIR, ConfigService, DEFAULTS_FILE
+    config_dir = tempfile.mkdtemp(prefix="bench-config-")
+    shutil.copy(CONFIG_DIR / DEFAULTS_FILE, config_dir)
+    service = ConfigService(config_dir)
+
+    def parse():
+        service.invalidate(DEFAULTS_FILE)
+        return service.load(DEFAULTS_FILE)
+    return parse
+
+
+# --- HistoryManager ---
+
+def _save(manager):
+    counter = itertools.count()
+    return lambda: manager.save_history("bench@example.com", "bench-session", "gpt-4o-mini",
+                                        f"prompt {next(counter)}", "response " * 40,
+                                        parameters={"temperature": 0.7}, context_turns=0)
+
+
+@benchmark("history")
+def history_save_sync(size):
+    manager = _history_manager(_mongo_database(), async_writes=False)
+    _seed_session(manager, size)
+    return _save(manager)
+
+
+@benchmark("history")
+def history_save_sync_buckets(size):
+    """Synchronous save as a $push upsert into the session's open bucket."""
+    manager = _history_manager(_mongo_database(), async_writes=False, buckets=True)
+    _seed_session(manager, size)
+    return _save(manager)
+
+
+@benchmark("history")
+def history_save_queued(size):
+    """Request-path cost of a save through the background writer."""
+    manager = _history_manager(_mongo_database(), async_writes=True)
+    _seed_session(manager, size)
+    return _save(manager)
+
+
+@benchmark("history")
+def history_session_page(size):
+    """Sidebar read: newest 10 entries of a session holding 'size' entries."""
+    manager = _history_manager(_mongo_database(), async_writes=False)
+    _seed_session(manager, size)
+    return lambda: manager.get_session_history("bench-session", limit=10)
+
+
+@benchmark("history")
+def history_get_entry(size):
+    manager = _history_manager(_mongo_database(), async_writes=False)
+    _seed_session(manager, size)
+    entry_id = manager.collection.find_one({}, sort=[("timestamp", -1)])["_id"]
+    return lambda: manager.get_history_entry(entry_id)
+
+
+@benchmark("history")
+def history_session_resume(size):
+    """Rebuilding the chat for ?session= from a session holding 'size' entries."""
+    from app import chat_session
+    manager = _history_manager(_mongo_database(), async_writes=False)
+    _seed_session(manager, size)
+    return lambda: chat_session.resume_session(_State(), manager, "bench-session")
+
+
+@benchmark("history")
+def history_session_resume_buckets(size):
+    """The same resume from per-session bucket documents."""
+    from app import chat_session
+    manager = _history_manager(_mongo_database(), async_writes=False, buckets=True)
+    _seed_session(manager, size)
+    return lambda: chat_session.resume_session(_State(), manager, "bench-session")
+
+
+class _State(dict):
+    """Attribute access over a dict, like st.session_state."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
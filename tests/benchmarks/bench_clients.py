@@ -0,0 +1,57 @@
+"""
+Per-turn client overhead: everything done to a chat history before the
+upstream call. Clients are created without __init__, so no API keys or
+network are needed.
+"""
+from harness import benchmark, make_history
+
+from app.modelList.base_client import GenerationParams
+
+PARAMS = GenerationParams(max_tokens=1024)
+
+
+def _bare(client_cls):
+    return client_cls.__new__(client_cls)
+
+
+@benchmark("clients")
+def openai_validate_request(size):
+    from app.modelList.openai_class import CLS_OpenAI_Client
+    client, history = _bare(CLS_OpenAI_Client), make_history(size)
+    return lambda: client._validate_request("gpt-4o-mini", history, PARAMS)
+
+
+@benchmark("clients")
+def groq_validate_request(size):
+    from app.modelList.llama_class import CLS_Groq_Client
+    client, history = _bare(CLS_Groq_Client), make_history(size)
+    return lambda: client._validate_request("llama-3.1-8b-instant", history, PARAMS)
+
+
+@benchmark("clients")
+def openai_request_kwargs(size):
+    from app.modelList.openai_class import CLS_OpenAI_Client
+    client, history = _bare(CLS_OpenAI_Client), make_history(size)
+    return lambda: client._request_kwargs("gpt-4o-mini", history, PARAMS)
+
+
+@benchmark("clients")
+def gemini_build_prompt(size):
+    from app.modelList.gemini_class import CLS_Gemini_Client
+    client, history = _bare(CLS_Gemini_Client), make_history(size)
+    return lambda: client._build_prompt(history)
+
+
+@benchmark("clients")
+def context_window_fit(size):
+    from app.modelList.context_manager import ContextWindowManager
+    manager, history = ContextWindowManager(), make_history(size)
+    manager.counter.wait_until_loaded(timeout=30)
+    return lambda: manager.fit("gpt-4o-mini", history, PARAMS.max_tokens)
+
+
+@benchmark("clients")
+def response_cache_key(size):
+    from app.cache.response_cache import make_cache_key
+    history = make_history(size)
+    return lambda: make_cache_key("openai", "gpt-4o-mini", PARAMS, history)
@@ -0,0 +1,181 @@
+"""
+The same storage workload on the MongoDB and the SQLite backend.
+
+Each case is registered once per backend, as <workload>_mongodb and
+<workload>_sqlite. MongoDB is mongomock unless BENCH_MONGO_URI is set, so
+compare against a real server before drawing conclusions about round trips.
+SQLite uses a fresh file in a temporary directory.
+"""
+import itertools
+import os
+import random
+import tempfile
+
+from harness import HISTORY_SIZES, SkipBenchmark, benchmark
+
+from bench_app import CATALOG_SIZES, _history_manager, _mongo_database, session_docs
+
+BACKENDS = ("mongodb", "sqlite")
+
+
+def _sqlite_path():
+    return os.path.join(tempfile.mkdtemp(prefix="bench-sqlite-"), "bench.db")
+
+
+def storage_benchmark(sizes=HISTORY_SIZES):
+    """Register factory(backend, size) as one benchmark per backend."""
+    def register(factory):
+        for backend in BACKENDS:
+            def case(size, backend=backend):
+                return factory(backend, size)
+            case.__name__ = f"{factory.__name__}_{backend}"
+            case.__doc__ = factory.__doc__
+            benchmark("storage", sizes)(case)
+        return factory
+    return register
+
+
+def _seeded_history(backend, size):
+    docs = session_docs(size)
+    if backend == "sqlite":
+        from app.database.db_sqlite import SQLiteHistoryManager
+        manager = SQLiteHistoryManager(path=_sqlite_path(), async_writes=False)
+        manager.database.insert_history(docs)
+    else:
+        manager = _history_manager(_mongo_database(), async_writes=False)
+        if docs:
+            manager.collection.insert_many(docs)
+    return manager, docs
+
+
+# --- history ---
+
+@storage_benchmark()
+def history_save(backend, size):
+    """One synchronous save into a session holding 'size' entries."""
+    manager, _ = _seeded_history(backend, size)
+    counter = itertools.count()
+    return lambda: manager.save_history("bench@example.com", "bench-session", "gpt-4o-mini",
+                                        f"prompt {next(counter)}", "response " * 40,
+                                        parameters={"temperature": 0.7}, context_turns=0)
+
+
+@storage_benchmark(sizes=(1, 10, 100, 1000))
+def history_write_batch(backend, size):
+    """
+    One background-writer batch of 'size' new documents (insert_many vs. one
+    executemany transaction), including building the documents.
+    """
+    manager, _ = _seeded_history(backend, 0)
+    writer_class = manager.writer_class
+    writer = writer_class.__new__(writer_class)
+    writer.collection = manager.database if backend == "sqlite" else manager.collection
+    writer.blob_store = None
+
+    def write():
+        return writer._insert(session_docs(size))
+    return write
+
+
+@storage_benchmark()
+def history_session_page(backend, size):
+    """Newest 10 entries of a session holding 'size' entries."""
+    manager, _ = _seeded_history(backend, size)
+    return lambda: manager.get_session_history("bench-session", limit=10)
+
+
+@storage_benchmark()
+def history_session_resume(backend, size):
+    """Turns for rebuilding the chat (get_session_turns, 20 turns)."""
+    manager, _ = _seeded_history(backend, size)
+    return lambda: manager.get_session_turns("bench-session", limit=20)
+
+
+@storage_benchmark()
+def history_get_entry(backend, size):
+    manager, docs = _seeded_history(backend, max(size, 1))
+    entry_id = docs[-1]["_id"]
+    return lambda: manager.get_history_entry(entry_id)
+
+
+def _search_docs(size):
+    """'size' history documents of one user, with words drawn from a skewed 5000-word vocabulary."""
+    from datetime import datetime, timedelta
+    from bson import ObjectId
+    rng = random.Random(size)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    start = datetime.utcnow()
+    docs = []
+    for i in range(size):
+        words = rng.choices(vocabulary, weights, k=60)
+        docs.append({"_id": ObjectId(), "user": "bench@example.com", "session_id": f"session-{i // 20}",
+                     "model": ("gpt-4o-mini", "claude-3-haiku")[i % 2], "prompt": " ".join(words[:10]),
+                     "response": " ".join(words[10:]), "timestamp": start + timedelta(seconds=i)})
+    return docs
+
+
+@storage_benchmark(sizes=(1000, 10000, 100000))
+def history_search(backend, size):
+    """First page of a two-word full-text search over 'size' entries of one user."""
+    docs = _search_docs(size)
+    if backend == "sqlite":
+        from app.database.db_sqlite import SQLiteHistoryManager
+        manager = SQLiteHistoryManager(path=_sqlite_path(), async_writes=False)
+        manager.database.insert_history(docs)
+    else:
+        if not os.getenv("BENCH_MONGO_URI"):
+            raise SkipBenchmark("mongomock has no $text; needs BENCH_MONGO_URI")
+        manager = _history_manager(_mongo_database(), async_writes=False)
+        manager.ensure_indexes()
+        manager.collection.insert_many(docs)
+    return lambda: manager.search_history("bench@example.com", "term20 term300", limit=20)
+
+
+# --- model catalog ---
+
+@storage_benchmark(sizes=CATALOG_SIZES)
+def catalog_find_models(backend, size):
+    """Active catalog entries, filtered and sorted by the database (a catalog cache miss)."""
+    rows = [(f"provider{i % 4}", f"model-{i}", "Active" if i % 5 else "Inactive") for i in range(size)]
+    if backend == "sqlite":
+        from app.database.db_sqlite import SQLiteModelManager
+        manager = SQLiteModelManager(path=_sqlite_path())
+        with manager.database.transaction() as conn:
+            conn.execute("DELETE FROM model_list")
+            conn.executemany("INSERT INTO model_list (company, model, status) VALUES (?, ?, ?)", rows)
+    else:
+        from app.database.db_llm_model import LLM_MODEL_Manager
+        db = _mongo_database()
+        manager = LLM_MODEL_Manager.__new__(LLM_MODEL_Manager)
+        manager.collection, manager.meta_collection, manager.collection_name = db["model_list"], db["catalog_meta"], "model_list"
+        manager.collection.insert_many([{"company": company, "model": model, "status": status}
+                                        for company, model, status in rows])
+    return manager.find_models
+
+
+# --- user preferences ---
+
+def _preference_store(backend):
+    if backend == "sqlite":
+        from app.database.db_sqlite import SQLitePreferenceStore, SQLiteDatabase
+        return SQLitePreferenceStore(SQLiteDatabase(_sqlite_path()))
+    from app.database.user_configuration_manager import UserPreferenceStore
+    db = _mongo_database()
+    return UserPreferenceStore(collection=db["user_configuration"], legacy_collection=None)
+
+
+@storage_benchmark(sizes=(100, 10000))
+def user_prefs_fetch(backend, size):
+    """Uncached preference read among 'size' users."""
+    store = _preference_store(backend)
+    for i in range(size):
+        store._write(f"user{i}@example.com", {"temperature": 0.5, "max_tokens": 512})
+    return lambda: store._fetch(f"user{size // 2}@example.com")
+
+
+@storage_benchmark(sizes=(1,))
+def user_prefs_save(backend, size):
+    store = _preference_store(backend)
+    counter = itertools.count()
+    return lambda: store.save(f"user{next(counter) % 100}@example.com", {"temperature": 0.5, "max_tokens": 512})
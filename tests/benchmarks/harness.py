@@ -0,0 +1,63 @@
+"""
+Minimal benchmark registry and timer used by run_benchmarks.py.
+
+A benchmark is a function taking the input size and returning a zero-argument
+callable; everything before the return is setup and is not timed.
+"""
+import os
+import statistics
+import sys
+import timeit
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+HISTORY_SIZES = (1, 10, 100, 1000, 10000)
+
+# (group, name, factory, sizes)
+BENCHMARKS = []
+
+
+def benchmark(group, sizes=HISTORY_SIZES):
+    """Register a benchmark factory for every size in 'sizes'."""
+    def register(factory):
+        BENCHMARKS.append((group, factory.__name__, factory, tuple(sizes)))
+        return factory
+    return register
+
+
+class SkipBenchmark(Exception):
+    """Raised by a factory when its prerequisites (e.g. a Mongo stand-in) are missing."""
+
+
+def make_history(size, content_chars=200):
+    """Alternating user/assistant turns ending with a user prompt, like the chat sends."""
+    filler = ("lorem ipsum dolor sit amet " * (content_chars // 27 + 1))[:content_chars]
+    history = [{"role": "assistant" if i % 2 else "user", "content": f"{i}: {filler}"} for i in range(size)]
+    history[-1]["role"] = "user"
+    return history
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """
+    Time fn() and return per-call statistics in microseconds.
+
+    The loop count is chosen so each repeat runs for at least min_time seconds.
+    """
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    samples = [elapsed / number] + [timer.timeit(number) / number for _ in range(repeat - 1)]
+    samples_us = [s * 1e6 for s in samples]
+    return {
+        "median_us": statistics.median(samples_us),
+        "min_us": min(samples_us),
+        "stdev_us": statistics.stdev(samples_us) if len(samples_us) > 1 else 0.0,
+        "loops": number,
+        "repeat": repeat,
+    }
@@ -0,0 +1,134 @@
+"""
+Run the micro-benchmarks and compare them with the previous run.
+
+Example (from the repository root):
+    python tests/benchmarks/run_benchmarks.py
+    python tests/benchmarks/run_benchmarks.py --group clients --sizes 1 100 10000
+    python tests/benchmarks/run_benchmarks.py --baseline tests/benchmarks/results/20250101-120000.json --fail-on-regression
+
+Each run is saved as tests/benchmarks/results/<timestamp>.json. By default it
+is compared with the newest earlier result file, and any case that is more
+than --threshold times slower is reported as a regression.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from harness import BENCHMARKS, SkipBenchmark, measure  # noqa: E402
+import bench_app  # noqa: E402,F401  (registers benchmarks)
+import bench_clients  # noqa: E402,F401
+import bench_storage  # noqa: E402,F401
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(groups=None, names=None, sizes=None, repeat=5, min_time=0.2):
+    results, skipped = {}, {}
+    for group, name, factory, bench_sizes in BENCHMARKS:
+        if (groups and group not in groups) or (names and name not in names):
+            continue
+        for size in bench_sizes:
+            if sizes and size not in sizes:
+                continue
+            key = f"{group}.{name}[{size}]"
+            try:
+                fn = factory(size)
+            except SkipBenchmark as e:
+                skipped[key] = str(e)
+                continue
+            results[key] = measure(fn, repeat=repeat, min_time=min_time)
+            print(f"{key:<48} {results[key]['median_us']:>12.2f} us")
+    return results, skipped
+
+
+def previous_result_file(exclude=None):
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    files = [f for f in files if f != exclude]
+    return files[-1] if files else None
+
+
+def compare(current, baseline, threshold):
+    """
+    Returns:
+        (report lines, number of regressions)
+    """
+    lines, regressions = [], 0
+    for key, stats in current.items():
+        before = baseline.get(key)
+        if not before:
+            continue
+        ratio = stats["median_us"] / before["median_us"] if before["median_us"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag, regressions = "  REGRESSION", regressions + 1
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        lines.append(f"{key:<48} {before['median_us']:>12.2f} -> {stats['median_us']:>12.2f} us  x{ratio:.2f}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run request hot-path micro-benchmarks.")
+    parser.add_argument("--group", action="append", help="Only run this group (clients, app, history, storage)")
+    parser.add_argument("--name", action="append", help="Only run this benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Only these history sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repeats per case")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--baseline", help="Result file to compare with (default: previous run)")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a result file")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results, skipped = run(args.group, args.name, args.sizes, args.repeat, args.min_time)
+    for key, reason in skipped.items():
+        print(f"{key:<48} skipped: {reason}")
+    print(f"{len(results)} cases in {time.perf_counter() - started:.1f}s")
+
+    baseline_path = args.baseline or previous_result_file()
+    output_path = None
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                         "python": platform.python_version(), "platform": platform.platform(),
+                         "mongo": "server" if os.getenv("BENCH_MONGO_URI") else "mongomock"},
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved {output_path}")
+
+    if not baseline_path or baseline_path == output_path:
+        return
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    lines, regressions = compare(results, baseline.get("results", {}), args.threshold)
+    print(f"Compared with {os.path.basename(baseline_path)} (commit {baseline.get('meta', {}).get('commit')}):")
+    print("\n".join(lines) or "no cases in common")
+    if regressions:
+        print(f"{regressions} regression(s) above x{args.threshold}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
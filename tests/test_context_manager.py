@@ -0,0 +1,112 @@
+"""
+Context window fitting with a stub config service and the character-based token estimate.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import os
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import pytest
+
+from app.modelList import context_manager
+from app.modelList.context_manager import ContextWindowManager, TokenCounter
+
+
+class _Config:
+    def __init__(self, config):
+        self.config = config
+
+    def load(self, name):
+        if self.config is None:
+            raise FileNotFoundError(name)
+        return self.config
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    # Estimates only: one token per three characters
+    monkeypatch.setattr(TokenCounter, "_load_encoding", lambda self: self._loaded.set())
+    return TokenCounter()
+
+
+def _manager(counter, **model):
+    config = {"defaults": {"context_window": 100, "safety_margin": 0, "min_output_tokens": 10,
+                           "keep_last_messages": 1},
+              "models": {"test-*": model}}
+    return ContextWindowManager(counter=counter, config_service=_Config(config))
+
+
+def _history(turns):
+    history = [{"role": "system", "content": "Be brief."}]
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i} " + "q" * 30})
+        history.append({"role": "assistant", "content": f"answer {i} " + "a" * 30})
+    history.append({"role": "user", "content": "last question"})
+    return history
+
+
+@pytest.mark.parametrize("context_window", range(60, 180, 4))
+def test_trimmed_history_starts_with_a_user_message(counter, context_window):
+    history = _history(4)
+    fit = _manager(counter, context_window=context_window).fit("test-model", history, 10)
+
+    if not fit.dropped_messages:
+        assert fit.messages == history
+        return
+    assert fit.messages[0]["role"] == "system"
+    assert fit.messages[1]["role"] == "user"
+    assert fit.messages[-1] == history[-1]
+    assert fit.prompt_tokens == counter.count_messages(fit.messages)
+
+
+def test_odd_cut_drops_the_orphaned_answer(counter):
+    history = _history(4)
+    manager = _manager(counter)
+    costs = [counter.count_message(m) for m in history]
+    # Room for everything but the first question: a plain cut would start at its answer
+    budget = sum(costs) - costs[1] + context_manager.REPLY_PRIMING_TOKENS
+    fit = manager.fit("test-model", history, manager.policy_for("test-model").context_window - budget)
+
+    assert fit.dropped_messages == 2
+    assert fit.messages == [history[0]] + history[3:]
+
+
+def test_policies_are_cached_per_instance_and_follow_config_changes(counter):
+    service = _Config({"models": {"test-*": {"context_window": 1000}}})
+    first = ContextWindowManager(counter=counter, config_service=service)
+    second = ContextWindowManager(counter=counter, config_service=_Config({}))
+
+    assert first.policy_for("test-a") is first.policy_for("test-a")
+    assert first.policy_for("test-a").context_window == 1000
+    assert second.policy_for("test-a").context_window == 8192
+
+    service.config = {"models": {"test-*": {"context_window": 2000}}}
+    assert first.policy_for("test-a").context_window == 2000
+
+
+def test_missing_config_uses_defaults(counter):
+    manager = ContextWindowManager(counter=counter, config_service=_Config(None))
+    assert manager.policy_for("gpt-4o").context_window == 8192
+
+
+def test_counts_are_estimates_until_the_encoding_loads(monkeypatch):
+    monkeypatch.setattr(TokenCounter, "_load_encoding", lambda self: None)
+    counter = TokenCounter()
+
+    assert not counter.exact
+    assert not counter.wait_until_loaded(timeout=0)
+    assert counter.count_text("x" * 30) == 10
+
+    class _Encoding:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    counter._encoding = _Encoding()
+    counter._loaded.set()
+    assert counter.exact
+    assert counter.count_text("x" * 30) == 1
@@ -0,0 +1,109 @@
+"""
+SQLite storage backend, on a database file and on ':memory:'.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import pytest
+
+from app.database import db_sqlite, history_writer
+from app.database.db_llm_model import ACTIVE_STATUS
+from app.database.db_sqlite import (SQLiteHistoryManager, SQLiteModelManager, SQLitePreferenceStore,
+                                    get_sqlite_database)
+from app.database.history_search import HIGHLIGHT_END, HIGHLIGHT_START
+
+
+@pytest.fixture(params=["file", "memory"])
+def path(request, tmp_path, monkeypatch):
+    # Fresh process-wide registries, so every test gets its own database and writer
+    monkeypatch.setattr(db_sqlite, "_databases", {})
+    monkeypatch.setattr(history_writer, "_writers", {})
+    yield str(tmp_path / "llm_experimenter.db") if request.param == "file" else ":memory:"
+    for writer in history_writer._writers.values():
+        writer.close()
+
+
+def _save(manager, user, session_id, prompt, response="Use pandas.merge with how='left'."):
+    return manager.save_history(user, session_id, "gpt-4o", prompt, response, parameters={"temperature": 0.2},
+                                context_turns=0)
+
+
+def test_writer_saves_are_read_back_in_keyset_pages(path):
+    manager = SQLiteHistoryManager(path, async_writes=True)
+    ids = [_save(manager, "ada@example.com", "s1", f"question {i}") for i in range(5)]
+    assert manager.writer.flush()
+
+    pages, before = [], None
+    while True:
+        page = manager.get_session_turns("s1", limit=2, before=before)
+        pages.append([turn["prompt"] for turn in page])
+        before = manager.next_page_cursor(page, 2)
+        if before is None:
+            break
+
+    assert pages == [["question 4", "question 3"], ["question 2", "question 1"], ["question 0"]]
+    entry = manager.get_history_entry(ids[0])
+    assert entry["user"] == "ada@example.com"
+    assert entry["parameters"] == {"temperature": 0.2}
+    assert entry["context_turns"] == 0
+
+
+def test_rows_are_visible_from_another_thread(path):
+    manager = SQLiteHistoryManager(path, async_writes=False)
+    entry_id = _save(manager, "ada@example.com", "s1", "question 0")
+    seen = []
+
+    thread = threading.Thread(target=lambda: seen.append(manager.get_history_entry(entry_id)))
+    thread.start()
+    thread.join()
+
+    assert seen[0] is not None and seen[0]["prompt"] == "question 0"
+    assert get_sqlite_database(path).counters["connections"] >= 2
+
+
+def test_search_is_scoped_to_one_user(path):
+    manager = SQLiteHistoryManager(path, async_writes=False)
+    _save(manager, "ada@example.com", "s1", "How do I merge two dataframes?")
+    _save(manager, "ada@example.com", "s2", "Plot a histogram")
+    _save(manager, "bob@example.com", "s3", "How do I merge two dataframes in pandas?")
+
+    results, has_more = manager.search_history("ada@example.com", "merge dataframes")
+
+    assert not has_more
+    assert [result["session_id"] for result in results] == ["s1"]
+    assert f"{HIGHLIGHT_START}merge{HIGHLIGHT_END}" in results[0]["prompt"]
+    assert manager.search_history("carol@example.com", "merge") == ([], False)
+
+
+def test_model_edits_bump_the_catalog_version(path):
+    catalog = SQLiteModelManager(path)
+    version = catalog.get_catalog_version()
+
+    catalog.upsert_model("Acme", "acme-1", model_detail="Test model")
+    assert catalog.get_catalog_version() == version + 1
+    assert {"company": "Acme", "model": "acme-1", "model_detail": "Test model",
+            "status": ACTIVE_STATUS} in catalog.get_models()
+
+    catalog.set_status("Acme", "acme-1", "Inactive")
+    assert catalog.get_catalog_version() == version + 2
+    assert all(model["model"] != "acme-1" for model in catalog.get_models())
+
+
+def test_preferences_round_trip(path):
+    database = get_sqlite_database(path)
+    prefs = {"temperature": 0.3, "max_tokens": 512, "top_p": 0.9, "presence_penalty": 0.0, "frequency_penalty": 0.5}
+
+    SQLitePreferenceStore(database, poll_interval=3600).save("ada@example.com", prefs)
+
+    # A second store has nothing cached, so this reads the table
+    store = SQLitePreferenceStore(database, poll_interval=3600)
+    assert store.get("ada@example.com") == prefs
+    assert store.get("bob@example.com") == {}
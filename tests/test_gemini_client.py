@@ -0,0 +1,68 @@
+"""
+Gemini client through the shared BaseLLMClient request path, with the SDK stubbed out.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import pytest
+
+from app.modelList.base_client import GenerationParams
+from app.modelList.gemini_class import CLS_Gemini_Client
+
+
+def _response(text, prompt_tokens=None, completion_tokens=None):
+    usage = (SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=completion_tokens)
+             if prompt_tokens is not None else None)
+    candidate = SimpleNamespace(finish_reason="STOP" if usage else None)
+    return SimpleNamespace(text=text, usage_metadata=usage, candidates=[candidate])
+
+
+class _Models:
+    async def generate_content(self, model, contents, config):
+        return _response("Hello there", prompt_tokens=5, completion_tokens=2)
+
+    async def generate_content_stream(self, model, contents, config):
+        async def chunks():
+            yield _response("Hello ")
+            yield _response("there", prompt_tokens=5, completion_tokens=2)
+        return chunks()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    # Skip __init__, which needs an API key and calls the API
+    gemini = CLS_Gemini_Client.__new__(CLS_Gemini_Client)
+    gemini.async_client = SimpleNamespace(models=_Models())
+    return gemini
+
+
+CHAT = [{"role": "user", "content": "Say hello"}]
+
+
+def test_generate_records_usage_with_rate_limiting(client):
+    result = client.generate("gemini-2.0-flash", CHAT, GenerationParams(max_tokens=50), use_cache=False)
+
+    assert result.ok, result.error
+    assert result.text == "Hello there"
+    assert (result.prompt_tokens, result.completion_tokens) == (5, 2)
+    assert result.finish_reason == "STOP"
+
+
+def test_stream_records_usage_with_rate_limiting(client):
+    completed = []
+    chunks = list(client.stream("gemini-2.0-flash", CHAT, GenerationParams(max_tokens=50),
+                                on_complete=completed.append, use_cache=False))
+
+    assert chunks == ["Hello ", "there"]
+    assert len(completed) == 1 and completed[0].ok, completed and completed[0].error
+    assert (completed[0].prompt_tokens, completed[0].completion_tokens) == (5, 2)
+
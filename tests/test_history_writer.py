@@ -0,0 +1,119 @@
+"""
+Background history writer against an in-memory MongoDB (mongomock).
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import os
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo import errors
+
+from app.database.history_writer import HistoryWriter
+
+
+class _FlakyCollection:
+    """Collection whose writes fail with a network error while 'down' is set."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.down = False
+
+    def insert_many(self, docs, ordered=True):
+        if self.down:
+            raise errors.AutoReconnect("connection refused")
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().llm_experimenter.history
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    writers = []
+
+    def make(collection, **kwargs):
+        kwargs = {"batch_size": 10, "flush_interval": 0.05, "spill_path": tmp_path / "spill.jsonl", **kwargs}
+        writer = HistoryWriter(collection, **kwargs)
+        # Replays only when a test asks for one
+        writer.replay_interval = 3600
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.close()
+
+
+def _doc(i, **fields):
+    return {"user": "ada", "session_id": "s1", "model": "gpt-4o", "prompt": f"question {i}",
+            "response": f"answer {i}", **fields}
+
+
+def test_duplicate_id_counts_as_written(collection, make_writer):
+    stored = _doc(0, _id=ObjectId())
+    collection.insert_one(dict(stored))
+    writer = make_writer(collection)
+
+    writer.submit(dict(stored))
+    writer.submit(_doc(1))
+    assert writer.flush()
+
+    assert writer.counters["written"] == 2
+    assert writer.counters["spilled"] == 0
+    assert not writer.spill_path.exists()
+    assert collection.count_documents({}) == 2
+
+
+def test_network_error_spills_and_replay_reinserts(collection, make_writer):
+    flaky = _FlakyCollection(collection)
+    flaky.down = True
+    writer = make_writer(flaky)
+
+    ids = [writer.submit(_doc(i)) for i in range(3)]
+    assert writer.flush()
+    assert writer.counters["spilled"] == 3
+    assert writer.spill_path.exists()
+    assert collection.count_documents({}) == 0
+
+    flaky.down = False
+    writer._replay_spill()
+
+    assert writer.counters["replayed"] == 3
+    assert not writer.spill_path.exists()
+    assert sorted(doc["_id"] for doc in collection.find()) == sorted(ids)
+
+
+def test_unencodable_document_does_not_stop_the_writer(collection, make_writer):
+    writer = make_writer(collection)
+
+    writer.submit(_doc(0, parameters={"callback": object()}))
+    assert writer.flush()
+    writer.submit(_doc(1))
+    assert writer.flush()
+
+    assert writer._thread.is_alive()
+    assert [doc["prompt"] for doc in collection.find()] == ["question 1"]
+    # Neither written nor spillable: dropped with an error
+    assert writer.counters["spilled"] == 0
+
+
+def test_close_flushes_queued_documents(collection, make_writer):
+    writer = make_writer(collection, batch_size=1000, flush_interval=60)
+
+    for i in range(5):
+        writer.submit(_doc(i))
+    writer.close()
+
+    assert not writer._thread.is_alive()
+    assert collection.count_documents({}) == 5
+    assert writer.stats()["pending"] == 0
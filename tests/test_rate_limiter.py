@@ -0,0 +1,86 @@
+"""
+Token reservations of ProviderRateLimiter.request on success, failure and cancellation.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import pytest
+
+from app.modelList.rate_limiter import ProviderRateLimiter
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    # Refills ten tokens a second, too slow to blur the checks below
+    monkeypatch.setenv("RATE_LIMIT_TEST_TPM", "600")
+    monkeypatch.setenv("RATE_LIMIT_TEST_RPM", "60")
+    return ProviderRateLimiter("test")
+
+
+def test_unused_tokens_are_refunded_on_success(limiter):
+    async def call():
+        async with limiter.request(500) as permit:
+            permit.used_tokens = 200
+
+    asyncio.run(call())
+    assert limiter.tokens.tokens == pytest.approx(400, abs=1)
+
+
+def test_completed_request_without_usage_keeps_its_reservation(limiter):
+    async def call():
+        async with limiter.request(500):
+            pass
+
+    asyncio.run(call())
+    assert limiter.tokens.tokens == pytest.approx(100, abs=1)
+
+
+def test_failed_request_is_refunded(limiter):
+    async def call():
+        async with limiter.request(500):
+            raise RuntimeError("upstream failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(call())
+    assert limiter.tokens.tokens == pytest.approx(600, abs=1)
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_cancelled_request_is_refunded(limiter):
+    async def call():
+        async with limiter.request(500):
+            await asyncio.sleep(10)
+
+    async def cancel():
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert limiter.tokens.tokens == pytest.approx(600, abs=1)
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_request_cancelled_while_throttled_returns_its_request_slot(limiter):
+    limiter.tokens.tokens = 0
+
+    async def cancel():
+        task = asyncio.create_task(limiter.request(500).__aenter__())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert limiter.requests.tokens == pytest.approx(60, abs=1)
+    assert limiter.tokens.tokens == pytest.approx(0, abs=1)
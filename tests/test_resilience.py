@@ -0,0 +1,191 @@
+"""
+Error classification, circuit breakers and retry backoff, on a fake clock.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import anthropic
+import groq
+import httpx
+import openai
+import pytest
+from google.genai import errors as genai_errors
+
+from app.modelList import resilience
+from app.modelList.resilience import (CLIENT, CLOSED, CONNECTION, HALF_OPEN, OPEN, RATE_LIMIT, SERVER, TIMEOUT, UNKNOWN,
+                                      CircuitBreaker, CircuitOpenError, ResilienceLayer, classify_error)
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat")
+
+
+def _response(status, headers=None):
+    return httpx.Response(status, headers=headers, request=REQUEST)
+
+
+def _status_error(cls, status, headers=None):
+    return cls(f"HTTP {status}", response=_response(status, headers), body=None)
+
+
+def _genai_error(cls, code):
+    return cls(code, {"error": {"code": code, "message": f"HTTP {code}", "status": "ERROR"}})
+
+
+CASES = [
+    # OpenAI
+    (_status_error(openai.RateLimitError, 429), RATE_LIMIT),
+    (_status_error(openai.InternalServerError, 500), SERVER),
+    (_status_error(openai.BadRequestError, 400), CLIENT),
+    (_status_error(openai.AuthenticationError, 401), CLIENT),
+    (openai.APITimeoutError(request=REQUEST), TIMEOUT),
+    (openai.APIConnectionError(request=REQUEST), CONNECTION),
+    # Anthropic, including 529 overloaded
+    (_status_error(anthropic.RateLimitError, 429), RATE_LIMIT),
+    (_status_error(anthropic.APIStatusError, 529), SERVER),
+    (_status_error(anthropic.ConflictError, 409), SERVER),
+    (_status_error(anthropic.NotFoundError, 404), CLIENT),
+    (anthropic.APITimeoutError(request=REQUEST), TIMEOUT),
+    (anthropic.APIConnectionError(request=REQUEST), CONNECTION),
+    # Groq
+    (_status_error(groq.RateLimitError, 429), RATE_LIMIT),
+    (_status_error(groq.InternalServerError, 503), SERVER),
+    (_status_error(groq.UnprocessableEntityError, 422), CLIENT),
+    (groq.APITimeoutError(request=REQUEST), TIMEOUT),
+    (groq.APIConnectionError(request=REQUEST), CONNECTION),
+    # Google GenAI carries the status in 'code'
+    (_genai_error(genai_errors.ClientError, 429), RATE_LIMIT),
+    (_genai_error(genai_errors.ClientError, 400), CLIENT),
+    (_genai_error(genai_errors.ServerError, 503), SERVER),
+    (_genai_error(genai_errors.ServerError, 504), TIMEOUT),
+    # Transport and runtime errors without a status
+    (httpx.ConnectError("connection refused", request=REQUEST), CONNECTION),
+    (httpx.ReadTimeout("read timed out", request=REQUEST), TIMEOUT),
+    (httpx.RemoteProtocolError("server disconnected", request=REQUEST), CONNECTION),
+    (asyncio.TimeoutError(), TIMEOUT),
+    (ConnectionResetError(), CONNECTION),
+    (ValueError("bad input"), UNKNOWN),
+]
+
+
+@pytest.mark.parametrize("error, category", CASES, ids=lambda case: type(case).__name__ if isinstance(case, Exception) else case)
+def test_classify_error(error, category):
+    assert classify_error(error) == category
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker("openai", failure_threshold=3, recovery_seconds=30)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+
+    clock.now += 30
+    # One trial call at a time while half-open
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.stats()["opened"] == 1
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("openai", failure_threshold=1, recovery_seconds=10)
+    breaker.record_failure()
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 10
+    assert breaker.stats()["opened"] == 2
+
+
+@pytest.fixture
+def layer(monkeypatch, clock):
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    layer = ResilienceLayer()
+    layer.max_attempts, layer.base_delay, layer.max_delay = 4, 0.5, 1.5
+    layer.failure_threshold = 100
+    return layer
+
+
+def test_retry_backoff_is_exponential_and_capped(layer):
+    guard = layer.guard("openai", "gpt-4o", timeout=60)
+    error = _status_error(openai.InternalServerError, 500)
+    delays = []
+    while True:
+        guard.check()
+        delay = guard.failed(error)
+        if delay is None:
+            break
+        delays.append(delay)
+
+    assert delays == [0.5, 1.0, 1.5]
+    assert guard.attempts == layer.max_attempts
+    assert layer.counters["retries"] == 3
+
+
+def test_retry_waits_at_least_retry_after(layer):
+    guard = layer.guard("anthropic", "claude-3-5-sonnet", timeout=60)
+    guard.check()
+
+    assert guard.failed(_status_error(anthropic.RateLimitError, 429, {"retry-after": "12"})) == 12
+
+
+def test_no_retry_when_retry_after_exceeds_the_timeout(layer):
+    guard = layer.guard("anthropic", "claude-3-5-sonnet", timeout=10)
+    guard.check()
+
+    assert guard.failed(_status_error(anthropic.RateLimitError, 429, {"retry-after": "12"})) is None
+
+
+def test_client_errors_are_not_retried_or_counted_against_the_breakers(layer):
+    guard = layer.guard("groq", "llama-3.1-8b-instant", timeout=60)
+    guard.check()
+
+    assert guard.failed(_status_error(groq.BadRequestError, 400)) is None
+    assert all(breaker.failures == 0 for breaker in guard.breakers)
+
+
+def test_open_model_breaker_fails_fast_without_blocking_the_provider(layer):
+    layer.failure_threshold = 2
+    guard = layer.guard("openai", "gpt-4o", timeout=60)
+    for _ in range(2):
+        guard.check()
+        guard.failed(_status_error(openai.InternalServerError, 500))
+
+    with pytest.raises(CircuitOpenError):
+        layer.guard("openai", "gpt-4o", timeout=60).check()
+    # Server errors blame the model, so other models of the provider still get through
+    layer.guard("openai", "gpt-4o-mini", timeout=60).check()
+    assert layer.breaker("openai").state == CLOSED